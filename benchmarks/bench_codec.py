@@ -0,0 +1,91 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Compare the cost of encoding and decoding small and large messages with the installed
+codecs, and of validating an echo message from a dictionary, directly from the bytes or
+with the fast path that echoes the received bytes.
+
+It does not need a RabbitMQ:
+
+    python benchmarks/bench_codec.py --iterations 100000
+"""
+
+import argparse
+import json
+import time
+
+from c1_echo_example_with_python_and_pika.codec import available_codecs, create_codec
+from c1_echo_example_with_python_and_pika.echo_handler import is_canonical_echo
+from c1_echo_example_with_python_and_pika.echo_payload import EchoPayload
+
+
+def payloads():
+	"""Return the name and message of the payloads to measure."""
+
+	return [
+		("small",{"content": "Hello!"}),
+		("large",{"content": "Hello world! " * 5000}),
+		("log",{
+			"level": "INFO",
+			"message": "Received a message to echo",
+			"payload": json.dumps({"content": "Hello world! " * 20}),
+			"component_id": "0123456789abcdef01234567"
+			})
+		]
+
+
+def measure(name:str, operation, iterations:int):
+	"""Repeat an operation and print the cost of each call."""
+
+	start = time.perf_counter()
+	for _i in range(iterations):
+
+		operation()
+
+	elapsed = time.perf_counter() - start
+	print(f"{name:<32} {elapsed * 1e6 / iterations:>10.2f} us/op {iterations / elapsed:>12.1f} ops/s")
+
+
+def main():
+	"""Run the benchmark."""
+
+	parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--iterations',type=int,default=100000,help='The number of times to repeat each operation.')
+	args = parser.parse_args()
+
+	for payload_name,payload in payloads():
+
+		iterations = args.iterations if payload_name != "large" else max(1,args.iterations // 100)
+		for codec_name in available_codecs():
+
+			codec = create_codec(codec_name)
+			body = codec.encode(payload)
+			measure(f"{codec_name} encode {payload_name}",lambda codec=codec: codec.encode(payload),iterations)
+			measure(f"{codec_name} decode {payload_name}",lambda codec=codec,body=body: codec.decode(body),iterations)
+
+		if payload_name != "log":
+
+			body = json.dumps(payload).encode('utf-8')
+			measure(f"validate dict {payload_name}",lambda body=body: EchoPayload(**json.loads(body)),iterations)
+			measure(f"validate json {payload_name}",lambda body=body: EchoPayload.model_validate_json(body),iterations)
+			measure(f"validate canonical {payload_name}",lambda body=body: is_canonical_echo(body),iterations)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,244 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Measure the throughput and the round-trip latency of the EchoHandler end to end.
+
+A client publishes messages of each size to the queue of the handler, keeping at most the
+concurrency messages waiting for their echo, and measures the time until each echo is
+received. The handler and the client use the RabbitMQ, configured with the same environment
+variables as the component, or an in memory broker that does not need it:
+
+    python benchmarks/bench_echo.py --backend memory --sizes 16 1024 --concurrency 1 64
+
+The results can be written as JSON and compared with the results of another run:
+
+    python benchmarks/bench_echo.py --output new.json --compare old.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import threading
+import time
+
+from c1_echo_example_with_python_and_pika.echo_handler import EchoHandler
+from c1_echo_example_with_python_and_pika.mov_service import MOVService
+
+RECEIVED_QUEUE = 'valawai/c1/echo_example_with_python_and_pika/data/received_message'
+ECHO_QUEUE = 'valawai/c1/echo_example_with_python_and_pika/data/publish_message'
+PERCENTILES = (50,95,99,99.9)
+
+
+def percentile(sorted_values:list, percent:float):
+	"""Return the value of a percentile of some sorted values, using the nearest rank."""
+
+	if len(sorted_values) == 0:
+
+		return 0.0
+
+	rank = max(1,math.ceil(percent / 100 * len(sorted_values)))
+	return sorted_values[min(rank,len(sorted_values)) - 1]
+
+
+def percentile_name(percent:float):
+	"""Return the name of a percentile, like 'p50' or 'p999'."""
+
+	return 'p' + f"{percent:g}".replace('.','')
+
+
+class EchoClient:
+	"""Publish the messages to echo and measure when their echo is received."""
+
+	def __init__(self, message_service):
+		"""Initialize the client and listen for the echoed messages."""
+
+		self.message_service = message_service
+		self.condition = threading.Condition()
+		self.sent_at = {}
+		self.latencies = []
+		self.sequence = 0
+		message_service.listen_for(ECHO_QUEUE,self.on_echo)
+
+	def on_echo(self, _ch, _method, _properties, body):
+		"""Called when an echoed message is received."""
+
+		received_at = time.perf_counter()
+		sequence = int(json.loads(body)['content'].split(' ',1)[0])
+		with self.condition:
+
+			sent_at = self.sent_at.pop(sequence,None)
+			if sent_at is not None:
+
+				self.latencies.append(received_at - sent_at)
+				self.condition.notify_all()
+
+	def run(self, messages:int, size:int, concurrency:int, timeout:float):
+		"""Echo some messages and return the seconds that they needed, or None if not all are echoed."""
+
+		padding = 'x' * max(0,size - 32)
+		with self.condition:
+
+			self.latencies = []
+
+		start = time.perf_counter()
+		deadline = time.monotonic() + timeout
+		for _i in range(messages):
+
+			with self.condition:
+
+				if not self.condition.wait_for(lambda: len(self.sent_at) < concurrency,max(0,deadline - time.monotonic())):
+
+					return None
+
+				self.sequence += 1
+				sequence = self.sequence
+				self.sent_at[sequence] = time.perf_counter()
+
+			self.message_service.publish_to(RECEIVED_QUEUE,{"content": f"{sequence} {padding}"})
+
+		with self.condition:
+
+			if not self.condition.wait_for(lambda: len(self.latencies) >= messages,max(0,deadline - time.monotonic())):
+
+				return None
+
+		return time.perf_counter() - start
+
+
+def create_message_services(backend:str):
+	"""Create the message services of the handler and the client."""
+
+	if backend == 'memory':
+
+		from c1_echo_example_with_python_and_pika.in_memory_message_service import InMemoryBroker, InMemoryMessageService
+
+		broker = InMemoryBroker()
+		return InMemoryMessageService(broker),InMemoryMessageService(broker)
+
+	else:
+
+		from c1_echo_example_with_python_and_pika.message_service import MessageService
+
+		return MessageService(),MessageService()
+
+
+def compare(results:dict, baseline_path:str):
+	"""Print the change of the results against the results of a previous run."""
+
+	with open(baseline_path) as file:
+
+		baseline = json.load(file)
+
+	previous = {(result['size'],result['concurrency']):result for result in baseline['results']}
+	print(f"\nCompared with {baseline_path} ({baseline.get('backend')}, {baseline.get('timestamp')})")
+	print(f"{'size':>8} {'concurrency':>12} {'msgs/s':>10} {'p50':>10} {'p99':>10}")
+	for result in results['results']:
+
+		old = previous.get((result['size'],result['concurrency']))
+		if old is None:
+
+			continue
+
+		changes = [
+			(result['throughput'] - old['throughput']) / old['throughput'] * 100 if old['throughput'] > 0 else 0.0,
+			(result['latency_ms']['p50'] - old['latency_ms']['p50']) / old['latency_ms']['p50'] * 100 if old['latency_ms']['p50'] > 0 else 0.0,
+			(result['latency_ms']['p99'] - old['latency_ms']['p99']) / old['latency_ms']['p99'] * 100 if old['latency_ms']['p99'] > 0 else 0.0
+		]
+		print(f"{result['size']:>8} {result['concurrency']:>12} " + ' '.join(f"{change:>+9.1f}%" for change in changes))
+
+
+def main():
+	"""Run the benchmark."""
+
+	parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--backend',choices=['rabbitmq','memory'],default='rabbitmq',help='The broker to send the messages.')
+	parser.add_argument('--messages',type=int,default=10000,help='The number of messages to echo for each size and concurrency.')
+	parser.add_argument('--warmup',type=int,default=1000,help='The number of messages to echo before measuring.')
+	parser.add_argument('--sizes',type=int,nargs='+',default=[64,1024,16384],help='The sizes, in bytes, of the messages.')
+	parser.add_argument('--concurrency',type=int,nargs='+',default=[1,16,128],help='The maximum messages waiting for their echo.')
+	parser.add_argument('--timeout',type=float,default=300,help='The maximum seconds for each size and concurrency.')
+	parser.add_argument('--output',help='The file to write the results as JSON.')
+	parser.add_argument('--compare',help='The file with the JSON results of a previous run to compare with.')
+	args = parser.parse_args()
+
+	handler_service,client_service = create_message_services(args.backend)
+	mov = MOVService(handler_service)
+	EchoHandler(handler_service,mov)
+	client = EchoClient(client_service)
+	handler_service.start_consuming_and_forget()
+	client_service.start_consuming_and_forget()
+	results = {
+		"backend": args.backend,
+		"codec": handler_service.codec.name,
+		"python": platform.python_version(),
+		"timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+		"environment": {name:value for name,value in os.environ.items() if name.startswith(('ECHO_','RABBITMQ_PUBLISH','MESSAGE_','MOV_LOG_'))},
+		"results": []
+		}
+	try:
+
+		if args.warmup > 0 and client.run(args.warmup,args.sizes[0],max(args.concurrency),args.timeout) is None:
+
+			raise TimeoutError("The warmup messages have not been echoed")
+
+		print(f"{'size':>8} {'concurrency':>12} {'messages':>9} {'msgs/s':>10} " + ' '.join(f"{percentile_name(percent) + ' ms':>10}" for percent in PERCENTILES))
+		for size in args.sizes:
+
+			for concurrency in args.concurrency:
+
+				elapsed = client.run(args.messages,size,concurrency,args.timeout)
+				if elapsed is None:
+
+					print(f"{size:>8} {concurrency:>12} timeout")
+					continue
+
+				latencies = sorted(client.latencies)
+				result = {
+					"size": size,
+					"concurrency": concurrency,
+					"messages": args.messages,
+					"seconds": elapsed,
+					"throughput": args.messages / elapsed,
+					"latency_ms": {percentile_name(percent):percentile(latencies,percent) * 1000 for percent in PERCENTILES}
+					}
+				results['results'].append(result)
+				print(f"{size:>8} {concurrency:>12} {args.messages:>9} {result['throughput']:>10.1f} " + ' '.join(f"{value:>10.3f}" for value in result['latency_ms'].values()))
+
+	finally:
+
+		mov.stop()
+		client_service.close()
+		handler_service.close()
+
+	if args.output:
+
+		with open(args.output,'w') as file:
+
+			json.dump(results,file,indent=2)
+
+	if args.compare:
+
+		compare(results,args.compare)
+
+
+if __name__ == '__main__':
+
+	main()
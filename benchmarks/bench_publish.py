@@ -0,0 +1,86 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Compare the cost of publishing a message opening a connection per message
+against publishing with the long-lived connections of the MessageService.
+
+It needs a RabbitMQ, configured with the same environment variables as the component:
+
+    python benchmarks/bench_publish.py --messages 1000
+"""
+
+import argparse
+import json
+import time
+
+import pika
+
+from c1_echo_example_with_python_and_pika.message_service import MessageService
+
+QUEUE = 'benchmark/publish'
+
+
+def publish_with_new_connection(message_service:MessageService, msg):
+	"""Publish a message as it was done before the publisher pool existed."""
+
+	body = json.dumps(msg)
+	properties = pika.BasicProperties(content_type='application/json')
+	connection = pika.BlockingConnection(message_service.connection_parameters)
+	channel = connection.channel()
+	channel.basic_publish(exchange='',routing_key=QUEUE,body=body,properties=properties)
+	channel.close()
+	connection.close()
+
+
+def measure(name:str, publish, messages:int):
+	"""Publish the messages and print the cost per message."""
+
+	msg = {"content": "Hello!"}
+	start = time.perf_counter()
+	for _i in range(messages):
+
+		publish(msg)
+
+	elapsed = time.perf_counter() - start
+	print(f"{name:<16} {messages:>8} msgs {elapsed:>9.3f} s {elapsed * 1e6 / messages:>12.1f} us/msg {messages / elapsed:>10.1f} msgs/s")
+
+
+def main():
+	"""Run the benchmark."""
+
+	parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--messages',type=int,default=1000,help='The number of messages to publish on each mode.')
+	args = parser.parse_args()
+
+	message_service = MessageService()
+	try:
+
+		message_service.listen_channel.queue_declare(queue=QUEUE,durable=False,auto_delete=False)
+		measure('per-message',lambda msg: publish_with_new_connection(message_service,msg),args.messages)
+		measure('pooled',lambda msg: message_service.publish_to(QUEUE,msg),args.messages)
+		message_service.listen_channel.queue_delete(queue=QUEUE)
+
+	finally:
+
+		message_service.close()
+
+
+if __name__ == '__main__':
+
+	main()
@@ -0,0 +1,83 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Compare the cost per message of publishing batches of different sizes with
+MessageService.publish_many against publishing the same messages one by one.
+
+It needs a RabbitMQ, configured with the same environment variables as the component:
+
+    python benchmarks/bench_publish_many.py --messages 10000
+"""
+
+import argparse
+import time
+
+from c1_echo_example_with_python_and_pika.message_service import MessageService
+
+QUEUE = 'benchmark/publish_many'
+
+
+def measure(name:str, batch_size:int, publish_batch, messages:int):
+	"""Publish the messages in batches and print the cost per message."""
+
+	batch = [{"content": f"Hello {i}!"} for i in range(batch_size)]
+	batches = max(1,messages // batch_size)
+	start = time.perf_counter()
+	for _i in range(batches):
+
+		publish_batch(batch)
+
+	elapsed = time.perf_counter() - start
+	total = batches * batch_size
+	print(f"{name:<12} {batch_size:>6} {total:>8} msgs {elapsed:>9.3f} s {elapsed * 1e6 / total:>10.1f} us/msg {total / elapsed:>10.1f} msgs/s")
+
+
+def main():
+	"""Run the benchmark."""
+
+	parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--messages',type=int,default=10000,help='The number of messages to publish on each batch size.')
+	parser.add_argument('--batch-sizes',type=int,nargs='+',default=[1,10,100,1000],help='The batch sizes to measure.')
+	args = parser.parse_args()
+
+	message_service = MessageService()
+	try:
+
+		message_service.listen_channel.queue_declare(queue=QUEUE,durable=False,auto_delete=False)
+		print(f"{'mode':<12} {'batch':>6} {'messages':>13} {'time':>11} {'cost':>16} {'throughput':>17}")
+		for batch_size in args.batch_sizes:
+
+			def publish_one_by_one(batch):
+				for msg in batch:
+					message_service.publish_to(QUEUE,msg)
+
+			measure('publish_to',batch_size,publish_one_by_one,args.messages)
+			measure('publish_many',batch_size,lambda batch: message_service.publish_many(QUEUE,batch),args.messages)
+			message_service.listen_channel.queue_purge(queue=QUEUE)
+
+		message_service.listen_channel.queue_delete(queue=QUEUE)
+
+	finally:
+
+		message_service.close()
+
+
+if __name__ == '__main__':
+
+	main()
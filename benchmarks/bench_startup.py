@@ -0,0 +1,104 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+"""Measure the time that a new process of the component needs to be ready to echo messages.
+
+Each run starts a new interpreter, so nothing is cached, and follows the steps of the start of the
+component: it imports the entry point, preloads the handler on a background thread, loads the
+version, the AsyncAPI and the name of the component, waits the time to connect to RabbitMQ, and
+creates the EchoHandler on an in memory broker. The connection is simulated with a sleep, because
+the handler is imported while the process waits for it, and the start can be compared without
+preloading the handler:
+
+    python benchmarks/bench_startup.py --runs 20 --connect-ms 50
+    python benchmarks/bench_startup.py --runs 20 --connect-ms 50 --no-preload
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+STARTUP_SCRIPT = """
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import c1_echo_example_with_python_and_pika.__main__ as main
+imported = time.perf_counter()
+
+if sys.argv[2] == 'preload':
+	main.preload_modules("echo_handler")
+
+from mov_service import MOVService
+from in_memory_message_service import InMemoryMessageService
+message_service = InMemoryMessageService()
+time.sleep(float(sys.argv[1]) / 1000)
+mov = MOVService(message_service,log_buffer_size=0)
+asyncapi_yaml = mov.load_default_asyncapi_yaml()
+mov.extract_default_component_name(asyncapi_yaml)
+mov.load_default_project_version()
+connected = time.perf_counter()
+
+from echo_handler import EchoHandler
+EchoHandler(message_service,mov)
+ready = time.perf_counter()
+message_service.close()
+print(json.dumps({"import": imported - start, "connect": connected - imported, "handler": ready - connected, "ready": ready - start}))
+"""
+
+
+def main():
+	"""Run the benchmark."""
+
+	parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--runs',type=int,default=10,help='The number of processes to start.')
+	parser.add_argument('--connect-ms',type=float,default=50,help='The milliseconds that the connection to RabbitMQ needs.')
+	parser.add_argument('--no-preload',action='store_true',help='Import the handler when it is created.')
+	parser.add_argument('--output',help='The file to write the results as JSON.')
+	args = parser.parse_args()
+
+	runs = []
+	for _i in range(args.runs):
+
+		command = [sys.executable,'-c',STARTUP_SCRIPT,str(args.connect_ms),'none' if args.no_preload else 'preload']
+		output = subprocess.run(command,check=True,capture_output=True,text=True).stdout
+		runs.append(json.loads(output.strip().splitlines()[-1]))
+
+	results = {}
+	print(f"{'step':>10} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+	for step in ('import','connect','handler','ready'):
+
+		values = [run[step] * 1000 for run in runs]
+		results[step] = {"median": statistics.median(values), "min": min(values), "max": max(values)}
+		print(f"{step:>10} {results[step]['median']:>10.1f} {results[step]['min']:>10.1f} {results[step]['max']:>10.1f}")
+
+	if args.output:
+
+		with open(args.output,'w') as file:
+
+			json.dump({"python": sys.version.split()[0], "runs": args.runs, "connect_ms": args.connect_ms, "preload": not args.no_preload, "results": results},file,indent=2)
+
+
+if __name__ == '__main__':
+
+	main()
@@ -18,25 +18,76 @@
 #
 
 
+import argparse
+import importlib
 import logging
 import logging.config
+import multiprocessing
 import os
 import signal
+from threading import Thread
 
 from message_service import MessageService
 from mov_service import MOVService
-from echo_handler import EchoHandler
+from memory_monitor import MemoryMonitor
+from metrics import start_metrics_server
+from profiler import install_profiler_signal
+from worker_supervisor import WorkerSupervisor
+
+def preload_modules(*names):
+    """Import some modules on a background thread, so the imports overlap with the connection to RabbitMQ
+
+    Parameters
+    ----------
+    names : str
+        The names of the modules to import.
+
+    Returns
+    -------
+    Thread
+        The thread that imports the modules, that must finish before the process is forked.
+    """
+
+    def import_modules():
+        for name in names:
+
+            try:
+
+                importlib.import_module(name)
+
+            except ImportError:
+
+                logging.exception("Cannot preload the module %s", name)
+
+    thread = Thread(target=import_modules, name="preload-modules", daemon=True)
+    thread.start()
+    return thread
+
 
 class App:
     """The class used as application of the C1 Echo"""
 
-    def __init__(self):
-        """Initilaize the application"""
+    def __init__(self, component_id=None):
+        """Initilaize the application
+
+        Parameters
+        ----------
+        component_id : str
+            The identifier of the component when it has been registered by a supervisor,
+            or None if the application has to register it.
+        """
+
+        self.component_id = component_id
+        self.metrics_server = None
+        self.memory_monitor = None
 
         # Capture when the docker container is stopped
         signal.signal(signal.SIGINT, self.exit_gracefully)
         signal.signal(signal.SIGTERM, self.exit_gracefully)
 
+        # Profile the thread that consumes the messages on demand
+        self.profiler = install_profiler_signal()
+
     def exit_gracefully(self, _signum, _frame):
         """Called when the docker container is closed
         """
@@ -47,20 +98,44 @@ class App:
         """Initialize the component"""
 
         try:
+            self.metrics_server = start_metrics_server(metrics_port())
+
+            # The handler, that imports pydantic, is loaded while connecting to RabbitMQ
+            preload_modules("echo_handler")
+
             # Create connection to RabbitMQ
-            self.message_service = MessageService()
+            if os.getenv("MESSAGE_SERVICE_BACKEND","blocking") == "asyncio":
+
+                from async_message_service import AsyncMessageService
+                self.message_service = AsyncMessageService()
+
+            else:
+
+                self.message_service = MessageService()
+
             self.mov = MOVService(self.message_service)
+            self.memory_monitor = MemoryMonitor(self.mov)
+            self.memory_monitor.start()
+            from echo_handler import EchoHandler
 
-            # Create the handlers for the events
-            version = self.mov.load_default_project_version()
-            asyncapi_yaml = self.mov.load_default_asyncapi_yaml()
-            name = self.mov.extract_default_component_name(asyncapi_yaml)
-            self.mov.listen_for_registered_component(name)
+            if self.component_id is None:
 
-            EchoHandler(self.message_service, self.mov)
+                # Create the handlers for the events
+                version = self.mov.load_default_project_version()
+                asyncapi_yaml = self.mov.load_default_asyncapi_yaml()
+                name = self.mov.extract_default_component_name(asyncapi_yaml)
+                self.mov.listen_for_registered_component(name)
 
-            # Register the component
-            self.mov.register_component(name,version,asyncapi_yaml)
+                EchoHandler(self.message_service, self.mov)
+
+                # Register the component
+                self.mov.register_component(name,version,asyncapi_yaml)
+
+            else:
+
+                # The supervisor has registered the component
+                self.mov.component_id = self.component_id
+                EchoHandler(self.message_service, self.mov)
 
             # Start to process the received events
             logging.info("Started C1 Echo")
@@ -75,8 +150,154 @@ class App:
 
         try:
 
-            self.mov.unregister_component()
+            if self.memory_monitor is not None:
+
+                self.memory_monitor.stop()
+
+            self.mov.stop()
+            if self.component_id is None:
+
+                self.mov.unregister_component()
+
             self.message_service.close()
+            if self.metrics_server is not None:
+
+                self.metrics_server.shutdown()
+
+            logging.info("Finished C1 Echo")
+
+        except (OSError, ValueError):
+
+            logging.exception("Could not stop the component")
+
+
+def metrics_port():
+    """Return the port to serve the metrics of this process.
+
+    The port is defined by the environment variable METRICS_PORT, and each worker process
+    of a sharded application uses the next ports, so the worker 'i' uses METRICS_PORT + 1 + i.
+    """
+
+    port = int(os.getenv("METRICS_PORT","0"))
+    name = multiprocessing.current_process().name
+    if port > 0 and name.startswith("worker-"):
+
+        return port + 1 + int(name[len("worker-"):])
+
+    return port
+
+
+def run_worker(component_id:str):
+    """The function that runs a worker process of the C1 Echo"""
+
+    app = App(component_id)
+    app.start()
+    app.stop()
+
+
+class ShardedApp:
+    """The application of the C1 Echo that consumes the messages on several worker processes"""
+
+    def __init__(self, workers:int):
+        """Initilaize the application
+
+        Parameters
+        ----------
+        workers : int
+            The number of worker processes that consume the messages.
+        """
+
+        self.workers = workers
+        self.running = True
+        self.mov = None
+        self.message_service = None
+        self.supervisor = None
+        self.metrics_server = None
+
+        # Capture when the docker container is stopped
+        signal.signal(signal.SIGINT, self.exit_gracefully)
+        signal.signal(signal.SIGTERM, self.exit_gracefully)
+
+        # The workers are profiled when the supervisor receives the signal of the profiler
+        profile_signal = getattr(signal, os.getenv("PROFILE_SIGNAL","SIGUSR1") or "-", None)
+        if isinstance(profile_signal, signal.Signals):
+
+            signal.signal(profile_signal, self.profile_workers)
+
+    def exit_gracefully(self, _signum, _frame):
+        """Called when the docker container is closed
+        """
+        self.running = False
+
+    def profile_workers(self, signum, _frame):
+        """Called when the workers have to be profiled
+        """
+        if self.supervisor is not None:
+
+            self.supervisor.signal_workers(signum)
+
+    def start(self):
+        """Register the component and run the workers until the application is stopped"""
+
+        try:
+            # The workers inherit the imported handler, so they are ready sooner
+            preloading = preload_modules("echo_handler")
+
+            # Only the supervisor registers the component, so it is done once
+            self.message_service = MessageService()
+            self.mov = MOVService(self.message_service)
+            version = self.mov.load_default_project_version()
+            asyncapi_yaml = self.mov.load_default_asyncapi_yaml()
+            name = self.mov.extract_default_component_name(asyncapi_yaml)
+            self.mov.listen_for_registered_component(name)
+            self.mov.register_component(name,version,asyncapi_yaml)
+            while self.running and self.mov.component_id is None:
+
+                self.message_service.process_events(1)
+
+            if not self.running:
+
+                return
+
+            # The workers are forked from this thread while it does not consume or import
+            preloading.join()
+            self.supervisor = WorkerSupervisor(self.workers, run_worker, (self.mov.component_id,))
+            self.supervisor.start()
+
+            # Started after forking the workers, so they do not inherit its thread, its socket or the locks it holds
+            self.metrics_server = start_metrics_server(metrics_port())
+            logging.info("Started C1 Echo with %s workers", self.workers)
+            while self.running:
+
+                self.message_service.process_events(1)
+                self.supervisor.restart_dead_workers()
+
+        except (OSError, ValueError):
+
+            logging.exception("Could not start the component")
+
+    def stop(self):
+        """Stop the workers and finalize the component."""
+
+        try:
+
+            if self.supervisor is not None:
+
+                self.supervisor.stop()
+
+            if self.mov is not None:
+
+                self.mov.stop()
+                self.mov.unregister_component()
+
+            if self.message_service is not None:
+
+                self.message_service.close()
+
+            if self.metrics_server is not None:
+
+                self.metrics_server.shutdown()
+
             logging.info("Finished C1 Echo")
 
         except (OSError, ValueError):
@@ -144,11 +365,72 @@ def configure_log():
         logging.exception("Could not configure the logging")
 
 
+def run_loadgen(args):
+    """Publish messages to echo at a fixed rate to the running component and report the latency of the echoes"""
+
+    from load_generator import LoadGenerator
+
+    message_service = MessageService()
+    try:
+
+        generator = LoadGenerator(message_service, args.rate, args.sizes)
+        message_service.start_consuming_and_forget()
+        if args.warmup > 0:
+
+            logging.info("Warming up for %s seconds", args.warmup)
+            generator.run(args.warmup, args.timeout)
+
+        logging.info("Publishing %s messages by second for %s seconds", args.rate, args.duration)
+        generator.run(args.duration, args.timeout)
+        print(generator.report())
+        if args.output is not None:
+
+            with open(args.output, "w") as file:
+
+                file.write(generator.histogram.format_distribution(1000.0))
+
+    finally:
+
+        message_service.close()
+
+
 def main():
     """The function to launch the C1 Echo component"""
 
+    parser = argparse.ArgumentParser(description="Run the C1 Echo component.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS","1")),
+        help="The number of processes that consume the messages. By default uses the environment variable WORKERS or 1.")
+    subparsers = parser.add_subparsers(dest="command")
+    loadgen = subparsers.add_parser("loadgen",
+        help="Publish messages to echo at a fixed rate and report the latency of the echoes.")
+    loadgen.add_argument("--rate", type=float, default=100,
+        help="The messages to publish by second, without waiting for the echoes.")
+    loadgen.add_argument("--duration", type=float, default=30,
+        help="The seconds to publish messages.")
+    loadgen.add_argument("--sizes", type=int, nargs="+", default=[64],
+        help="The approximate sizes, in bytes, of the published messages, that are used in turns.")
+    loadgen.add_argument("--warmup", type=float, default=0,
+        help="The seconds to publish messages before measuring.")
+    loadgen.add_argument("--timeout", type=float, default=5,
+        help="The maximum seconds to wait for the echoes after the last message is published.")
+    loadgen.add_argument("--output",
+        help="The file to write the latency histogram.")
+    args = parser.parse_args()
+
     configure_log()
-    app = App()
+    if args.command == "loadgen":
+
+        run_loadgen(args)
+        return
+
+    if args.workers > 1:
+
+        app = ShardedApp(args.workers)
+
+    else:
+
+        app = App()
+
     app.start()
     app.stop()
 
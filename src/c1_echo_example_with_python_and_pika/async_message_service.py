@@ -0,0 +1,677 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import inspect
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+
+import pika
+from pika.adapters.asyncio_connection import AsyncioConnection
+
+from backoff import backoff_delay
+from codec import create_codec
+from compression import create_compressor, decompress_callback
+from flow_control import FlowControl
+from metrics import MESSAGES_PUBLISHED, PUBLISH_DURATION, PUBLISH_FAILURES, RECONNECTS, instrument_callback
+from tracing import trace_headers
+
+
+class AsyncMessageService:
+	"""The service to send and receive messages from the RabbitMQ using an asyncio event loop.
+
+	It has the same methods as the MessageService, so the handlers and the MOVService can
+	use any of them. The messages can be published from any thread and before the connection
+	is open, and the callbacks can be coroutine functions. The messages of a coroutine callback
+	are acknowledged when it finishes, or rejected if it fails, so the number of messages in flight
+	is limited by the prefetch of the channel.
+	"""
+
+	def __init__(self,
+			host:str=os.getenv('RABBITMQ_HOST','mov-mq'),
+			port:int=int(os.getenv('RABBITMQ_PORT',"5672")),
+			username:str=os.getenv('RABBITMQ_USERNAME','mov'),
+			password:str=os.getenv('RABBITMQ_PASSWORD','password'),
+			max_retries:int=int(os.getenv('RABBITMQ_MAX_RETRIES',"100")),
+			retry_sleep_seconds:int=int(os.getenv('RABBITMQ_RETRY_SLEEP',"3")),
+			max_in_flight:int=int(os.getenv('RABBITMQ_MAX_IN_FLIGHT',"256")),
+			loop:asyncio.AbstractEventLoop=None,
+			codec=None,
+			compressor=None,
+			reconnect_initial_seconds:float=float(os.getenv('RABBITMQ_RECONNECT_INITIAL_DELAY',"0.1")),
+			reconnect_max_seconds:float=float(os.getenv('RABBITMQ_RECONNECT_MAX_DELAY',"10")),
+			blocked_connection_timeout:float=float(os.getenv('RABBITMQ_BLOCKED_CONNECTION_TIMEOUT',"60")),
+			max_pending_publications:int=int(os.getenv('RABBITMQ_MAX_PENDING_PUBLICATIONS',"10000"))
+		):
+		"""Initialize the service. The connection is open when start to consume or when call 'connect'.
+
+		Parameters
+		----------
+		host : str
+			The RabbitMQ server host name. By default uses the environment variable RABBITMQ_HOST
+			and if it is not defined uses 'mov-mq'.
+		port : int
+			The RabbitMQ server port. By default uses the environment variable RABBITMQ_PORT
+			and if it is not defined uses '5672'.
+		username : str
+			The user name of the credential to connect to the RabbitMQ serve. By default uses the environment
+			variable RABBITMQ_USERNAME and if it is not defined uses 'mov'.
+		password : str
+			The password of the credential to connect to the RabbitMQ serve. By default uses the environment
+			variable RABBITMQ_PASSWORD and if it is not defined uses 'password'.
+		max_retries : int
+			The number maximum of tries to create a connection with the RabbitMQ server. By default uses
+			the environment variable RABBITMQ_MAX_RETRIES and if it is not defined uses '100'.
+		retry_sleep_seconds : int
+			The seconds to wait between the tries for create a connection with the RabbitMQ server.
+			By default uses the environment variable RABBITMQ_RETRY_SLEEP and if it is not defined uses '3'.
+		max_in_flight : int
+			The maximum number of messages that the coroutine callbacks can process at the same time.
+			By default uses the environment variable RABBITMQ_MAX_IN_FLIGHT and if it is not defined uses '256'.
+		loop : asyncio.AbstractEventLoop
+			The event loop to use. By default a new one is created.
+		codec: object
+			The codec to encode the published messages and to decode the received ones. By default uses
+			the codec of the environment variable MESSAGE_CODEC and if it is not defined uses the fastest
+			that is installed.
+		compressor: PayloadCompressor
+			The compressor of the published messages that are large. By default uses the compression of the
+			environment variables MESSAGE_COMPRESSION and MESSAGE_COMPRESSION_THRESHOLD. The received messages
+			with a content encoding are always decompressed before calling the callbacks.
+		reconnect_initial_seconds : float
+			The seconds to wait before the first try to connect again with the RabbitMQ server when the connection
+			is lost while consuming. Each failed try doubles the wait, with a random jitter. By default uses the
+			environment variable RABBITMQ_RECONNECT_INITIAL_DELAY and if it is not defined uses '0.1'.
+		reconnect_max_seconds : float
+			The maximum seconds to wait between the tries to connect again with the RabbitMQ server. By default
+			uses the environment variable RABBITMQ_RECONNECT_MAX_DELAY and if it is not defined uses '10'.
+		blocked_connection_timeout : float
+			The maximum seconds that the connection can be blocked by the broker, because of a memory or
+			disk alarm, before it is closed and open again. By default uses the environment variable
+			RABBITMQ_BLOCKED_CONNECTION_TIMEOUT and if it is not defined uses '60'.
+		max_pending_publications : int
+			The maximum number of messages that wait for the channel to be open, or for the broker to unblock
+			it, before the publications fail. By default uses the environment variable
+			RABBITMQ_MAX_PENDING_PUBLICATIONS and if it is not defined uses '10000'.
+		"""
+
+		self.credentials = pika.PlainCredentials(username=username,password=password)
+		self.host=host
+		self.port=port
+		self.connection_parameters = pika.ConnectionParameters(host=self.host,port=self.port,credentials=self.credentials,
+			blocked_connection_timeout=blocked_connection_timeout)
+		# While the broker blocks the publications the consumers are paused and the messages are kept
+		self.flow_control = FlowControl()
+		self.flow_control.add_listener(lambda blocked: self.__call_in_loop(self.__pause_consuming if blocked else self.__resume_consuming))
+		self.max_retries = max_retries
+		self.retry_sleep_seconds = retry_sleep_seconds
+		self.max_in_flight = max_in_flight
+		self.max_pending_publications = max_pending_publications
+		self.reconnect_initial_seconds = reconnect_initial_seconds
+		self.reconnect_max_seconds = reconnect_max_seconds
+		self.loop = loop if loop is not None else asyncio.new_event_loop()
+		self.codec = codec if codec is not None else create_codec()
+		self.compressor = compressor if compressor is not None else create_compressor()
+		self.connection = None
+		self.channel = None
+		self.__listeners = []
+		self.__consumer_tags = []
+		self.__paused = False
+		self.__executors = []
+		self.__pending = deque()
+		self.__tasks = set()
+		self.__closed = None
+		self.__closing = False
+
+
+	def __call_in_loop(self, callback, *args):
+		"""Call a function in the thread of the event loop."""
+
+		try:
+
+			running_loop = asyncio.get_running_loop()
+
+		except RuntimeError:
+
+			running_loop = None
+
+		if running_loop is self.loop:
+
+			callback(*args)
+
+		else:
+
+			self.loop.call_soon_threadsafe(callback,*args)
+
+
+	async def connect(self):
+		"""Open the connection to the RabbitMQ, and start to consume the registered queues."""
+
+		self.__closed = self.loop.create_future()
+		tries=0
+		while tries < self.max_retries:
+
+			try:
+
+				self.channel = await self.__open()
+
+			except (OSError,pika.exceptions.AMQPError):
+
+				logging.warning("Connection was closed, retrying...")
+				RECONNECTS.labels('listen').inc()
+				await asyncio.sleep(self.retry_sleep_seconds)
+
+			else:
+
+				self.__subscribe_all()
+				return
+
+			tries+=1
+
+		error_msg = f"Cannot listen from the RabbitMQ at {self.host}:{self.port}"
+		raise ValueError(error_msg)
+
+
+	async def __reconnect(self):
+		"""Open again the connection when it is lost, waiting between the tries with a capped exponential
+		backoff and jitter, and subscribe again to all the listened queues."""
+
+		for attempt in range(self.max_retries):
+
+			await asyncio.sleep(backoff_delay(attempt,self.reconnect_initial_seconds,self.reconnect_max_seconds))
+			if self.__closing:
+
+				return
+
+			RECONNECTS.labels('listen').inc()
+			self.__closed = self.loop.create_future()
+			try:
+
+				self.channel = await self.__open()
+
+			except (OSError,pika.exceptions.AMQPError):
+
+				logging.warning("Cannot reconnect to RabbitMQ, retrying...")
+
+			else:
+
+				self.__subscribe_all()
+				logging.info("Reconnected to RabbitMQ after %s tries",attempt + 1)
+				return
+
+		error_msg = f"Cannot reconnect to the RabbitMQ at {self.host}:{self.port}"
+		raise ValueError(error_msg)
+
+
+	def __subscribe_all(self):
+		"""Subscribe to all the listened queues and publish the pending messages. It must be called in the event loop."""
+
+		self.__consumer_tags = []
+		for queue,callback,prefetch,auto_ack in self.__listeners:
+
+			self.__subscribe(queue,callback,prefetch,auto_ack)
+
+		self.__flush()
+
+
+	def __open(self):
+		"""Open a connection and a channel, and return a future with the channel."""
+
+		opened = self.loop.create_future()
+
+		def on_open_error(_connection, error):
+			if not opened.done():
+				opened.set_exception(error if isinstance(error,(OSError,pika.exceptions.AMQPError)) else pika.exceptions.AMQPConnectionError(error))
+
+		def on_open(connection):
+			connection.channel(on_open_callback=lambda channel: opened.done() or opened.set_result(channel))
+
+		self.connection = AsyncioConnection(self.connection_parameters,
+			on_open_callback=on_open,
+			on_open_error_callback=on_open_error,
+			on_close_callback=self.__on_connection_closed,
+			custom_ioloop=self.loop)
+		self.flow_control.watch(self.connection)
+		return opened
+
+
+	def __on_connection_closed(self, connection, reason):
+		"""Called when the connection is closed."""
+
+		self.channel = None
+		self.flow_control.unblock(connection)
+		if self.__closed is not None and not self.__closed.done():
+
+			self.__closed.set_result(reason)
+
+
+	def close(self):
+		"""Close the connections."""
+
+		self.__closing = True
+		try:
+
+			if self.connection is not None and not self.connection.is_closing and not self.connection.is_closed:
+
+				if self.loop.is_running():
+
+					self.__call_in_loop(self.connection.close)
+
+				else:
+
+					self.connection.close()
+					self.loop.run_until_complete(self.__closed)
+
+		except (OSError,pika.exceptions.AMQPError):
+
+			logging.exception("Cannot close the connection to RabbitMQ")
+
+		except BaseException:
+
+			logging.exception("Unexpected close RabbitMQ connection status")
+
+		for executor in self.__executors:
+
+			executor.shutdown(wait=False,cancel_futures=True)
+
+
+	def listen_for(self,queue:str,callback,workers:int=0,prefetch:int=0,auto_ack:bool=True):
+		"""Register a input channel
+
+		Parameters
+		----------
+		queue : str
+			The name of the queue to listen.
+		callback: method
+			The method, or coroutine function, to call when a message is received.
+		workers : int
+			The number of threads that process the messages of the queue when the callback is not
+			a coroutine function. If it is '0' the callback is called on the event loop.
+		prefetch : int
+			The maximum number of messages that are not acknowledged. If it is '0' it is
+			the number of workers, or the maximum messages in flight for a coroutine function,
+			or unlimited when the messages are not acknowledged automatically.
+		auto_ack : bool
+			If it is false and the callback is called on the event loop, the messages are not
+			acknowledged when they are received and the callback must acknowledge them with
+			the received channel.
+		"""
+
+		# The coroutine callbacks, and the ones of the workers, are acknowledged when they finish, or rejected when they fail
+		callback = instrument_callback(queue,decompress_callback(callback,not auto_ack and workers == 0 and not inspect.iscoroutinefunction(callback)))
+		if workers > 0 and not inspect.iscoroutinefunction(callback):
+
+			executor = ThreadPoolExecutor(max_workers=workers,thread_name_prefix='consumer-worker')
+			self.__executors.append(executor)
+			sync_callback = callback
+
+			async def callback(ch, method, properties, body):
+				await self.loop.run_in_executor(executor,sync_callback,ch,method,properties,body)
+
+			prefetch = prefetch if prefetch > 0 else workers
+
+		self.__listeners.append((queue,callback,prefetch,auto_ack))
+		if self.channel is not None:
+
+			self.__call_in_loop(self.__subscribe,queue,callback,prefetch,auto_ack)
+
+
+	def __subscribe(self,queue:str,callback,prefetch:int,auto_ack:bool):
+		"""Declare a queue and start to consume it. It must be called in the event loop."""
+
+		channel = self.channel
+		if inspect.iscoroutinefunction(callback):
+
+			prefetch = prefetch if prefetch > 0 else self.max_in_flight
+
+			def on_message(ch, method, properties, body):
+				task = self.loop.create_task(self.__process(callback,ch,method,properties,body))
+				self.__tasks.add(task)
+				task.add_done_callback(self.__tasks.discard)
+
+			on_message_callback = on_message
+			auto_ack = False
+
+		else:
+
+			prefetch = prefetch if not auto_ack else 0
+			on_message_callback = callback
+
+		def consume(_frame):
+			if not self.__paused:
+				# The prefetch applies to the consumers started after it, so it is set just before each one, including the unlimited ones
+				channel.basic_qos(prefetch_count=prefetch)
+				self.__consumer_tags.append(channel.basic_consume(queue=queue,auto_ack=auto_ack,on_message_callback=on_message_callback))
+
+		channel.queue_declare(queue=queue,
+			durable=True,
+			exclusive=False,
+			auto_delete=False,
+			callback=consume)
+		logging.debug("Listen for the queue %s",queue)
+
+
+	async def __process(self, callback, ch, method, properties, body):
+		"""Run a coroutine callback and acknowledge the message when it finishes, or reject it if it fails."""
+
+		processed = True
+		try:
+
+			await callback(ch,method,properties,body)
+
+		except Exception:
+
+			logging.exception("Cannot process a message of the queue %s",method.routing_key)
+			processed = False
+
+		if not ch.is_open:
+
+			return
+
+		if processed:
+
+			ch.basic_ack(delivery_tag=method.delivery_tag)
+
+		else:
+
+			ch.basic_nack(delivery_tag=method.delivery_tag,requeue=False)
+
+
+	def __encode(self,msg):
+		"""Return the body to publish a message, that is not encoded again if it is already bytes, and its
+		content encoding, that is None if it is not compressed."""
+
+		if isinstance(msg,(bytes,bytearray,memoryview)):
+
+			return self.compressor.compress(msg)
+
+		return self.compressor.compress(self.codec.encode(msg))
+
+
+	def __pause_consuming(self):
+		"""Cancel the consumers, so no more messages are received that cannot be published. It must be called in the event loop."""
+
+		if self.__paused:
+
+			return
+
+		self.__paused = True
+		if self.channel is not None and self.channel.is_open:
+
+			for consumer_tag in self.__consumer_tags:
+
+				self.channel.basic_cancel(consumer_tag)
+
+		self.__consumer_tags = []
+		logging.warning("Paused the consumers while the RabbitMQ blocks the publications")
+
+
+	def __resume_consuming(self):
+		"""Start again the consumers and publish the kept messages. It must be called in the event loop."""
+
+		if not self.__paused:
+
+			return
+
+		self.__paused = False
+		if self.channel is not None and self.channel.is_open:
+
+			self.__subscribe_all()
+
+		logging.info("Resumed the consumers")
+
+
+	def __message_properties(self,trace_id:str=None,content_encoding:str=None):
+		"""Return the properties to publish a message, with the headers to trace it."""
+
+		return pika.BasicProperties(content_type='application/json',content_encoding=content_encoding,headers=trace_headers(trace_id))
+
+
+	def __publish(self, queue:str, body, properties:pika.BasicProperties):
+		"""Publish a message or keep it until the channel is open and the broker does not block it. It must be called in the event loop."""
+
+		if self.channel is not None and self.channel.is_open and not self.flow_control.is_blocked():
+
+			self.channel.basic_publish(exchange='',routing_key=queue,body=body,properties=properties)
+			logging.debug("Publish message to the queue %s",queue)
+
+		elif not self.__pending_full():
+
+			self.__pending.append((queue,body,properties))
+
+		else:
+
+			PUBLISH_FAILURES.labels(queue).inc()
+			logging.warning("Cannot publish a msg in the queue %s, because there are too many messages pending to publish",queue)
+
+
+	def __pending_full(self):
+		"""Check if the messages that wait for the channel to be open, or for the broker to unblock it, have reached the maximum."""
+
+		return len(self.__pending) >= self.max_pending_publications
+
+
+	def __publish_all(self, encoded):
+		"""Publish a batch of encoded messages with their properties. It must be called in the event loop."""
+
+		for queue,body,properties in encoded:
+
+			self.__publish(queue,body,properties)
+
+
+	def __flush(self):
+		"""Publish the messages that were sent before the channel was open, or while the broker blocked it."""
+
+		while self.__pending and self.channel is not None and self.channel.is_open and not self.flow_control.is_blocked():
+
+			queue,body,properties = self.__pending.popleft()
+			self.channel.basic_publish(exchange='',routing_key=queue,body=body,properties=properties)
+
+
+	def publish_to(self,queue:str,msg,trace_id:str=None):
+		"""Publish a message into a queue without blocking the caller
+
+		Parameters
+		----------
+		queue : str
+			The name of the queue to publish the event.
+		msg: object
+			The message to send, or the bytes of the message already encoded as JSON.
+		trace_id: str
+			The identifier of the trace of the message, like the one of a received message that it answers,
+			or None to start a new trace. It is sent with the time of the publication in the headers.
+		"""
+
+		start = time.perf_counter()
+		try:
+
+			body,content_encoding=self.__encode(msg)
+			if self.__pending_full():
+
+				PUBLISH_FAILURES.labels(queue).inc()
+				logging.warning("Cannot publish a msg in the queue %s, because there are too many messages pending to publish",queue)
+
+			else:
+
+				self.__call_in_loop(self.__publish,queue,body,self.__message_properties(trace_id,content_encoding))
+				MESSAGES_PUBLISHED.labels(queue).inc()
+
+		except (OSError,pika.exceptions.AMQPError,RuntimeError):
+
+			PUBLISH_FAILURES.labels(queue).inc()
+			logging.exception("Cannot publish a msg in the queue %s",queue)
+
+		except (TypeError,ValueError):
+
+			PUBLISH_FAILURES.labels(queue).inc()
+			logging.exception("Cannot publish a msg because can not encode the message")
+
+		PUBLISH_DURATION.observe(time.perf_counter() - start)
+
+
+	def publish_many(self,queue:str,msgs,trace_ids=None):
+		"""Publish a batch of messages into a queue
+
+		Parameters
+		----------
+		queue : str
+			The name of the queue to publish the events.
+		msgs: iterable
+			The messages to send, or the bytes of the messages already encoded as JSON.
+		trace_ids: iterable
+			The identifier of the trace of each message, or None to start a new trace for each one.
+
+		Returns
+		-------
+		list of bool
+			For each message, True if it has been published.
+		"""
+
+		return self.publish_batch(((queue,msg) for msg in msgs),trace_ids)
+
+
+	def publish_batch(self,messages,trace_ids=None):
+		"""Publish a batch of messages, that can go to different queues, with one call to the event loop
+
+		Parameters
+		----------
+		messages : iterable
+			The pairs with the name of the queue and the message to send, or the bytes of the message
+			already encoded as JSON.
+		trace_ids: iterable
+			The identifier of the trace of each message, or None to start a new trace for each one.
+
+		Returns
+		-------
+		list of bool
+			For each message, True if it has been published.
+		"""
+
+		start = time.perf_counter()
+		trace_ids = list(trace_ids) if trace_ids is not None else None
+		outcomes = []
+		encoded = []
+		for index,(queue,msg) in enumerate(messages):
+
+			try:
+
+				body,content_encoding=self.__encode(msg)
+				encoded.append((queue,body,self.__message_properties(trace_ids[index] if trace_ids is not None else None,content_encoding)))
+				outcomes.append(True)
+
+			except (TypeError,ValueError):
+
+				PUBLISH_FAILURES.labels(queue).inc()
+				logging.exception("Cannot publish a msg because can not encode the message")
+				outcomes.append(False)
+
+		if self.__pending_full():
+
+			logging.warning("Cannot publish a batch of messages, because there are too many messages pending to publish")
+			for queue,_body,_properties in encoded:
+
+				PUBLISH_FAILURES.labels(queue).inc()
+
+			return [False] * len(outcomes)
+
+		try:
+
+			self.__call_in_loop(self.__publish_all,encoded)
+
+		except RuntimeError:
+
+			logging.exception("Cannot publish the batch of messages")
+			for queue,_body,_properties in encoded:
+
+				PUBLISH_FAILURES.labels(queue).inc()
+
+			return [False] * len(outcomes)
+
+		for queue,_body,_properties in encoded:
+
+			MESSAGES_PUBLISHED.labels(queue).inc()
+
+		PUBLISH_DURATION.observe(time.perf_counter() - start)
+		return outcomes
+
+
+	async def consume(self):
+		"""Connect to the RabbitMQ and process the messages until the service is closed. When the connection
+		is lost, it is open again and all the listened queues are subscribed again."""
+
+		if self.channel is None:
+
+			await self.connect()
+
+		while True:
+
+			reason = await self.__closed
+			if self.__closing:
+
+				break
+
+			logging.warning("Lost the connection to RabbitMQ, because %s, reconnecting...",reason)
+			await self.__reconnect()
+
+		if self.__tasks:
+
+			await asyncio.gather(*self.__tasks,return_exceptions=True)
+
+
+	def start_consuming(self):
+		"""Start to consume the messages."""
+
+		try:
+
+			logging.info("Start listening for events")
+			self.loop.run_until_complete(self.consume())
+
+		except KeyboardInterrupt:
+
+			logging.info("Stop listening for events")
+
+		except (pika.exceptions.AMQPError,ValueError):
+
+			logging.exception("Closed connection")
+
+		except BaseException:
+
+			logging.exception("Consuming messages error.")
+
+	def start_consuming_and_forget(self):
+		"""Start to consume the messages using an independent Thread."""
+
+		Thread(target=self.start_consuming).start()
+
+	def call_later(self,delay:float,callback):
+		"""Call a function on the event loop after a delay.
+
+		Parameters
+		----------
+		delay : float
+			The seconds to wait before calling the function.
+		callback: method
+			The function to call without arguments.
+		"""
+
+		self.__call_in_loop(self.loop.call_later,delay,callback)
@@ -0,0 +1,45 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import random
+
+
+def backoff_delay(attempt:int, initial_seconds:float, max_seconds:float):
+	"""Return the seconds to wait before a retry, that grow exponentially up to a maximum.
+
+	The delay is chosen at random between the half and the whole of the exponential delay, so the
+	processes that have lost the connection at the same time do not retry all at once.
+
+	Parameters
+	----------
+	attempt : int
+		The number of retries that have failed before this one.
+	initial_seconds : float
+		The delay of the first retry.
+	max_seconds : float
+		The maximum delay of any retry.
+
+	Returns
+	-------
+	float
+		The seconds to wait before the retry.
+	"""
+
+	delay = min(max_seconds,initial_seconds * (2 ** min(attempt,32)))
+	return random.uniform(delay / 2,delay)
@@ -0,0 +1,329 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import functools
+import inspect
+import logging
+
+import component_metadata
+import yaml
+from echo_payload import EchoPayload
+from pydantic import TypeAdapter, ValidationError
+
+# The pydantic types of the payloads of the schemas of the AsyncAPI
+PAYLOAD_TYPES = {
+	'echo_payload': EchoPayload
+	}
+
+
+def _resolve(document:dict, ref:str):
+	"""Return the mapping of a local reference, like '#/components/messages/echo_message', or None if it does not exist."""
+
+	node = document
+	for name in ref.lstrip('#/').split('/'):
+
+		if not isinstance(node,dict) or name not in node:
+
+			return None
+
+		node = node[name]
+
+	return node
+
+
+class AsyncAPIChannel:
+	"""A channel of the AsyncAPI of the component."""
+
+	def __init__(self, name:str, description:str, operation:str, schema:str, payload:dict=None):
+		"""Initialize the channel
+
+		Parameters
+		----------
+		name : str
+			The name of the channel, that is the queue of the RabbitMQ.
+		description : str
+			The description of the channel.
+		operation : str
+			It is 'subscribe' if the component receives the messages of the channel, or 'publish' if it sends them.
+		schema : str
+			The name of the schema of the payload of the messages, or None if it is not defined.
+		payload : dict
+			The JSON schema of the payload of the messages, or None if it is not defined.
+		"""
+		self.name = name
+		self.description = description
+		self.operation = operation
+		self.schema = schema
+		self.payload = payload
+
+
+def parse_channels(asyncapi:str):
+	"""Return the channels that an AsyncAPI defines.
+
+	Parameters
+	----------
+	asyncapi : str
+		The AsyncAPI as YAML.
+
+	Returns
+	-------
+	dict
+		The AsyncAPIChannel of each channel name.
+	"""
+
+	document = yaml.safe_load(asyncapi)
+	if not isinstance(document,dict):
+
+		return {}
+
+	channels = {}
+	for name,channel in (document.get('channels') or {}).items():
+
+		channel = channel or {}
+		for operation in ('subscribe','publish'):
+
+			if isinstance(channel.get(operation),dict):
+
+				message = channel[operation].get('message') or {}
+				if '$ref' in message:
+
+					message = _resolve(document,message['$ref']) or {}
+
+				payload = message.get('payload') or {}
+				schema = None
+				if '$ref' in payload:
+
+					schema = payload['$ref'].rsplit('/',1)[-1]
+					payload = _resolve(document,payload['$ref']) or {}
+
+				channels[name] = AsyncAPIChannel(name,channel.get('description'),operation,schema,payload or None)
+				break
+
+	return channels
+
+
+@functools.cache
+def component_channels():
+	"""Return the channels of the AsyncAPI of the component, that are parsed only the first time."""
+
+	return parse_channels(component_metadata.asyncapi_yaml())
+
+
+@functools.cache
+def _type_adapter(payload_type):
+	"""Return the validator of a payload type, that is compiled only once."""
+
+	return TypeAdapter(payload_type)
+
+
+def _check_payload_type(channel:AsyncAPIChannel, payload_type):
+	"""Check that a payload type has the properties, and their types, of the payload schema of a channel.
+
+	Raises
+	------
+	ValueError
+		If the payload type does not match the schema.
+	"""
+
+	properties = (channel.payload or {}).get('properties')
+	if not isinstance(properties,dict):
+
+		return
+
+	type_properties = _type_adapter(payload_type).json_schema().get('properties',{})
+	if set(properties) != set(type_properties):
+
+		raise ValueError(f"The properties of {payload_type} are not the ones of the schema {channel.schema} of the channel {channel.name}")
+
+	for name,schema in properties.items():
+
+		json_type = schema.get('type') if isinstance(schema,dict) else None
+		if json_type is not None and type_properties[name].get('type',json_type) != json_type:
+
+			raise ValueError(f"The property {name} of {payload_type} is not of the type {json_type} of the schema {channel.schema}")
+
+
+class ChannelRouter:
+	"""Bind the handlers of the messages to the channels that the AsyncAPI of the component receives.
+
+	The handlers are registered with the decorator 'route', that checks the channel and compiles
+	the validator of the schema of its payload once. When the router is bound, each queue is listened
+	with the callback of its route, so the messages are not dispatched by their routing key, that is not
+	the name of the queue when they arrive through an exchange binding or a dead letter exchange, and each
+	message only calls the validator and the handler of its channel. The handlers are called with the channel,
+	the delivery method, the properties and the validated payload, or the body if the schema of the
+	channel has not a payload type or the route does not validate the bodies.
+	"""
+
+	def __init__(self, channels:dict=None, payload_types:dict=None):
+		"""Initialize a router without routes
+
+		Parameters
+		----------
+		channels : dict
+			The AsyncAPIChannel of each channel name. By default the channels of the AsyncAPI of the component.
+		payload_types : dict
+			The type, like a pydantic model, of each schema name of the payloads. By default PAYLOAD_TYPES.
+		"""
+		self.channels = channels if channels is not None else component_channels()
+		self.payload_types = payload_types if payload_types is not None else PAYLOAD_TYPES
+		self.routes = {}
+
+	def channel(self, suffix:str):
+		"""Return the name of the channel of the component that ends with a suffix, like 'data/received_message'.
+
+		Raises
+		------
+		ValueError
+			If the AsyncAPI does not define the channel.
+		"""
+
+		if suffix in self.channels:
+
+			return suffix
+
+		for name in self.channels:
+
+			if name.endswith('/' + suffix):
+
+				return name
+
+		raise ValueError(f"The AsyncAPI does not define a channel for {suffix}")
+
+	def payload_type(self, channel:str):
+		"""Return the type of the payload schema of a channel, or its suffix, or None if the schema has not a type."""
+
+		return self.payload_types.get(self.channels[self.channel(channel)].schema)
+
+	def validator(self, channel:str):
+		"""Return the validator, compiled once, of the payload of a channel, or its suffix, or None if the schema has not a type."""
+
+		payload_type = self.payload_type(channel)
+		return _type_adapter(payload_type) if payload_type is not None else None
+
+	def route(self, channel:str, payload_type=None, validate:bool=True, **listen_options):
+		"""Return a decorator that binds a handler to a channel that the component receives.
+
+		Parameters
+		----------
+		channel : str
+			The name of the channel, or its suffix, like 'data/received_message'.
+		payload_type : type
+			The type, like a pydantic model, to validate the received bodies, that must have the properties
+			of the payload schema of the channel. If it is None it is the type of the schema of the channel.
+		validate : bool
+			If it is false the handler receives the bodies without validating them, and it can validate them
+			with the validator of the channel.
+		listen_options : dict
+			The arguments to listen for the channel, like 'workers', 'prefetch' or 'auto_ack'.
+
+		Raises
+		------
+		ValueError
+			If the AsyncAPI does not define the channel, the component does not receive its messages or the
+			payload type does not match the schema of the channel.
+		"""
+
+		name = self.channel(channel)
+		if self.channels[name].operation != 'subscribe':
+
+			raise ValueError(f"The component does not receive the messages of the channel {name}")
+
+		if not validate:
+
+			payload_type = None
+
+		elif payload_type is None:
+
+			payload_type = self.payload_type(name)
+
+		else:
+
+			_check_payload_type(self.channels[name],payload_type)
+
+		def decorator(handler):
+			self.routes[name] = (self.__callback(name,handler,payload_type,listen_options),listen_options)
+			return handler
+
+		return decorator
+
+	def __callback(self, name:str, handler, payload_type, listen_options:dict):
+		"""Return the callback of a route, that validates the bodies with the validator of its payload type.
+
+		The invalid messages of the handlers that run on workers, or that are coroutine functions, raise
+		the validation error, because the service that calls them rejects the messages that fail. The
+		other invalid messages are rejected here if the handler must acknowledge them, or ignored.
+		"""
+
+		if payload_type is None:
+
+			return handler
+
+		validate_json = _type_adapter(payload_type).validate_json
+		settled_by_service = listen_options.get('workers',0) > 0 or inspect.iscoroutinefunction(handler)
+		reject = not settled_by_service and not listen_options.get('auto_ack',True)
+
+		def validated_payload(ch, method, body):
+			try:
+
+				return validate_json(body)
+
+			except ValidationError:
+
+				if settled_by_service:
+
+					raise
+
+				logging.exception("Received an invalid message on the channel %s",name)
+				if reject:
+
+					ch.basic_nack(delivery_tag=method.delivery_tag,requeue=False)
+
+				return None
+
+		if inspect.iscoroutinefunction(handler):
+
+			async def callback(ch, method, properties, body):
+				payload = validated_payload(ch,method,body)
+				if payload is not None:
+
+					return await handler(ch,method,properties,payload)
+
+		else:
+
+			def callback(ch, method, properties, body):
+				payload = validated_payload(ch,method,body)
+				if payload is not None:
+
+					return handler(ch,method,properties,payload)
+
+		return callback
+
+	def bind(self, message_service):
+		"""Listen for the channel of each route with its callback.
+
+		Parameters
+		----------
+		message_service : MessageService
+			The service that receives the messages.
+		"""
+
+		for name,(callback,listen_options) in self.routes.items():
+
+			message_service.listen_for(name,callback,**listen_options)
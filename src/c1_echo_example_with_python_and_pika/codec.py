@@ -0,0 +1,159 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import logging
+import os
+
+try:
+
+	import orjson
+
+except ImportError:
+
+	orjson = None
+
+try:
+
+	import msgspec
+
+except ImportError:
+
+	msgspec = None
+
+
+class JsonCodec:
+	"""Encode and decode the messages with the JSON library of Python."""
+
+	name = 'json'
+
+	def encode(self, msg):
+		"""Return the JSON bytes of a message."""
+
+		return json.dumps(msg).encode('utf-8')
+
+	def decode(self, body):
+		"""Return the message of some JSON bytes."""
+
+		return json.loads(body)
+
+
+class OrjsonCodec:
+	"""Encode and decode the messages with orjson."""
+
+	name = 'orjson'
+
+	def encode(self, msg):
+		"""Return the JSON bytes of a message."""
+
+		return orjson.dumps(msg)
+
+	def decode(self, body):
+		"""Return the message of some JSON bytes."""
+
+		return orjson.loads(body)
+
+
+class MsgspecCodec:
+	"""Encode and decode the messages with msgspec."""
+
+	name = 'msgspec'
+
+	def __init__(self):
+		"""Initialize the reusable encoder and decoder."""
+
+		self.encoder = msgspec.json.Encoder()
+		self.decoder = msgspec.json.Decoder()
+
+	def encode(self, msg):
+		"""Return the JSON bytes of a message."""
+
+		try:
+
+			return self.encoder.encode(msg)
+
+		except msgspec.EncodeError as error:
+
+			raise ValueError(str(error)) from error
+
+	def decode(self, body):
+		"""Return the message of some JSON bytes."""
+
+		try:
+
+			return self.decoder.decode(body)
+
+		except msgspec.DecodeError as error:
+
+			raise ValueError(str(error)) from error
+
+
+def available_codecs():
+	"""Return the names of the codecs that can be used, from the fastest to the slowest."""
+
+	names = []
+	if orjson is not None:
+
+		names.append(OrjsonCodec.name)
+
+	if msgspec is not None:
+
+		names.append(MsgspecCodec.name)
+
+	names.append(JsonCodec.name)
+	return names
+
+
+def create_codec(name:str=os.getenv('MESSAGE_CODEC','auto')):
+	"""Create the codec to encode and decode the messages.
+
+	Parameters
+	----------
+	name : str
+		The name of the codec, that can be 'json', 'orjson', 'msgspec' or 'auto' to use the fastest
+		that is installed. By default uses the environment variable MESSAGE_CODEC and if it is not
+		defined uses 'auto'.
+
+	Returns
+	-------
+	object
+		The codec, or the JSON library of Python if the codec is not installed.
+	"""
+
+	available = available_codecs()
+	if name == 'auto':
+
+		name = available[0]
+
+	elif name not in available:
+
+		logging.warning("The codec '%s' is not available, using '%s'",name,JsonCodec.name)
+		name = JsonCodec.name
+
+	if name == OrjsonCodec.name:
+
+		return OrjsonCodec()
+
+	elif name == MsgspecCodec.name:
+
+		return MsgspecCodec()
+
+	else:
+
+		return JsonCodec()
@@ -0,0 +1,88 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import functools
+import importlib.metadata
+import importlib.resources
+import os
+import re
+
+# The name of the distribution that is installed with the package
+DISTRIBUTION_NAME = 'C1_echo_example_with_python_and_pika'
+# The package that contains the AsyncAPI of the component in the built wheels
+PACKAGE_NAME = 'c1_echo_example_with_python_and_pika'
+ASYNCAPI_FILE_NAME = 'asyncapi.yaml'
+REGISTERED_CHANNEL = re.compile(r"valawai/(c[0|1|2]/\w+)/control/registered:")
+
+
+def _read_source_file(name:str):
+	"""Read a file of the root of the source tree, that is used when the package is not installed from a wheel."""
+
+	file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','..',name)
+	with open(file_path) as file:
+
+		return file.read()
+
+
+@functools.cache
+def project_version():
+	"""Return the version of the component.
+
+	It is the version of the installed distribution, or if it is not installed the version of the
+	'pyproject.toml' of the source tree.
+	"""
+
+	try:
+
+		return importlib.metadata.version(DISTRIBUTION_NAME)
+
+	except importlib.metadata.PackageNotFoundError:
+
+		pyproject = _read_source_file('pyproject.toml')
+		return re.search(r"version\s*=\s*\"(\d+\.\d+\.\d+)\"",pyproject).group(1)
+
+
+@functools.cache
+def asyncapi_yaml():
+	"""Return the AsyncAPI that describes the component.
+
+	It is the resource of the package that is included when the wheel is built, or if it does not exist
+	the file of the source tree, like when the package is installed in editable mode.
+	"""
+
+	try:
+
+		resource = importlib.resources.files(PACKAGE_NAME).joinpath(ASYNCAPI_FILE_NAME)
+		if resource.is_file():
+
+			return resource.read_text(encoding='utf-8')
+
+	except (ModuleNotFoundError,OSError):
+
+		pass
+
+	return _read_source_file(ASYNCAPI_FILE_NAME)
+
+
+@functools.lru_cache(maxsize=4)
+def component_name(asyncapi:str):
+	"""Return the name of the component, like 'c1_echo_example_with_python_and_pika', from its AsyncAPI."""
+
+	match = REGISTERED_CHANNEL.search(asyncapi).group(1)
+	return match[0:2] + '_' + match[3:]
@@ -0,0 +1,328 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import functools
+import inspect
+import logging
+import os
+import threading
+import zlib
+
+try:
+
+	import zstandard
+
+except ImportError:
+
+	zstandard = None
+
+try:
+
+	import lz4.frame
+
+except ImportError:
+
+	lz4 = None
+
+
+class ZlibCompression:
+	"""Compress the bodies with the zlib library of Python."""
+
+	name = 'deflate'
+
+	def __init__(self, level:int=1):
+		"""Initialize the compression
+
+		Parameters
+		----------
+		level : int
+			The level of zlib. The JSON messages are compressed almost as much with '1' as with the
+			default '6', and faster.
+		"""
+		self.level = level
+
+	def compress(self, body):
+		"""Return the compressed bytes of a body."""
+
+		return zlib.compress(body,self.level)
+
+	def decompress(self, body):
+		"""Return the bytes of a compressed body."""
+
+		try:
+
+			return zlib.decompress(body)
+
+		except zlib.error as error:
+
+			raise ValueError(str(error)) from error
+
+
+class ZstdCompression:
+	"""Compress the bodies with zstandard."""
+
+	name = 'zstd'
+
+	def __init__(self):
+		"""Initialize the contexts of each thread, because they cannot be shared between threads."""
+
+		self.contexts = threading.local()
+
+	def compress(self, body):
+		"""Return the compressed bytes of a body."""
+
+		compressor = getattr(self.contexts,'compressor',None)
+		if compressor is None:
+
+			compressor = self.contexts.compressor = zstandard.ZstdCompressor()
+
+		return compressor.compress(body)
+
+	def decompress(self, body):
+		"""Return the bytes of a compressed body."""
+
+		decompressor = getattr(self.contexts,'decompressor',None)
+		if decompressor is None:
+
+			decompressor = self.contexts.decompressor = zstandard.ZstdDecompressor()
+
+		try:
+
+			return decompressor.decompress(body)
+
+		except zstandard.ZstdError as error:
+
+			raise ValueError(str(error)) from error
+
+
+class Lz4Compression:
+	"""Compress the bodies with the frames of lz4."""
+
+	name = 'lz4'
+
+	def compress(self, body):
+		"""Return the compressed bytes of a body."""
+
+		return lz4.frame.compress(body)
+
+	def decompress(self, body):
+		"""Return the bytes of a compressed body."""
+
+		try:
+
+			return lz4.frame.decompress(body)
+
+		except RuntimeError as error:
+
+			raise ValueError(str(error)) from error
+
+
+COMPRESSION_ENCODINGS = (ZlibCompression.name,ZstdCompression.name,Lz4Compression.name)
+"""The content encodings of the bodies compressed by this module, the other ones, like a charset, are not compressions."""
+
+
+def available_compressions():
+	"""Return the names of the compressions that can be used, from the one that compresses more to the one that less."""
+
+	names = []
+	if zstandard is not None:
+
+		names.append(ZstdCompression.name)
+
+	if lz4 is not None:
+
+		names.append(Lz4Compression.name)
+
+	names.append(ZlibCompression.name)
+	return names
+
+
+@functools.cache
+def _compression(name:str):
+	"""Return the compression of a content encoding, that is created only once."""
+
+	if name == ZstdCompression.name and zstandard is not None:
+
+		return ZstdCompression()
+
+	elif name == Lz4Compression.name and lz4 is not None:
+
+		return Lz4Compression()
+
+	elif name == ZlibCompression.name:
+
+		return ZlibCompression()
+
+	raise ValueError(f"The content encoding '{name}' is not supported")
+
+
+def decompress(body, content_encoding:str):
+	"""Return the bytes of a body that has been compressed with a content encoding.
+
+	Parameters
+	----------
+	body : bytes
+		The received body.
+	content_encoding : str
+		The content encoding of the body, or None if it is not compressed. The bodies with a content encoding
+		that is not one of COMPRESSION_ENCODINGS, like 'UTF-8' or 'gzip', are returned unchanged.
+
+	Raises
+	------
+	ValueError
+		If the library of the compression is not installed or the body cannot be decompressed.
+	"""
+
+	if content_encoding not in COMPRESSION_ENCODINGS:
+
+		return body
+
+	return _compression(content_encoding).decompress(body)
+
+
+class PayloadCompressor:
+	"""Compress the bodies to publish that are larger than a threshold."""
+
+	def __init__(self, compression=None, threshold:int=1024):
+		"""Initialize the compressor
+
+		Parameters
+		----------
+		compression : object
+			The compression to use, or None to not compress the bodies.
+		threshold : int
+			The minimum number of bytes of the bodies to compress.
+		"""
+		self.compression = compression
+		self.threshold = threshold
+		self.name = compression.name if compression is not None else 'none'
+
+	def compress(self, body):
+		"""Compress a body if it is large enough.
+
+		Parameters
+		----------
+		body : bytes
+			The encoded message to publish.
+
+		Returns
+		-------
+		tuple
+			The body to publish and its content encoding, that is None if the body is not compressed because
+			it is smaller than the threshold, or it does not get smaller.
+		"""
+
+		if self.compression is None or len(body) < self.threshold:
+
+			return body,None
+
+		compressed = self.compression.compress(body)
+		if len(compressed) >= len(body):
+
+			return body,None
+
+		return compressed,self.compression.name
+
+
+def create_compressor(name:str=os.getenv('MESSAGE_COMPRESSION','none'), threshold:int=int(os.getenv('MESSAGE_COMPRESSION_THRESHOLD',"1024"))):
+	"""Create the compressor of the bodies to publish.
+
+	Parameters
+	----------
+	name : str
+		The name of the compression, that can be 'none', 'deflate', 'zstd', 'lz4' or 'auto' to use the one that
+		compresses more that is installed. By default uses the environment variable MESSAGE_COMPRESSION and if
+		it is not defined uses 'none'.
+	threshold : int
+		The minimum number of bytes of the bodies to compress. By default uses the environment variable
+		MESSAGE_COMPRESSION_THRESHOLD and if it is not defined uses '1024'.
+
+	Returns
+	-------
+	PayloadCompressor
+		The compressor, that uses zlib if the compression is not installed.
+	"""
+
+	if name == 'none':
+
+		return PayloadCompressor(None,threshold)
+
+	available = available_compressions()
+	if name == 'auto':
+
+		name = available[0]
+
+	elif name not in available:
+
+		logging.warning("The compression '%s' is not available, using '%s'",name,ZlibCompression.name)
+		name = ZlibCompression.name
+
+	return PayloadCompressor(_compression(name),threshold)
+
+
+def decompress_callback(callback, reject:bool=False):
+	"""Wrap the callback of a queue to decompress the bodies that have been compressed by this module.
+
+	Parameters
+	----------
+	callback: method
+		The method, or coroutine function, to call when a message is received.
+	reject : bool
+		If it is true the messages that cannot be decompressed are rejected, because the callback
+		would have acknowledged them.
+
+	Returns
+	-------
+	method
+		The callback that receives the decompressed bodies, that is a coroutine function if the callback is.
+	"""
+
+	def decompressed_body(ch, method, properties, body):
+		try:
+
+			return decompress(body,getattr(properties,'content_encoding',None))
+
+		except ValueError:
+
+			logging.exception("Cannot decompress a message of the queue %s",getattr(method,'routing_key',None))
+			if reject:
+
+				ch.basic_nack(delivery_tag=method.delivery_tag,requeue=False)
+
+			return None
+
+	if inspect.iscoroutinefunction(callback):
+
+		@functools.wraps(callback)
+		async def decompressed(ch, method, properties, body):
+			body = decompressed_body(ch,method,properties,body)
+			if body is not None:
+
+				return await callback(ch,method,properties,body)
+
+	else:
+
+		@functools.wraps(callback)
+		def decompressed(ch, method, properties, body):
+			body = decompressed_body(ch,method,properties,body)
+			if body is not None:
+
+				return callback(ch,method,properties,body)
+
+	return decompressed
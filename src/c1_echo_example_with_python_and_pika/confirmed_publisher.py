@@ -0,0 +1,300 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import threading
+import time
+from collections import deque
+
+import pika
+from pika.adapters.select_connection import SelectConnection
+
+from flow_control import FlowControl
+from metrics import PUBLISH_FAILURES, RECONNECTS
+
+
+class ConfirmedPublisher:
+	"""Publish messages on a channel in confirm mode without waiting for each confirmation.
+
+	The connection runs its own I/O loop on an independent thread. The messages are
+	published as soon as possible and the delivery tags that the broker has not confirmed
+	are tracked, so an acknowledgement or a negative acknowledgement with the flag
+	'multiple' resolves all the messages up to its tag at once. The messages that are
+	rejected, or that are not confirmed before the connection is lost, are passed to
+	a retry hook. The messages that wait for the connection, or for the broker to unblock it,
+	are limited, so the publications fail when the broker cannot receive them for a long time.
+	"""
+
+	def __init__(self, parameters:pika.ConnectionParameters, retry_hook=None, max_retries:int=3, retry_sleep_seconds:float=3, flow_control:FlowControl=None, max_pending:int=10000):
+		"""Initialize the publisher and start its I/O thread
+
+		Parameters
+		----------
+		parameters : pika.ConnectionParameters
+			The parameters to connect to the RabbitMQ.
+		retry_hook: method
+			The method to call with the queue, body, properties and number of attempts of any
+			message that has not been delivered. By default the message is published again
+			until it reaches the maximum number of retries.
+		max_retries : int
+			The maximum number of times that the default retry hook publishes again a message.
+		retry_sleep_seconds : float
+			The seconds to wait before reconnecting when the connection is lost.
+		flow_control : FlowControl
+			The state to update when the broker blocks or unblocks the connection.
+		max_pending : int
+			The maximum number of messages that wait to be published. When there are more the
+			publications fail.
+		"""
+		self.parameters = parameters
+		self.retry_hook = retry_hook if retry_hook is not None else self.__retry
+		self.max_retries = max_retries
+		self.retry_sleep_seconds = retry_sleep_seconds
+		self.flow_control = flow_control if flow_control is not None else FlowControl()
+		self.max_pending = max_pending
+		self.connection = None
+		self.channel = None
+		self.__condition = threading.Condition()
+		self.__pending = deque()
+		self.__deliveries = {}
+		self.__delivery_tag = 0
+		self.__flush_scheduled = False
+		self.__stopping = False
+		self.__thread = threading.Thread(target=self.__run,daemon=True)
+		self.__thread.start()
+
+	def __run(self):
+		"""Keep a connection open until the publisher is closed."""
+
+		while not self.__stopping:
+
+			try:
+
+				self.connection = SelectConnection(self.parameters,
+					on_open_callback=self.__on_connection_open,
+					on_open_error_callback=self.__on_connection_open_error,
+					on_close_callback=self.__on_connection_closed)
+				self.flow_control.watch(self.connection)
+				self.connection.add_on_connection_unblocked_callback(lambda _connection,_frame: self.__flush())
+				self.connection.ioloop.start()
+
+			except (OSError,pika.exceptions.AMQPError):
+
+				logging.exception("Unexpected error on the confirmed publisher connection")
+
+			if not self.__stopping:
+
+				RECONNECTS.labels('confirm').inc()
+				time.sleep(self.retry_sleep_seconds)
+
+	def __on_connection_open(self, connection):
+		"""Called when the connection is open."""
+
+		connection.channel(on_open_callback=self.__on_channel_open)
+
+	def __on_connection_open_error(self, connection, error):
+		"""Called when the connection cannot be open."""
+
+		logging.warning("Cannot open the confirmed publisher connection, because %s",error)
+		connection.ioloop.stop()
+
+	def __on_connection_closed(self, connection, reason):
+		"""Called when the connection is closed."""
+
+		self.channel = None
+		self.flow_control.unblock(connection)
+		with self.__condition:
+
+			unconfirmed = list(self.__deliveries.values())
+			self.__deliveries.clear()
+			self.__flush_scheduled = False
+
+		if not self.__stopping:
+
+			logging.warning("Confirmed publisher connection closed, because %s",reason)
+
+		for queue,body,properties,attempts in unconfirmed:
+
+			self.retry_hook(queue,body,properties,attempts)
+
+		connection.ioloop.stop()
+
+	def __on_channel_open(self, channel):
+		"""Called when the channel is open."""
+
+		self.__delivery_tag = 0
+		self.channel = channel
+		channel.confirm_delivery(self.__on_delivery_confirmation)
+		self.__flush()
+
+	def __on_delivery_confirmation(self, method_frame):
+		"""Called when the broker confirms or rejects some published messages."""
+
+		method = method_frame.method
+		rejected = isinstance(method,pika.spec.Basic.Nack)
+		resolved = []
+		with self.__condition:
+
+			if method.multiple:
+
+				for delivery_tag in list(self.__deliveries):
+
+					if delivery_tag > method.delivery_tag:
+
+						break
+
+					resolved.append(self.__deliveries.pop(delivery_tag))
+
+			elif method.delivery_tag in self.__deliveries:
+
+				resolved.append(self.__deliveries.pop(method.delivery_tag))
+
+			self.__condition.notify_all()
+
+		if rejected:
+
+			for queue,body,properties,attempts in resolved:
+
+				logging.warning("The broker has not accepted a message for the queue %s",queue)
+				self.retry_hook(queue,body,properties,attempts)
+
+	def __retry(self, queue:str, body, properties:pika.BasicProperties, attempts:int):
+		"""Publish again a message that has not been delivered."""
+
+		if attempts < self.max_retries:
+
+			if not self.publish(queue,body,properties,attempts + 1):
+
+				PUBLISH_FAILURES.labels(queue).inc()
+				logging.error("Cannot publish again a message to the queue %s, because there are too many pending messages",queue)
+
+		else:
+
+			logging.error("Cannot deliver a message to the queue %s after %s attempts",queue,attempts + 1)
+
+	def __flush(self):
+		"""Publish the pending messages, while the broker does not block the connection. It must be called from the I/O thread."""
+
+		with self.__condition:
+
+			self.__flush_scheduled = False
+			while self.__pending and self.channel is not None and self.channel.is_open and not self.flow_control.is_blocked(self.connection):
+
+				queue,body,properties,attempts = self.__pending.popleft()
+				self.__delivery_tag += 1
+				self.__deliveries[self.__delivery_tag] = (queue,body,properties,attempts)
+				self.channel.basic_publish(exchange='',routing_key=queue,body=body,properties=properties)
+
+	def publish(self, queue:str, body, properties:pika.BasicProperties, attempts:int=0):
+		"""Publish a message without waiting for the confirmation of the broker.
+
+		Parameters
+		----------
+		queue : str
+			The name of the queue to publish the message.
+		body: bytes
+			The encoded message to send.
+		properties: pika.BasicProperties
+			The properties of the message.
+		attempts: int
+			The number of times that the message has been published before.
+
+		Returns
+		-------
+		bool
+			True if the message is published, or False if it is not because there are 'max_pending' messages
+			that wait for the connection to be open or unblocked.
+		"""
+
+		with self.__condition:
+
+			if len(self.__pending) >= self.max_pending:
+
+				return False
+
+			self.__pending.append((queue,body,properties,attempts))
+			if self.__flush_scheduled:
+
+				return True
+
+			self.__flush_scheduled = True
+
+		connection = self.connection
+		if connection is not None and connection.is_open:
+
+			connection.ioloop.add_callback_threadsafe(self.__flush)
+
+		return True
+
+	def outstanding(self):
+		"""Return the number of messages that are pending to publish or to be confirmed."""
+
+		with self.__condition:
+
+			return len(self.__pending) + len(self.__deliveries)
+
+	def wait_for_confirms(self, timeout:float=None):
+		"""Wait until all the published messages are confirmed.
+
+		Parameters
+		----------
+		timeout : float
+			The maximum seconds to wait, or None to wait forever.
+
+		Returns
+		-------
+		bool
+			True if all the messages are confirmed.
+		"""
+
+		with self.__condition:
+
+			return self.__condition.wait_for(lambda: not self.__pending and not self.__deliveries,timeout)
+
+	def close(self, timeout:float=5):
+		"""Wait for the pending confirmations and close the connection.
+
+		Parameters
+		----------
+		timeout : float
+			The maximum seconds to wait for the pending confirmations.
+		"""
+
+		if not self.wait_for_confirms(timeout):
+
+			logging.warning("Closed the confirmed publisher with %s unconfirmed messages",self.outstanding())
+
+		self.__stopping = True
+		connection = self.connection
+		if connection is not None and not connection.is_closed:
+
+			connection.ioloop.add_callback_threadsafe(self.__close_connection)
+
+		self.__thread.join(timeout)
+
+	def __close_connection(self):
+		"""Close the connection from the I/O thread."""
+
+		if not self.connection.is_closing and not self.connection.is_closed:
+
+			self.connection.close()
+
+		else:
+
+			self.connection.ioloop.stop()
@@ -0,0 +1,95 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pika
+
+
+class ConsumerWorkerPool:
+	"""Process the messages of a queue on a bounded pool of threads.
+
+	The messages must be consumed without automatic acknowledgement. Each message is
+	acknowledged, or rejected if the callback fails, from the thread of the connection
+	once the callback has finished, so the prefetch of the channel limits the messages
+	that are waiting or in process. The callbacks run out of the connection thread,
+	so they must not use the received channel.
+	"""
+
+	def __init__(self, callback, workers:int):
+		"""Initialize the pool
+
+		Parameters
+		----------
+		callback: method
+			The method to call when a message is received.
+		workers : int
+			The number of threads that process the messages.
+		"""
+		self.callback = callback
+		self.executor = ThreadPoolExecutor(max_workers=workers,thread_name_prefix='consumer-worker')
+
+	def on_message(self, ch, method, properties, body):
+		"""Called from the connection thread when a message is received."""
+
+		self.executor.submit(self.__process,ch,method,properties,body)
+
+	def __process(self, ch, method, properties, body):
+		"""Process a message on a worker thread."""
+
+		processed = True
+		try:
+
+			self.callback(ch,method,properties,body)
+
+		except Exception:
+
+			logging.exception("Cannot process a message of the queue %s",method.routing_key)
+			processed = False
+
+		try:
+
+			ch.connection.add_callback_threadsafe(partial(self.__settle,ch,method.delivery_tag,processed))
+
+		except (OSError,pika.exceptions.AMQPError):
+
+			logging.warning("Cannot acknowledge the message %s because the connection is closed",method.delivery_tag)
+
+	def __settle(self, ch, delivery_tag:int, processed:bool):
+		"""Acknowledge or reject a message. It is called from the connection thread."""
+
+		if not ch.is_open:
+
+			# The broker will deliver again the message
+			return
+
+		if processed:
+
+			ch.basic_ack(delivery_tag=delivery_tag)
+
+		else:
+
+			ch.basic_nack(delivery_tag=delivery_tag,requeue=False)
+
+	def shutdown(self):
+		"""Stop the threads without waiting for the messages in process, that will be delivered again."""
+
+		self.executor.shutdown(wait=False,cancel_futures=True)
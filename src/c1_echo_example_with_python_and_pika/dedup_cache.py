@@ -0,0 +1,170 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import DEDUP_ENTRIES, DEDUP_EVICTIONS, DEDUP_LOOKUPS
+
+
+def message_key(properties, body:bytes):
+	"""Return the key that identifies a received message, that is its AMQP message id or,
+	if it does not have one, a hash of its body.
+
+	Parameters
+	----------
+	properties : pika.BasicProperties
+		The properties of the received message, or None.
+	body : bytes
+		The received body.
+
+	Returns
+	-------
+	str or bytes
+		The message id as a string, or the 16 bytes of the hash of the body.
+	"""
+
+	message_id = getattr(properties,'message_id',None)
+	if message_id:
+
+		return message_id
+
+	return hashlib.blake2b(body,digest_size=16).digest()
+
+
+class DedupCache:
+	"""Remember the keys of the processed messages during some time to detect the duplicated ones.
+
+	The keys are kept in an ordered dictionary from the least to the most recently seen, so the
+	lookups are O(1) and the expired keys, or the least recently seen when the cache is full, are
+	removed from its start. So the memory is bounded by the maximum number of keys.
+	"""
+
+	def __init__(self, max_entries:int=100000, ttl_seconds:float=600):
+		"""Initialize an empty cache
+
+		Parameters
+		----------
+		max_entries : int
+			The maximum number of keys to remember.
+		ttl_seconds : float
+			The seconds that a key is remembered since it was last seen.
+		"""
+		self.max_entries = max(1,max_entries)
+		self.ttl_seconds = ttl_seconds
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.expirations = 0
+		self.__entries = OrderedDict()
+		self.__lock = threading.Lock()
+		self.__hits_metric = DEDUP_LOOKUPS.labels('hit')
+		self.__misses_metric = DEDUP_LOOKUPS.labels('miss')
+
+	def __len__(self):
+		return len(self.__entries)
+
+	def seen(self, key):
+		"""Check if a key has been added and it has not expired. When it is found, it is remembered again during the TTL.
+
+		Parameters
+		----------
+		key : str or bytes
+			The key of a message.
+
+		Returns
+		-------
+		bool
+			True if the message is a duplicate.
+		"""
+
+		now = time.monotonic()
+		with self.__lock:
+
+			self.__expire(now)
+			if key in self.__entries:
+
+				self.__entries.move_to_end(key)
+				self.__entries[key] = now + self.ttl_seconds
+				self.hits += 1
+				self.__hits_metric.inc()
+				return True
+
+			self.misses += 1
+			self.__misses_metric.inc()
+			return False
+
+	def add(self, key):
+		"""Remember a key, removing the least recently seen one if the cache is full.
+
+		Parameters
+		----------
+		key : str or bytes
+			The key of a processed message.
+		"""
+
+		now = time.monotonic()
+		with self.__lock:
+
+			self.__expire(now)
+			self.__entries[key] = now + self.ttl_seconds
+			self.__entries.move_to_end(key)
+			if len(self.__entries) > self.max_entries:
+
+				self.__entries.popitem(last=False)
+				self.evictions += 1
+				DEDUP_EVICTIONS.labels('capacity').inc()
+
+			DEDUP_ENTRIES.set(len(self.__entries))
+
+	def __expire(self, now:float):
+		"""Remove the keys whose TTL has passed, that are at the start because they are the least recently seen."""
+
+		expired = 0
+		while self.__entries:
+
+			key,expires_at = next(iter(self.__entries.items()))
+			if expires_at > now:
+
+				break
+
+			del self.__entries[key]
+			expired += 1
+
+		if expired > 0:
+
+			self.expirations += expired
+			DEDUP_EVICTIONS.labels('expired').inc(expired)
+			DEDUP_ENTRIES.set(len(self.__entries))
+
+	def stats(self):
+		"""Return the number of keys and the hits, misses, evictions and expirations since the cache was created."""
+
+		with self.__lock:
+
+			return {
+				"entries": len(self.__entries),
+				"max_entries": self.max_entries,
+				"hits": self.hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"expirations": self.expirations
+				}
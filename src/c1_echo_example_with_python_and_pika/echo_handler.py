@@ -17,21 +17,103 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import json
+import functools
 import logging
 import os
+import re
+import time
 
-from echo_payload import EchoPayload
+from channel_router import ChannelRouter
+from dedup_cache import DedupCache, message_key
 from message_service import MessageService
+from metrics import ECHO_STAGE_DURATION, VALIDATION_FAILURES
 from mov_service import MOVService
-from pydantic import ValidationError
+from pydantic import Json, TypeAdapter, ValidationError
+from tracing import new_trace_id, queue_wait_seconds, trace_id_of
+
+# A JSON object with only the field 'content' with a non empty string, without escaped surrogates that may not be paired
+CANONICAL_ECHO_BODY = re.compile(rb'[ \t\n\r]*\{[ \t\n\r]*"content"[ \t\n\r]*:[ \t\n\r]*"(?!")[^"\\\x00-\x1f]*(?:\\(?:["\\/bfnrt]|u(?![dD][89a-fA-F])[0-9a-fA-F]{4})[^"\\\x00-\x1f]*)*"[ \t\n\r]*\}[ \t\n\r]*')
+CANONICAL_ECHO_START = re.compile(rb'[ \t\n\r]*\{[ \t\n\r]*"content"[ \t\n\r]*:[ \t\n\r]*"')
+CANONICAL_ECHO_END = re.compile(rb'"[ \t\n\r]*\}[ \t\n\r]*')
+# The bytes that can be in a JSON string without escaping them
+UNESCAPED_STRING_BYTES = bytes(byte for byte in range(0x20,0x100) if byte not in b'"\\')
+
+
+@functools.cache
+def _payloads_adapter(payload_type):
+	"""Return the validator of a batch of received bodies, that parses each one as an independent JSON document."""
+
+	return TypeAdapter(list[Json[payload_type]])
+
+
+def _matches_canonical_echo(body:bytes):
+	"""Check if a body matches the expression of a canonical echo, without checking its encoding."""
+
+	if len(body) < 1024:
+
+		return CANONICAL_ECHO_BODY.fullmatch(body) is not None
+
+	start = CANONICAL_ECHO_START.match(body)
+	if start is None:
+
+		return False
+
+	content_end = body.rfind(b'"')
+	if content_end <= start.end() or CANONICAL_ECHO_END.fullmatch(body,content_end) is None:
+
+		return False
+
+	# The long contents are only checked by the slower expression if they have any quote,
+	# backslash or control character, that is when not all of them are in the start and the end
+	escaped = len(body.translate(None,UNESCAPED_STRING_BYTES))
+	unescaped = len(start.group().translate(None,UNESCAPED_STRING_BYTES)) + len(body[content_end:].translate(None,UNESCAPED_STRING_BYTES))
+	return escaped == unescaped or CANONICAL_ECHO_BODY.fullmatch(body) is not None
+
+
+def is_canonical_echo(body:bytes):
+	"""Check if the body of a message is a valid echo payload that can be echoed as it is.
+
+	Parameters
+	----------
+	body : bytes
+		The received body.
+
+	Returns
+	-------
+	bool
+		True if the body is a JSON object, encoded in UTF-8, that only has a non empty 'content'.
+	"""
+
+	if not _matches_canonical_echo(body):
+
+		return False
+
+	if body.isascii():
+
+		return True
+
+	try:
+
+		str(body,'utf-8')
+		return True
+
+	except UnicodeDecodeError:
+
+		return False
 
 
 class EchoHandler:
 	"""The component that receive mesages and echoed tehm.
 	"""
 
-	def __init__(self,message_service:MessageService,mov:MOVService):
+	def __init__(self,message_service:MessageService,mov:MOVService,
+			workers:int=int(os.getenv('ECHO_WORKERS',"0")),
+			prefetch:int=int(os.getenv('ECHO_PREFETCH',"0")),
+			batch_size:int=int(os.getenv('ECHO_BATCH_SIZE',"1")),
+			batch_wait_ms:float=float(os.getenv('ECHO_BATCH_WAIT_MS',"5")),
+			dedup_max_entries:int=int(os.getenv('ECHO_DEDUP_MAX_ENTRIES',"0")),
+			dedup_ttl_seconds:float=float(os.getenv('ECHO_DEDUP_TTL_SECONDS',"600"))
+		):
 		"""Initialize the handler
 
 		Parameters
@@ -40,36 +122,303 @@ class EchoHandler:
 				The service to receive or send messages thought RabbitMQ
 		mov : MOVService
 				The service to interact with the MOV
+		workers : int
+				The number of threads that process the received messages. By default uses the environment
+				variable ECHO_WORKERS and if it is not defined uses '0', that means that the messages
+				are processed on the consuming thread. It is not used when the messages are batched.
+		prefetch : int
+				The maximum number of received messages that are not processed when there are workers
+				or the messages are batched. By default uses the environment variable ECHO_PREFETCH and
+				if it is not defined uses '0', that means the number of workers or twice the batch size.
+		batch_size : int
+				The maximum number of received messages that are echoed and acknowledged together on the
+				consuming thread. By default uses the environment variable ECHO_BATCH_SIZE and if it is not
+				defined uses '1', that means that the messages are not batched.
+		batch_wait_ms : float
+				The maximum milliseconds that a received message waits for the batch to be full. By default
+				uses the environment variable ECHO_BATCH_WAIT_MS and if it is not defined uses '5'.
+		dedup_max_entries : int
+				The maximum number of processed messages that are remembered to ignore their duplicates, that
+				are the messages with the same AMQP message id or, if they do not have one, the same body.
+				By default uses the environment variable ECHO_DEDUP_MAX_ENTRIES and if it is not defined
+				uses '0', that means that the duplicated messages are echoed.
+		dedup_ttl_seconds : float
+				The seconds that a processed message is remembered since its last duplicate. By default uses
+				the environment variable ECHO_DEDUP_TTL_SECONDS and if it is not defined uses '600'.
 		"""
 		self.message_service = message_service
 		self.mov = mov
-		self.message_service.listen_for('valawai/c1/echo_example_with_python_and_pika/data/received_message',self.handle_message)
+		self.batch_size = batch_size
+		self.batch_wait_ms = batch_wait_ms
+		self.dedup_cache = DedupCache(dedup_max_entries,dedup_ttl_seconds) if dedup_max_entries > 0 else None
+		self.__batch = []
+		self.__batch_trace_ids = []
+		self.__batch_keys = []
+		self.__batch_number = 0
+		self.__batch_delivery_tags = []
+		self.__batch_duplicate_tags = []
+		self.__batch_channel = None
+		# The channels are the ones of the AsyncAPI, and the bodies are validated by the handler, with the validator
+		# of the schema of the channel, to echo the canonical ones as they are
+		router = ChannelRouter()
+		self.publish_channel = router.channel('data/publish_message')
+		self.payload_validator = router.validator('data/received_message')
+		self.payloads_validator = _payloads_adapter(router.payload_type('data/received_message'))
+		if batch_size > 1:
+
+			router.route('data/received_message',validate=False,prefetch=prefetch if prefetch > 0 else 2 * batch_size,auto_ack=False)(self.handle_message_in_batch)
 
+		else:
 
-	def handle_message(self, _ch, _method, _properties, body):
+			router.route('data/received_message',validate=False,workers=workers,prefetch=prefetch)(self.handle_message)
+
+		router.bind(self.message_service)
+
+
+	def handle_message(self, _ch, _method, properties, body):
 		"""Manage the received messages on the channel valawai/c1/echo_example_with_python_and_pika/data/received_message
 		"""
 
+		key = None
+		if self.dedup_cache is not None:
+
+			key = message_key(properties,body)
+			if self.dedup_cache.seen(key):
+
+				logging.debug("Ignored a duplicated message %s",body)
+				return
+
+		start = time.perf_counter()
+		echoed_body = self.__echoed_body(body)
+		if echoed_body is not None:
+
+			self.mov.info("Received a message to echo",body)
+			# The echo continues the trace of the received message
+			trace_id = trace_id_of(properties) or new_trace_id()
+			handled = time.perf_counter()
+			self.message_service.publish_to(self.publish_channel,echoed_body,trace_id)
+			published = time.perf_counter()
+			self.__trace(trace_id,queue_wait_seconds(properties),handled - start,published - handled)
+			self.mov.info("Sent Echoed message",echoed_body)
+
+		if key is not None:
+
+			# Remembered once processed, so a message that is delivered again because it has failed is not ignored
+			self.dedup_cache.add(key)
+
+
+	def __trace(self, trace_id:str, queue_wait:float, handle_seconds:float, publish_seconds:float):
+		"""Record the time to handle and publish an echo, and log the time of each step of its trace."""
+
+		ECHO_STAGE_DURATION.labels('handle').observe(handle_seconds)
+		ECHO_STAGE_DURATION.labels('publish').observe(publish_seconds)
+		if queue_wait is not None:
+
+			logging.debug("Echoed the trace %s, waited %.3f ms in the queue, handled in %.3f ms and published in %.3f ms",trace_id,queue_wait * 1000,handle_seconds * 1000,publish_seconds * 1000)
+
+		else:
+
+			logging.debug("Echoed the trace %s, handled in %.3f ms and published in %.3f ms",trace_id,handle_seconds * 1000,publish_seconds * 1000)
+
+
+	def handle_message_in_batch(self, ch, method, properties, body):
+		"""Add a received message of the channel valawai/c1/echo_example_with_python_and_pika/data/received_message
+		to the batch, that is echoed when it is full or when the first message has waited the maximum time.
+		It must be called from the consuming thread, without acknowledging the message.
+		"""
+
+		if ch is not self.__batch_channel and len(self.__batch) > 0:
+
+			# The channel has been open again, and the broker delivers again the messages that were not acknowledged
+			self.__batch = []
+			self.__batch_trace_ids = []
+			self.__batch_keys = []
+			self.__batch_delivery_tags = []
+			self.__batch_duplicate_tags = []
+			self.__batch_number += 1
+
+		if self.dedup_cache is not None:
+
+			key = message_key(properties,body)
+			if key in self.__batch_keys or self.dedup_cache.seen(key):
+
+				logging.debug("Ignored a duplicated message %s",body)
+				if len(self.__batch) == 0:
+
+					ch.basic_ack(delivery_tag=method.delivery_tag)
+
+				else:
+
+					# Acknowledged with the batch
+					self.__batch_duplicate_tags.append(method.delivery_tag)
+
+				return
+
+			self.__batch_keys.append(key)
+
+		self.__batch.append(body)
+		self.__batch_trace_ids.append(trace_id_of(properties) or new_trace_id())
+		self.__batch_delivery_tags.append(method.delivery_tag)
+		self.__batch_channel = ch
+		if len(self.__batch) >= self.batch_size:
+
+			self.flush_batch()
+
+		elif len(self.__batch) == 1:
+
+			batch_number = self.__batch_number
+			self.message_service.call_later(self.batch_wait_ms / 1000,lambda: self.__flush_batch_after_wait(batch_number))
+
+
+	def __flush_batch_after_wait(self, batch_number:int):
+		"""Echo the batch if it has not been echoed because it was full."""
+
+		if batch_number == self.__batch_number:
+
+			self.flush_batch()
+
+
+	def flush_batch(self):
+		"""Echo the messages of the batch, publishing them together, and acknowledge all of them at once. If the echo
+		of any message cannot be published, the messages before it are acknowledged at once, and the ones that cannot
+		be published are rejected to be delivered again."""
+
+		bodies = self.__batch
+		if len(bodies) == 0:
+
+			return
+
+		start = time.perf_counter()
+		trace_ids = self.__batch_trace_ids
+		keys = self.__batch_keys
+		delivery_tags = self.__batch_delivery_tags
+		duplicate_tags = self.__batch_duplicate_tags
+		self.__batch = []
+		self.__batch_trace_ids = []
+		self.__batch_keys = []
+		self.__batch_delivery_tags = []
+		self.__batch_duplicate_tags = []
+		self.__batch_number += 1
+		echoed_bodies = []
+		echoed_trace_ids = []
+		echoed_tags = []
+		for body,trace_id,delivery_tag,echoed_body in zip(bodies,trace_ids,delivery_tags,self.__echoed_bodies(bodies)):
+
+			if echoed_body is not None:
+
+				self.mov.info("Received a message to echo",body)
+				echoed_bodies.append(echoed_body)
+				echoed_trace_ids.append(trace_id)
+				echoed_tags.append(delivery_tag)
+
+		failed_tags = set()
+		if len(echoed_bodies) > 0:
+
+			handled = time.perf_counter()
+			outcomes = self.message_service.publish_many(self.publish_channel,echoed_bodies,echoed_trace_ids)
+			published = time.perf_counter()
+			ECHO_STAGE_DURATION.labels('handle').observe(handled - start)
+			ECHO_STAGE_DURATION.labels('publish').observe(published - handled)
+			logging.debug("Echoed a batch of the traces %s, handled in %.3f ms and published in %.3f ms",','.join(echoed_trace_ids),(handled - start) * 1000,(published - handled) * 1000)
+			for echoed_body,delivery_tag,outcome in zip(echoed_bodies,echoed_tags,outcomes):
+
+				if outcome:
+
+					self.mov.info("Sent Echoed message",echoed_body)
+
+				else:
+
+					failed_tags.add(delivery_tag)
+
+		for key,delivery_tag in zip(keys,delivery_tags):
+
+			if delivery_tag not in failed_tags:
+
+				self.dedup_cache.add(key)
+
+		if self.__batch_channel.is_open:
+
+			self.__acknowledge_batch(self.__batch_channel,sorted(delivery_tags + duplicate_tags),failed_tags)
+
+
+	def __acknowledge_batch(self, ch, delivery_tags:list, failed_tags:set):
+		"""Acknowledge the messages of a batch until the first one whose echo has failed, that is rejected to be
+		delivered again with the other failed ones, while the rest are acknowledged one by one."""
+
+		if len(failed_tags) == 0:
+
+			ch.basic_ack(delivery_tag=delivery_tags[-1],multiple=True)
+			return
+
+		logging.warning("Cannot echo %s of %s messages of a batch, they are delivered again",len(failed_tags),len(delivery_tags))
+		first_failed = min(failed_tags)
+		acknowledged = [delivery_tag for delivery_tag in delivery_tags if delivery_tag < first_failed]
+		if len(acknowledged) > 0:
+
+			ch.basic_ack(delivery_tag=acknowledged[-1],multiple=True)
+
+		for delivery_tag in delivery_tags[len(acknowledged):]:
+
+			if delivery_tag in failed_tags:
+
+				ch.basic_nack(delivery_tag=delivery_tag,requeue=True)
+
+			else:
+
+				ch.basic_ack(delivery_tag=delivery_tag)
+
+
+	def __echoed_bodies(self, bodies:list):
+		"""Return the bodies to echo a batch of received messages, or None for the ones that cannot be echoed."""
+
+		echoed_bodies = [body if is_canonical_echo(body) else None for body in bodies]
+		to_validate = [body for body,echoed_body in zip(bodies,echoed_bodies) if echoed_body is None]
+		if len(to_validate) == 0:
+
+			return echoed_bodies
+
+		try:
+
+			payloads = iter(self.payloads_validator.validate_python(to_validate))
+
+		except ValidationError:
+
+			# Validated one by one to report the messages that are not valid
+			return [self.__echoed_body(body) for body in bodies]
+
+		return [echoed_body if echoed_body is not None else self.message_service.codec.encode({"content": next(payloads).content}) for echoed_body in echoed_bodies]
+
+
+	def __echoed_body(self, body):
+		"""Return the body to echo a received message, or None if it cannot be echoed."""
+
+		if is_canonical_echo(body):
+
+			# The received body is echoed without decoding and encoding it again
+			return body
+
 		try:
 
-			json_dict = json.loads(body)
+			# Validated directly from the bytes, without building an intermediate dictionary
+			payload = self.payload_validator.validate_json(body)
 
-			try:
+		except ValidationError as validation_error:
 
-				payload = EchoPayload(**json_dict)
-				self.mov.info("Received a message to echo",json_dict)
+			if any(error['type'] == 'json_invalid' for error in validation_error.errors()):
 
-				echoed_msg = {
-						"content": payload.content
-					}
-				self.message_service.publish_to('valawai/c1/echo_example_with_python_and_pika/data/publish_message',echoed_msg)
-				self.mov.info("Sent Echoed message",echoed_msg)
+				VALIDATION_FAILURES.labels('invalid_json').inc()
+				logging.error("Unexpected message %s",body)
 
-			except ValidationError as validation_error:
+			else:
 
+				VALIDATION_FAILURES.labels('invalid_payload').inc()
 				msg = f"Cannot process echo, because {validation_error}"
-				self.mov.error(msg,json_dict)
+				self.mov.error(msg,body)
 
-		except ValueError:
+			return None
 
-			logging.exception("Unexpected message %s",body)
+		echoed_msg = {
+				"content": payload.content
+			}
+		# Encoded once to publish it and to log it
+		return self.message_service.codec.encode(echoed_msg)
@@ -0,0 +1,135 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import threading
+
+from metrics import BROKER_BLOCKED
+
+
+class FlowControl:
+	"""The state of the alarms of the RabbitMQ, that blocks the connections that publish when it is low on memory or disk.
+
+	Each connection notifies when the broker blocks or unblocks it, and the component is blocked
+	while any of them is. The listeners are called when the component becomes blocked or unblocked,
+	so the consumers can stop receiving messages that cannot be published.
+	"""
+
+	def __init__(self):
+		self.__blocked = {}
+		self.__listeners = []
+		self.__condition = threading.Condition()
+
+	def add_listener(self, listener):
+		"""Add a method to call with True when the component is blocked, and with False when it is unblocked."""
+
+		with self.__condition:
+
+			self.__listeners.append(listener)
+
+	def is_blocked(self, connection=None):
+		"""Check if a connection, or any connection if it is None, is blocked by the broker."""
+
+		with self.__condition:
+
+			if connection is not None:
+
+				return id(connection) in self.__blocked
+
+			return len(self.__blocked) > 0
+
+	def block(self, connection, reason:str=None):
+		"""Called when the broker blocks a connection.
+
+		Parameters
+		----------
+		connection : object
+			The connection that has been blocked.
+		reason : str
+			The reason of the broker to block it.
+		"""
+
+		with self.__condition:
+
+			changed = len(self.__blocked) == 0
+			self.__blocked[id(connection)] = reason
+
+		if changed:
+
+			logging.warning("The RabbitMQ has blocked the publications, because %s",reason)
+			self.__notify(True)
+
+	def unblock(self, connection):
+		"""Called when the broker unblocks a connection, or the connection is closed."""
+
+		with self.__condition:
+
+			if self.__blocked.pop(id(connection),False) is False:
+
+				return
+
+			changed = len(self.__blocked) == 0
+			self.__condition.notify_all()
+
+		if changed:
+
+			logging.info("The RabbitMQ has unblocked the publications")
+			self.__notify(False)
+
+	def watch(self, connection):
+		"""Register the callbacks of a pika connection to notify when the broker blocks or unblocks it."""
+
+		connection.add_on_connection_blocked_callback(lambda _connection,frame: self.block(connection,getattr(frame.method,'reason',None)))
+		connection.add_on_connection_unblocked_callback(lambda _connection,_frame: self.unblock(connection))
+
+	def wait_unblocked(self, timeout:float=None):
+		"""Wait until no connection is blocked.
+
+		Parameters
+		----------
+		timeout : float
+			The maximum seconds to wait, or None to wait forever.
+
+		Returns
+		-------
+		bool
+			True if no connection is blocked.
+		"""
+
+		with self.__condition:
+
+			return self.__condition.wait_for(lambda: len(self.__blocked) == 0,timeout)
+
+	def __notify(self, blocked:bool):
+		"""Update the metric and call the listeners."""
+
+		BROKER_BLOCKED.set(1 if blocked else 0)
+		with self.__condition:
+
+			listeners = list(self.__listeners)
+
+		for listener in listeners:
+
+			try:
+
+				listener(blocked)
+
+			except Exception:
+
+				logging.exception("Cannot notify the change of the flow control")
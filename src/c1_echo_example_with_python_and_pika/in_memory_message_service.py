@@ -0,0 +1,511 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from threading import Thread
+
+import pika
+
+from codec import create_codec
+from compression import create_compressor, decompress_callback
+from consumer_worker_pool import ConsumerWorkerPool
+from metrics import MESSAGES_PUBLISHED, PUBLISH_DURATION, PUBLISH_FAILURES, instrument_callback
+from tracing import trace_headers
+
+
+class InMemoryBroker:
+	"""A broker that keeps the queues in memory, to send messages between the services of the same process.
+
+	The services that listen the same queue compete for its messages, like with the RabbitMQ.
+	"""
+
+	def __init__(self):
+		"""Initialize the broker without any queue."""
+
+		self.condition = threading.Condition(threading.RLock())
+		self.queues = {}
+
+	def queue_declare(self, queue:str):
+		"""Create a queue if it does not exist."""
+
+		with self.condition:
+
+			self.queues.setdefault(queue,deque())
+
+	def publish(self, queue:str, body, properties:pika.BasicProperties):
+		"""Add a message at the end of a queue, creating the queue if it does not exist."""
+
+		with self.condition:
+
+			self.queues.setdefault(queue,deque()).append((body,properties,False))
+			self.condition.notify_all()
+
+	def requeue(self, queue:str, body, properties:pika.BasicProperties):
+		"""Return a delivered message to the start of its queue, to be delivered again."""
+
+		with self.condition:
+
+			self.queues.setdefault(queue,deque()).appendleft((body,properties,True))
+			self.condition.notify_all()
+
+	def message_count(self, queue:str):
+		"""Return the number of messages that are waiting in a queue."""
+
+		with self.condition:
+
+			return len(self.queues.get(queue,()))
+
+
+class InMemoryChannel:
+	"""The channel of an InMemoryMessageService, that tracks the messages that are not acknowledged."""
+
+	def __init__(self, connection, broker:InMemoryBroker):
+		"""Initialize the channel
+
+		Parameters
+		----------
+		connection: InMemoryMessageService
+			The service that owns the channel, that is used as its connection.
+		broker : InMemoryBroker
+			The broker that has the queues.
+		"""
+		self.connection = connection
+		self.broker = broker
+		self.is_open = True
+		self.prefetch_count = 0
+		self.unacked = OrderedDict()
+		self.unacked_by_queue = Counter()
+		self.__delivery_tags = itertools.count(1)
+
+	def can_deliver(self, queue:str, prefetch_count:int):
+		"""Check if the prefetch of the consumer of a queue allows delivering another message that must be acknowledged."""
+
+		return prefetch_count <= 0 or self.unacked_by_queue[queue] < prefetch_count
+
+	def basic_qos(self, prefetch_count:int=0):
+		"""Limit the number of messages that are delivered and not acknowledged to each consumer that starts after it,
+		as the RabbitMQ does when the prefetch is not global."""
+
+		self.prefetch_count = prefetch_count
+
+	def deliver(self, queue:str, redelivered:bool, body, properties:pika.BasicProperties, auto_ack:bool):
+		"""Return the method of a delivered message, that is tracked until it is acknowledged."""
+
+		delivery_tag = next(self.__delivery_tags)
+		if not auto_ack:
+
+			self.unacked[delivery_tag] = (queue,body,properties)
+			self.unacked_by_queue[queue] += 1
+
+		return pika.spec.Basic.Deliver(delivery_tag=delivery_tag,redelivered=redelivered,routing_key=queue)
+
+	def __settle(self, delivery_tag:int, multiple:bool):
+		"""Remove and return the messages that are acknowledged or rejected."""
+
+		with self.broker.condition:
+
+			if multiple:
+
+				tags = [tag for tag in self.unacked if delivery_tag == 0 or tag <= delivery_tag]
+
+			else:
+
+				tags = [delivery_tag] if delivery_tag in self.unacked else []
+
+			settled = [self.unacked.pop(tag) for tag in tags]
+			self.unacked_by_queue.subtract(queue for queue,_body,_properties in settled)
+			self.broker.condition.notify_all()
+			return settled
+
+	def basic_ack(self, delivery_tag:int=0, multiple:bool=False):
+		"""Acknowledge a message, or all the messages up to it."""
+
+		self.__settle(delivery_tag,multiple)
+
+	def basic_nack(self, delivery_tag:int=0, multiple:bool=False, requeue:bool=True):
+		"""Reject a message, or all the messages up to it, and deliver them again if they are requeued."""
+
+		settled = self.__settle(delivery_tag,multiple)
+		if requeue:
+
+			for queue,body,properties in reversed(settled):
+
+				self.broker.requeue(queue,body,properties)
+
+	def basic_reject(self, delivery_tag:int=0, requeue:bool=True):
+		"""Reject a message and deliver it again if it is requeued."""
+
+		self.basic_nack(delivery_tag,False,requeue)
+
+	def close(self):
+		"""Close the channel and deliver again the messages that are not acknowledged."""
+
+		with self.broker.condition:
+
+			self.is_open = False
+			self.basic_nack(0,True,True)
+
+
+class InMemoryMessageService:
+	"""The service to send and receive messages through an InMemoryBroker.
+
+	It has the same methods as the MessageService, and it calls the callbacks on the consuming
+	thread with a channel that must be used in the same way, so the handlers and the MOVService
+	can be tested and measured without a RabbitMQ.
+	"""
+
+	def __init__(self, broker:InMemoryBroker=None, codec=None, compressor=None):
+		"""Initialize the service
+
+		Parameters
+		----------
+		broker : InMemoryBroker
+			The broker with the queues. By default a new one is created, that only this service uses.
+		codec: object
+			The codec to encode the published messages. By default uses the codec of the environment
+			variable MESSAGE_CODEC and if it is not defined uses the fastest that is installed.
+		compressor: PayloadCompressor
+			The compressor of the published messages that are large. By default uses the compression of the
+			environment variables MESSAGE_COMPRESSION and MESSAGE_COMPRESSION_THRESHOLD.
+		"""
+
+		self.broker = broker if broker is not None else InMemoryBroker()
+		self.codec = codec if codec is not None else create_codec()
+		self.compressor = compressor if compressor is not None else create_compressor()
+		self.listen_channel = InMemoryChannel(self,self.broker)
+		self.worker_pools = []
+		self.__listeners = OrderedDict()
+		self.__callbacks = deque()
+		self.__timers = []
+		self.__timer_sequence = itertools.count()
+		self.__closed = False
+
+
+	def close(self):
+		"""Stop consuming and deliver again the messages that are not acknowledged."""
+
+		with self.broker.condition:
+
+			self.__closed = True
+			self.listen_channel.close()
+
+		for worker_pool in self.worker_pools:
+
+			worker_pool.shutdown()
+
+
+	def listen_for(self,queue:str,callback,workers:int=0,prefetch:int=0,auto_ack:bool=True):
+		"""Register a input channel
+
+		Parameters
+		----------
+		queue : str
+			The name of the queue to listen.
+		callback: method
+			The method to call when a message is received.
+		workers : int
+			The number of threads that process the messages of the queue. If it is '0' the
+			messages are processed on the consuming thread.
+		prefetch : int
+			The maximum number of messages that are not acknowledged. If it is '0' it is the
+			number of workers, or unlimited when there are not workers.
+		auto_ack : bool
+			If it is false and there are not workers, the callback must acknowledge the messages
+			with the received channel.
+		"""
+
+		self.broker.queue_declare(queue)
+		callback = instrument_callback(queue,decompress_callback(callback,not auto_ack and workers == 0))
+		with self.broker.condition:
+
+			if workers > 0:
+
+				worker_pool = ConsumerWorkerPool(callback,workers)
+				self.worker_pools.append(worker_pool)
+				self.listen_channel.basic_qos(prefetch_count=prefetch if prefetch > 0 else workers)
+				self.__listeners[queue] = (worker_pool.on_message,False,self.listen_channel.prefetch_count)
+
+			else:
+
+				# Set for each listener, so the prefetch of a previous one does not limit it
+				self.listen_channel.basic_qos(prefetch_count=prefetch if not auto_ack else 0)
+				self.__listeners[queue] = (callback,auto_ack,self.listen_channel.prefetch_count)
+
+			self.broker.condition.notify_all()
+
+		logging.debug("Listen for the queue %s",queue)
+
+
+	def __encode(self,msg):
+		"""Return the body to publish a message, that is not encoded again if it is already bytes, and its
+		content encoding, that is None if it is not compressed."""
+
+		if isinstance(msg,(bytes,bytearray,memoryview)):
+
+			return self.compressor.compress(bytes(msg))
+
+		return self.compressor.compress(self.codec.encode(msg))
+
+
+	def publish_to(self,queue:str,msg,trace_id:str=None):
+		"""Publish a message into a queue
+
+		Parameters
+		----------
+		queue : str
+			The name of the queue to publish the event.
+		msg: object
+			The message to send, or the bytes of the message already encoded as JSON.
+		trace_id: str
+			The identifier of the trace of the message, like the one of a received message that it answers,
+			or None to start a new trace. It is sent with the time of the publication in the headers.
+		"""
+
+		start = time.perf_counter()
+		try:
+
+			body,content_encoding = self.__encode(msg)
+			self.broker.publish(queue,body,pika.BasicProperties(content_type='application/json',content_encoding=content_encoding,headers=trace_headers(trace_id)))
+			MESSAGES_PUBLISHED.labels(queue).inc()
+			logging.debug("Publish message to the queue %s",queue)
+
+		except (TypeError,ValueError):
+
+			PUBLISH_FAILURES.labels(queue).inc()
+			logging.exception("Cannot publish a msg because can not encode the message")
+
+		PUBLISH_DURATION.observe(time.perf_counter() - start)
+
+
+	def publish_many(self,queue:str,msgs,trace_ids=None):
+		"""Publish a batch of messages into a queue
+
+		Parameters
+		----------
+		queue : str
+			The name of the queue to publish the events.
+		msgs: iterable
+			The messages to send, or the bytes of the messages already encoded as JSON.
+		trace_ids: iterable
+			The identifier of the trace of each message, or None to start a new trace for each one.
+
+		Returns
+		-------
+		list of bool
+			For each message, True if it has been published.
+		"""
+
+		return self.publish_batch(((queue,msg) for msg in msgs),trace_ids)
+
+
+	def publish_batch(self,messages,trace_ids=None):
+		"""Publish a batch of messages, that can go to different queues
+
+		Parameters
+		----------
+		messages : iterable
+			The pairs with the name of the queue and the message to send, or the bytes of the message
+			already encoded as JSON.
+		trace_ids: iterable
+			The identifier of the trace of each message, or None to start a new trace for each one.
+
+		Returns
+		-------
+		list of bool
+			For each message, True if it has been published.
+		"""
+
+		start = time.perf_counter()
+		trace_ids = list(trace_ids) if trace_ids is not None else None
+		outcomes = []
+		with self.broker.condition:
+
+			for index,(queue,msg) in enumerate(messages):
+
+				try:
+
+					body,content_encoding = self.__encode(msg)
+					properties = pika.BasicProperties(content_type='application/json',content_encoding=content_encoding,headers=trace_headers(trace_ids[index] if trace_ids is not None else None))
+					self.broker.publish(queue,body,properties)
+					MESSAGES_PUBLISHED.labels(queue).inc()
+					outcomes.append(True)
+
+				except (TypeError,ValueError):
+
+					PUBLISH_FAILURES.labels(queue).inc()
+					logging.exception("Cannot publish a msg because can not encode the message")
+					outcomes.append(False)
+
+		PUBLISH_DURATION.observe(time.perf_counter() - start)
+		return outcomes
+
+
+	def add_callback_threadsafe(self,callback):
+		"""Call a function on the consuming thread, like the connections of pika.
+
+		Parameters
+		----------
+		callback: method
+			The function to call without arguments.
+		"""
+
+		with self.broker.condition:
+
+			self.__callbacks.append(callback)
+			self.broker.condition.notify_all()
+
+
+	def call_later(self,delay:float,callback):
+		"""Call a function on the consuming thread after a delay.
+
+		Parameters
+		----------
+		delay : float
+			The seconds to wait before calling the function.
+		callback: method
+			The function to call without arguments.
+		"""
+
+		with self.broker.condition:
+
+			heapq.heappush(self.__timers,(time.monotonic() + delay,next(self.__timer_sequence),callback))
+			self.broker.condition.notify_all()
+
+
+	def __take_deliveries(self):
+		"""Take the messages that can be delivered to the listeners. It must be called with the lock of the broker."""
+
+		deliveries = []
+		for queue,(callback,auto_ack,prefetch_count) in self.__listeners.items():
+
+			messages = self.broker.queues.get(queue)
+			while messages and (auto_ack or self.listen_channel.can_deliver(queue,prefetch_count)):
+
+				body,properties,redelivered = messages.popleft()
+				method = self.listen_channel.deliver(queue,redelivered,body,properties,auto_ack)
+				deliveries.append((callback,method,properties,body))
+
+		return deliveries
+
+
+	def __take_ready(self, deadline:float):
+		"""Wait until there is something to call on the consuming thread, or the deadline."""
+
+		with self.broker.condition:
+
+			while not self.__closed:
+
+				now = time.monotonic()
+				timers = []
+				while self.__timers and self.__timers[0][0] <= now:
+
+					timers.append(heapq.heappop(self.__timers)[2])
+
+				callbacks = list(self.__callbacks)
+				self.__callbacks.clear()
+				deliveries = self.__take_deliveries()
+				if callbacks or timers or deliveries:
+
+					return callbacks + timers,deliveries
+
+				timeout = None if deadline is None else deadline - now
+				if self.__timers:
+
+					timeout = self.__timers[0][0] - now if timeout is None else min(timeout,self.__timers[0][0] - now)
+
+				if timeout is not None and timeout <= 0:
+
+					break
+
+				self.broker.condition.wait(timeout)
+
+		return [],[]
+
+
+	def process_events(self,time_limit:float=0):
+		"""Consume the received messages for a while on the calling thread.
+
+		Parameters
+		----------
+		time_limit : float
+			The maximum seconds to wait for messages.
+		"""
+
+		deadline = time.monotonic() + time_limit
+		while True:
+
+			callbacks,deliveries = self.__take_ready(deadline)
+			if not callbacks and not deliveries:
+
+				return
+
+			self.__call(callbacks,deliveries)
+			if time.monotonic() >= deadline:
+
+				return
+
+
+	def __call(self, callbacks:list, deliveries:list):
+		"""Call the ready functions and the listeners of the delivered messages."""
+
+		for callback in callbacks:
+
+			try:
+
+				callback()
+
+			except Exception:
+
+				logging.exception("Unexpected error calling a function on the consuming thread")
+
+		for callback,method,properties,body in deliveries:
+
+			try:
+
+				callback(self.listen_channel,method,properties,body)
+
+			except Exception:
+
+				logging.exception("Unexpected error processing a message of the queue %s",method.routing_key)
+
+
+	def start_consuming(self):
+		"""Start to consume the messages until the service is closed."""
+
+		logging.info("Start listening for events")
+		while True:
+
+			callbacks,deliveries = self.__take_ready(None)
+			if not callbacks and not deliveries:
+
+				break
+
+			self.__call(callbacks,deliveries)
+
+		logging.info("Stop listening for events")
+
+	def start_consuming_and_forget(self):
+		"""Start to consume the messages using an independent Thread."""
+
+		Thread(target=self.start_consuming).start()
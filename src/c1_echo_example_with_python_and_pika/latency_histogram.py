@@ -0,0 +1,209 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import math
+
+
+class LatencyHistogram:
+	"""Count integer values, like latencies in microseconds, in buckets with a bounded relative error.
+
+	Like a HDR histogram, the values lower than the number of sub buckets are counted exactly, and
+	the higher ones in buckets whose width grows with the value, so the memory does not depend on
+	the number of values and any percentile has a relative error lower than 2 / sub buckets.
+	"""
+
+	def __init__(self, sub_bucket_bits:int=8):
+		"""Initialize an empty histogram
+
+		Parameters
+		----------
+		sub_bucket_bits : int
+			The bits of the sub buckets of each power of two. With '8' the relative error is lower than 1%.
+		"""
+		self.sub_bucket_bits = sub_bucket_bits
+		self.sub_bucket_count = 1 << sub_bucket_bits
+		self.half_count = self.sub_bucket_count >> 1
+		self.counts = []
+		self.total_count = 0
+		self.total = 0
+		self.min = None
+		self.max = None
+
+	def __index(self, value:int):
+		"""Return the index of the bucket of a value."""
+
+		if value < self.sub_bucket_count:
+
+			return value
+
+		shift = value.bit_length() - self.sub_bucket_bits
+		return self.sub_bucket_count + (shift - 1) * self.half_count + (value >> shift) - self.half_count
+
+	def __highest_value(self, index:int):
+		"""Return the highest value that is counted in a bucket."""
+
+		if index < self.sub_bucket_count:
+
+			return index
+
+		shift = (index - self.sub_bucket_count) // self.half_count + 1
+		mantissa = (index - self.sub_bucket_count) % self.half_count + self.half_count
+		return ((mantissa + 1) << shift) - 1
+
+	def record(self, value:int, count:int=1):
+		"""Count a value.
+
+		Parameters
+		----------
+		value : int
+			The value to count. The negative values are counted as '0'.
+		count : int
+			The times to count the value.
+		"""
+
+		value = max(0,int(value))
+		index = self.__index(value)
+		if index >= len(self.counts):
+
+			self.counts.extend([0] * (index + 1 - len(self.counts)))
+
+		self.counts[index] += count
+		self.total_count += count
+		self.total += value * count
+		self.min = value if self.min is None else min(self.min,value)
+		self.max = value if self.max is None else max(self.max,value)
+
+	def merge(self, other):
+		"""Add the values counted by another histogram with the same sub buckets."""
+
+		if other.sub_bucket_bits != self.sub_bucket_bits:
+
+			raise ValueError("Cannot merge histograms with different sub buckets")
+
+		if len(other.counts) > len(self.counts):
+
+			self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+
+		for index,count in enumerate(other.counts):
+
+			self.counts[index] += count
+
+		self.total_count += other.total_count
+		self.total += other.total
+		if other.min is not None:
+
+			self.min = other.min if self.min is None else min(self.min,other.min)
+			self.max = other.max if self.max is None else max(self.max,other.max)
+
+	def mean(self):
+		"""Return the mean of the counted values."""
+
+		return self.total / self.total_count if self.total_count > 0 else 0.0
+
+	def value_at_percentile(self, percentile:float):
+		"""Return the highest value of the bucket where a percentile of the counted values is reached.
+
+		Parameters
+		----------
+		percentile : float
+			The percentile between 0 and 100.
+
+		Returns
+		-------
+		int
+			The value of the percentile, that is never higher than the maximum counted value.
+		"""
+
+		if self.total_count == 0:
+
+			return 0
+
+		# The tolerance avoids that the rounding of the percentile moves the target to the next value
+		target = max(1,math.ceil(percentile * self.total_count / 100 - 1e-9))
+		accumulated = 0
+		for index,count in enumerate(self.counts):
+
+			accumulated += count
+			if accumulated >= target:
+
+				return min(self.__highest_value(index),self.max)
+
+		return self.max
+
+	def percentile_distribution(self, ticks_per_half:int=5):
+		"""Return the percentiles of the distribution with the format of the HDR histograms, where the
+		percentiles get closer to 100 by halving the distance in ticks.
+
+		Parameters
+		----------
+		ticks_per_half : int
+			The number of percentiles to report each time the distance to 100 is halved.
+
+		Returns
+		-------
+		list
+			The value, percentile, number of values up to the percentile and 1/(1-percentile) of each percentile.
+		"""
+
+		distribution = []
+		if self.total_count == 0:
+
+			return distribution
+
+		percentile = 0.0
+		while True:
+
+			value = self.value_at_percentile(percentile)
+			count = sum(self.counts[:self.__index(value) + 1])
+			fraction = percentile / 100
+			distribution.append((value,fraction,count,1 / (1 - fraction) if fraction < 1 else math.inf))
+			if value >= self.max or count >= self.total_count:
+
+				break
+
+			# The distance to 100 is halved every 'ticks_per_half' percentiles
+			halvings = int(math.log2(100 / (100 - percentile))) + 1 if percentile < 100 else 0
+			percentile += 100 / (2 ** halvings) / ticks_per_half
+
+		if distribution[-1][1] < 1:
+
+			distribution.append((self.max,1.0,self.total_count,math.inf))
+
+		return distribution
+
+	def format_distribution(self, scale:float=1000.0, ticks_per_half:int=5):
+		"""Return the distribution as the text output of the HDR histograms.
+
+		Parameters
+		----------
+		scale : float
+			The value that each reported value is divided by, like '1000' to report microseconds in milliseconds.
+		ticks_per_half : int
+			The number of percentiles to report each time the distance to 100 is halved.
+		"""
+
+		lines = [f"{'Value':>12} {'Percentile':>14} {'TotalCount':>10} {'1/(1-Percentile)':>18}",""]
+		for value,fraction,count,inverse in self.percentile_distribution(ticks_per_half):
+
+			inverse_text = f"{inverse:>18.2f}" if inverse != math.inf else f"{'':>18}"
+			lines.append(f"{value / scale:>12.3f} {fraction:>14.12f} {count:>10} {inverse_text}")
+
+		lines.append(f"#[Mean    = {self.mean() / scale:>12.3f}]")
+		lines.append(f"#[Max     = {(self.max or 0) / scale:>12.3f}, Total count = {self.total_count:>12}]")
+		return '\n'.join(lines)
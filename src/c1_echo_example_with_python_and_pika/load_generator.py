@@ -0,0 +1,167 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import logging
+import threading
+import time
+import uuid
+
+from latency_histogram import LatencyHistogram
+
+
+class LoadGenerator:
+	"""Publish messages to echo at a fixed rate and measure the latency until their echo is received.
+
+	The messages are published at the time that the rate schedules them, without waiting for the
+	echoes, and the latency is measured from that time. So when the component or the publisher
+	are slower than the rate, the delay is included in the latency instead of reducing the rate.
+	"""
+
+	def __init__(self, message_service, rate:float, sizes=(64,),
+			queue:str='valawai/c1/echo_example_with_python_and_pika/data/received_message',
+			echo_queue:str='valawai/c1/echo_example_with_python_and_pika/data/publish_message'
+		):
+		"""Initialize the generator and listen for the echoed messages
+
+		Parameters
+		----------
+		message_service : MessageService
+			The service to send and receive the messages. It must be consuming while the generator runs.
+		rate : float
+			The messages to publish by second.
+		sizes : list of int
+			The approximate sizes, in bytes, of the published messages, that are used in turns.
+		queue : str
+			The queue to publish the messages to echo.
+		echo_queue : str
+			The queue where the echoed messages are received.
+		"""
+		self.message_service = message_service
+		self.rate = rate
+		self.sizes = list(sizes)
+		self.queue = queue
+		self.run_id = uuid.uuid4().hex[:8]
+		self.condition = threading.Condition()
+		self.scheduled_at = {}
+		self.histogram = LatencyHistogram()
+		self.sent = 0
+		self.received = 0
+		self.max_lag = 0.0
+		self.publish_seconds = 0.0
+		self.__paddings = {size:'x' * max(0,size - 32) for size in self.sizes}
+		message_service.listen_for(echo_queue,self.on_echo)
+
+	def on_echo(self, _ch, _method, _properties, body):
+		"""Called when an echoed message is received."""
+
+		received_at = time.perf_counter()
+		try:
+
+			key = json.loads(body)['content'].split(' ',1)[0]
+
+		except (ValueError,KeyError,TypeError,AttributeError):
+
+			# Not a message of the generator
+			return
+
+		with self.condition:
+
+			scheduled_at = self.scheduled_at.pop(key,None)
+			if scheduled_at is not None:
+
+				self.histogram.record((received_at - scheduled_at) * 1000000)
+				self.received += 1
+				self.condition.notify_all()
+
+	def run(self, duration:float, timeout:float=5):
+		"""Publish the messages during some time and wait for their echoes.
+
+		Parameters
+		----------
+		duration : float
+			The seconds to publish messages.
+		timeout : float
+			The maximum seconds to wait for the echoes after the last message is published.
+
+		Returns
+		-------
+		LatencyHistogram
+			The latencies, in microseconds, of the echoed messages. The messages that have not been
+			echoed before the timeout are not counted and they are lost.
+		"""
+
+		with self.condition:
+
+			self.histogram = LatencyHistogram()
+			self.scheduled_at.clear()
+			self.sent = 0
+			self.received = 0
+			self.max_lag = 0.0
+
+		interval = 1 / self.rate
+		messages = int(duration * self.rate)
+		start = time.perf_counter()
+		for sequence in range(messages):
+
+			scheduled_at = start + sequence * interval
+			lag = time.perf_counter() - scheduled_at
+			if lag < 0:
+
+				time.sleep(-lag)
+
+			else:
+
+				self.max_lag = max(self.max_lag,lag)
+
+			key = f"{self.run_id}-{sequence}"
+			with self.condition:
+
+				self.scheduled_at[key] = scheduled_at
+
+			size = self.sizes[sequence % len(self.sizes)]
+			self.message_service.publish_to(self.queue,{"content": f"{key} {self.__paddings[size]}"})
+			self.sent += 1
+
+		self.publish_seconds = time.perf_counter() - start
+		with self.condition:
+
+			self.condition.wait_for(lambda: self.received >= self.sent,timeout)
+			if self.received < self.sent:
+
+				logging.warning("Not received the echo of %s messages",self.sent - self.received)
+
+			self.scheduled_at.clear()
+			return self.histogram
+
+	def lost(self):
+		"""Return the number of published messages whose echo has not been received."""
+
+		return self.sent - self.received
+
+	def report(self):
+		"""Return the text to report the last run."""
+
+		lines = [
+			f"Target rate: {self.rate:.1f} msgs/s, sent: {self.sent}, echoed: {self.received}, lost: {self.lost()}",
+			f"Publish rate: {self.sent / self.publish_seconds if self.publish_seconds > 0 else 0:.1f} msgs/s, maximum publish lag: {self.max_lag * 1000:.3f} ms",
+			"Latency (ms):",
+			self.histogram.format_distribution(1000.0)
+		]
+		return '\n'.join(lines)
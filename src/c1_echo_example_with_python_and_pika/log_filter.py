@@ -0,0 +1,207 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import random
+import threading
+import time
+
+
+def parse_level_values(text:str):
+	"""Parse a list of values by log level, like 'DEBUG=0.1,INFO=0.5'.
+
+	Parameters
+	----------
+	text : str
+		The values separated by commas.
+
+	Returns
+	-------
+	dict
+		The value of each log level.
+	"""
+
+	values = {}
+	for item in text.split(','):
+
+		if '=' in item:
+
+			level,value = item.split('=',1)
+			values[level.strip().upper()] = float(value)
+
+	return values
+
+
+class MOVLogFilter:
+	"""Decide which log messages are sent to the MOV.
+
+	The ERROR messages are always sent. The other ones are collapsed when the same message
+	is repeated inside a window, sampled for the levels INFO and DEBUG, and limited to
+	a maximum rate by level. The repeated messages are reported, with the times they have
+	been repeated, when their window finishes.
+	"""
+
+	SAMPLED_LEVELS = ('DEBUG','INFO')
+
+	def __init__(self, rate_limits:dict=None, sample_rates:dict=None, dedup_window:float=0, max_dedup_keys:int=10000):
+		"""Initialize the filter
+
+		Parameters
+		----------
+		rate_limits : dict
+			The maximum log messages per second of each level.
+		sample_rates : dict
+			The probability, between 0 and 1, to send a log message of the levels INFO or DEBUG.
+		dedup_window : float
+			The seconds that the same log message is collapsed. If it is '0' the messages are not collapsed.
+		max_dedup_keys : int
+			The maximum number of different log messages that are collapsed at the same time.
+		"""
+		self.rate_limits = {level.upper():rate for level,rate in (rate_limits or {}).items() if rate > 0}
+		self.sample_rates = {level.upper():rate for level,rate in (sample_rates or {}).items() if level.upper() in self.SAMPLED_LEVELS}
+		self.dedup_window = dedup_window
+		self.max_dedup_keys = max_dedup_keys
+		self.dropped = {}
+		self.__lock = threading.Lock()
+		self.__tokens = {level:(max(1.0,rate),time.monotonic()) for level,rate in self.rate_limits.items()}
+		self.__repeats = {}
+		self.__finished = []
+
+	def is_enabled(self):
+		"""Check if the filter can drop any log message."""
+
+		return len(self.rate_limits) > 0 or len(self.sample_rates) > 0 or self.dedup_window > 0
+
+	def accept(self, level:str, msg:str, payload=None):
+		"""Check if a log message has to be sent to the MOV.
+
+		Parameters
+		----------
+		level : str
+			The log level
+		msg : str
+			The log message
+		payload: object
+			The payload associated to the log message.
+
+		Returns
+		-------
+		bool
+			True if the log message has to be sent.
+		"""
+
+		if level == 'ERROR':
+
+			return True
+
+		now = time.monotonic()
+		with self.__lock:
+
+			if self.dedup_window > 0 and not self.__first_in_window(now,level,msg,payload):
+
+				return False
+
+			sample_rate = self.sample_rates.get(level)
+			if sample_rate is not None and random.random() >= sample_rate:
+
+				self.__drop(level)
+				return False
+
+			if level in self.__tokens and not self.__take_token(now,level):
+
+				self.__drop(level)
+				return False
+
+		return True
+
+	def __first_in_window(self, now:float, level:str, msg:str, payload):
+		"""Check if it is the first time that a log message is seen in its window, or count a repetition."""
+
+		key = (level,msg,payload if isinstance(payload,(str,bytes)) else repr(payload))
+		repeat = self.__repeats.get(key)
+		if repeat is not None:
+
+			if now - repeat[0] < self.dedup_window:
+
+				repeat[1] += 1
+				return False
+
+			if repeat[1] > 0:
+
+				self.__finished.append((level,msg,repeat[2],repeat[1]))
+
+		elif len(self.__repeats) >= self.max_dedup_keys:
+
+			# Too many different messages to remember, so it is not collapsed
+			return True
+
+		self.__repeats[key] = [now,0,payload]
+		return True
+
+	def __take_token(self, now:float, level:str):
+		"""Take a token of the bucket of a level, if there is any."""
+
+		rate = self.rate_limits[level]
+		tokens,updated = self.__tokens[level]
+		tokens = min(max(1.0,rate),tokens + (now - updated) * rate)
+		if tokens < 1:
+
+			self.__tokens[level] = (tokens,now)
+			return False
+
+		self.__tokens[level] = (tokens - 1,now)
+		return True
+
+	def __drop(self, level:str):
+		"""Count a dropped log message."""
+
+		self.dropped[level] = self.dropped.get(level,0) + 1
+
+	def expired_repeats(self, force:bool=False):
+		"""Return the log messages that have been repeated and whose window has finished.
+
+		Parameters
+		----------
+		force : bool
+			If it is true the repeated messages are returned even if their window has not finished.
+
+		Returns
+		-------
+		list
+			The level, message, payload and times repeated of each collapsed log message.
+		"""
+
+		if self.dedup_window <= 0:
+
+			return []
+
+		now = time.monotonic()
+		with self.__lock:
+
+			expired = self.__finished
+			self.__finished = []
+			for key,(first_seen,count,payload) in list(self.__repeats.items()):
+
+				if force or now - first_seen >= self.dedup_window:
+
+					del self.__repeats[key]
+					if count > 0:
+
+						expired.append((key[0],key[1],payload,count))
+
+		return expired
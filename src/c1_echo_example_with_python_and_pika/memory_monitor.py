@@ -0,0 +1,252 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+from metrics import MEMORY_RSS_BYTES, MEMORY_TRACED_BYTES
+
+try:
+
+	import resource
+
+except ImportError:
+
+	resource = None
+
+
+def current_rss_bytes():
+	"""Return the resident memory of the process in bytes, or its peak if the current one is not available."""
+
+	try:
+
+		with open('/proc/self/statm') as file:
+
+			return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+	except (OSError,ValueError,IndexError):
+
+		if resource is None:
+
+			return 0
+
+		# The peak is in kilobytes on Linux and in bytes on macOS
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+class MemoryMonitor:
+	"""Sample the memory of the component on a background thread, to detect the leaks before the container is killed.
+
+	Each sample updates the metrics of the resident and the traced memory and sends to the MOV a debug log
+	with them and the lines that have allocated more memory. When the resident memory crosses the threshold,
+	the difference between the allocations at that time and when the monitor started is written in the
+	directory of the logs.
+	"""
+
+	def __init__(self, mov=None,
+			interval_seconds:float=float(os.getenv('MEMORY_MONITOR_INTERVAL',"0")),
+			threshold_mb:float=float(os.getenv('MEMORY_MONITOR_THRESHOLD_MB',"0")),
+			top:int=int(os.getenv('MEMORY_MONITOR_TOP',"10")),
+			trace_frames:int=int(os.getenv('MEMORY_MONITOR_TRACE_FRAMES',"1")),
+			log_dir:str=os.getenv('LOG_DIR','logs')
+		):
+		"""Initialize the monitor
+
+		Parameters
+		----------
+		mov : MOVService
+			The service to send the samples as debug logs, or None to only update the metrics.
+		interval_seconds : float
+			The seconds between two samples. By default uses the environment variable MEMORY_MONITOR_INTERVAL
+			and if it is not defined uses '0', that means that the memory is not monitored.
+		threshold_mb : float
+			The resident memory, in megabytes, that when crossed writes the difference of the allocations. By default
+			uses the environment variable MEMORY_MONITOR_THRESHOLD_MB and if it is not defined uses '0', that means
+			that the difference is never written.
+		top : int
+			The number of lines that have allocated more memory to report in each sample. By default uses the
+			environment variable MEMORY_MONITOR_TOP and if it is not defined uses '10'. With '0' the allocations
+			are not traced, so the overhead of tracemalloc is avoided.
+		trace_frames : int
+			The number of frames of each traced allocation. By default uses the environment variable
+			MEMORY_MONITOR_TRACE_FRAMES and if it is not defined uses '1'.
+		log_dir : str
+			The directory to write the differences of the allocations. By default uses the environment variable
+			LOG_DIR and if it is not defined uses 'logs'.
+		"""
+		self.mov = mov
+		self.interval_seconds = interval_seconds
+		self.threshold_bytes = int(threshold_mb * 1024 * 1024)
+		self.top = top
+		self.trace_frames = trace_frames
+		self.log_dir = log_dir
+		self.peak_rss = 0
+		self.baseline = None
+		self.over_threshold = False
+		self.__started_tracing = False
+		self.__stopped = threading.Event()
+		self.__thread = None
+
+	def start(self):
+		"""Start to sample the memory on a background thread.
+
+		Returns
+		-------
+		bool
+			True if the monitor has started, or False if it is disabled.
+		"""
+
+		if self.interval_seconds <= 0:
+
+			return False
+
+		if self.top > 0:
+
+			if not tracemalloc.is_tracing():
+
+				tracemalloc.start(self.trace_frames)
+				self.__started_tracing = True
+
+			self.baseline = self.__snapshot()
+
+		self.__stopped.clear()
+		self.__thread = threading.Thread(target=self.__run,name='memory-monitor',daemon=True)
+		self.__thread.start()
+		logging.info("Monitoring the memory every %s seconds",self.interval_seconds)
+		return True
+
+	def stop(self):
+		"""Stop to sample the memory."""
+
+		self.__stopped.set()
+		if self.__thread is not None:
+
+			self.__thread.join()
+			self.__thread = None
+
+		if self.__started_tracing:
+
+			tracemalloc.stop()
+			self.__started_tracing = False
+
+		self.baseline = None
+
+	def __run(self):
+		"""Sample the memory until the monitor is stopped."""
+
+		while not self.__stopped.wait(self.interval_seconds):
+
+			try:
+
+				self.sample()
+
+			except Exception:
+
+				logging.exception("Cannot sample the memory")
+
+	def __snapshot(self):
+		"""Return the current traced allocations, without the ones of tracemalloc itself."""
+
+		return tracemalloc.take_snapshot().filter_traces((
+			tracemalloc.Filter(False,tracemalloc.__file__),
+			tracemalloc.Filter(False,'<frozen importlib._bootstrap>'),
+			tracemalloc.Filter(False,'<unknown>')
+		))
+
+	def sample(self):
+		"""Sample the memory, update the metrics and report it.
+
+		Returns
+		-------
+		dict
+			The resident and the traced memory in bytes, and the lines that have allocated more memory.
+		"""
+
+		rss = current_rss_bytes()
+		self.peak_rss = max(self.peak_rss,rss)
+		MEMORY_RSS_BYTES.set(rss)
+		usage = {"rss_bytes": rss, "peak_rss_bytes": self.peak_rss}
+		snapshot = None
+		if self.baseline is not None and tracemalloc.is_tracing():
+
+			traced,traced_peak = tracemalloc.get_traced_memory()
+			MEMORY_TRACED_BYTES.set(traced)
+			usage["traced_bytes"] = traced
+			usage["traced_peak_bytes"] = traced_peak
+			snapshot = self.__snapshot()
+			usage["top"] = [
+				{"line": str(stat.traceback), "bytes": stat.size, "count": stat.count}
+				for stat in snapshot.statistics('lineno')[:self.top]
+			]
+
+		if self.mov is not None:
+
+			self.mov.debug("Memory usage",usage)
+
+		if self.threshold_bytes > 0:
+
+			if rss >= self.threshold_bytes and not self.over_threshold:
+
+				self.over_threshold = True
+				self.__threshold_crossed(rss,snapshot)
+
+			elif rss < self.threshold_bytes:
+
+				self.over_threshold = False
+
+		return usage
+
+	def __threshold_crossed(self, rss:int, snapshot):
+		"""Report that the resident memory has crossed the threshold and write the difference of the allocations."""
+
+		msg = f"The resident memory of {rss // (1024 * 1024)} MB has crossed the threshold of {self.threshold_bytes // (1024 * 1024)} MB"
+		logging.warning(msg)
+		if self.mov is not None:
+
+			self.mov.warn(msg)
+
+		if snapshot is None:
+
+			return
+
+		path = os.path.join(self.log_dir,f"memory-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.txt")
+		try:
+
+			os.makedirs(self.log_dir,exist_ok=True)
+			with open(path,'w') as file:
+
+				file.write(f"{msg}\nThe allocations that have grown since the monitor started:\n")
+				for stat in snapshot.compare_to(self.baseline,'traceback'):
+
+					if stat.size_diff <= 0:
+
+						continue
+
+					file.write(f"\n{stat.size_diff:+} bytes in {stat.count_diff:+} blocks, {stat.size} bytes in {stat.count} blocks now\n")
+					file.writelines(f"  {line}\n" for line in stat.traceback.format())
+
+			logging.info("Written the difference of the allocations %s",path)
+
+		except OSError:
+
+			logging.exception("Cannot write the difference of the allocations %s",path)
@@ -17,7 +17,6 @@
 # along with this program.	If not, see <http://www.gnu.org/licenses/>.
 #
 
-import json
 import logging
 import os
 import time
@@ -25,6 +24,16 @@ from threading import Thread
 
 import pika
 
+from backoff import backoff_delay
+from codec import create_codec
+from compression import create_compressor, decompress_callback
+from confirmed_publisher import ConfirmedPublisher
+from consumer_worker_pool import ConsumerWorkerPool
+from flow_control import FlowControl
+from metrics import MESSAGES_PUBLISHED, PUBLISH_DURATION, PUBLISH_FAILURES, RECONNECTS, instrument_callback
+from publisher_pool import PublisherPool
+from tracing import trace_headers
+
 class MessageService:
 	"""The service to send and receive messages from the RabbitMQ"""
 
@@ -35,6 +44,16 @@ class MessageService:
 			password:str=os.getenv('RABBITMQ_PASSWORD','password'),
 			max_retries:int=int(os.getenv('RABBITMQ_MAX_RETRIES',"100")),
 			retry_sleep_seconds:int=int(os.getenv('RABBITMQ_RETRY_SLEEP',"3")),
+			publish_pool_size:int=int(os.getenv('RABBITMQ_PUBLISH_POOL_SIZE',"2")),
+			publish_confirm:bool=os.getenv('RABBITMQ_PUBLISH_CONFIRM',"false").lower() == "true",
+			retry_hook=None,
+			codec=None,
+			compressor=None,
+			reconnect_initial_seconds:float=float(os.getenv('RABBITMQ_RECONNECT_INITIAL_DELAY',"0.1")),
+			reconnect_max_seconds:float=float(os.getenv('RABBITMQ_RECONNECT_MAX_DELAY',"10")),
+			blocked_connection_timeout:float=float(os.getenv('RABBITMQ_BLOCKED_CONNECTION_TIMEOUT',"60")),
+			publish_blocked_seconds:float=float(os.getenv('RABBITMQ_PUBLISH_BLOCKED_TIMEOUT',"5")),
+			max_pending_publications:int=int(os.getenv('RABBITMQ_MAX_PENDING_PUBLICATIONS',"10000"))
 		):
 		"""Initialize the connection to the RabbitMQ
 
@@ -58,27 +77,88 @@ class MessageService:
 		retry_sleep_seconds : int
 			The seconds to wait between the tries for create a connection with the RabbitMQ server.
 			By default uses the environment variable RABBITMQ_RETRY_SLEEP and if it is not defined uses '3'.
+		publish_pool_size : int
+			The maximum number of long-lived connections used to publish messages. By default uses
+			the environment variable RABBITMQ_PUBLISH_POOL_SIZE and if it is not defined uses '2'.
+		publish_confirm : bool
+			If it is true the messages are published as persistent and confirmed by the RabbitMQ
+			asynchronously. By default uses the environment variable RABBITMQ_PUBLISH_CONFIRM
+			and if it is not defined uses 'false'.
+		retry_hook: method
+			The method to call with the queue, body, properties and number of attempts of any
+			message that the RabbitMQ has not confirmed. It is only used when 'publish_confirm'
+			is true, and by default the message is published again up to 'max_retries' times.
+		codec: object
+			The codec to encode the published messages and to decode the received ones. By default uses
+			the codec of the environment variable MESSAGE_CODEC and if it is not defined uses the fastest
+			that is installed.
+		compressor: PayloadCompressor
+			The compressor of the published messages that are large. By default uses the compression of the
+			environment variables MESSAGE_COMPRESSION and MESSAGE_COMPRESSION_THRESHOLD. The received messages
+			with a content encoding are always decompressed before calling the callbacks.
+		reconnect_initial_seconds : float
+			The seconds to wait before the first try to connect again with the RabbitMQ server when the connection
+			is lost while consuming. Each failed try doubles the wait, with a random jitter. By default uses the
+			environment variable RABBITMQ_RECONNECT_INITIAL_DELAY and if it is not defined uses '0.1'.
+		reconnect_max_seconds : float
+			The maximum seconds to wait between the tries to connect again with the RabbitMQ server. By default
+			uses the environment variable RABBITMQ_RECONNECT_MAX_DELAY and if it is not defined uses '10'.
+		blocked_connection_timeout : float
+			The maximum seconds that a connection can be blocked by the broker, because of a memory or
+			disk alarm, before it is closed. By default uses the environment variable
+			RABBITMQ_BLOCKED_CONNECTION_TIMEOUT and if it is not defined uses '60'.
+		publish_blocked_seconds : float
+			The maximum seconds that a publication waits while the broker blocks its connection, before
+			it fails. By default uses the environment variable RABBITMQ_PUBLISH_BLOCKED_TIMEOUT and if
+			it is not defined uses '5'.
+		max_pending_publications : int
+			The maximum number of messages that wait for the connection that publishes with confirmations, or
+			for the broker to unblock it, before the publications fail. It is only used when 'publish_confirm'
+			is true. By default uses the environment variable RABBITMQ_MAX_PENDING_PUBLICATIONS and if it is
+			not defined uses '10000'.
 		"""
 
 		self.credentials = pika.PlainCredentials(username=username,password=password)
 		self.host=host
 		self.port=port
+		self.connection_parameters = pika.ConnectionParameters(host=self.host,port=self.port,credentials=self.credentials,
+			blocked_connection_timeout=blocked_connection_timeout)
+		# The consumers are paused while the broker blocks the publications
+		self.flow_control = FlowControl()
+		self.flow_control.add_listener(self.__on_flow_control)
+		self.publisher_pool = PublisherPool(self.connection_parameters,publish_pool_size,self.flow_control,publish_blocked_seconds)
+		self.confirmed_publisher = None
+		self.worker_pools = []
+		self.codec = codec if codec is not None else create_codec()
+		self.compressor = compressor if compressor is not None else create_compressor()
+		self.max_retries = max_retries
+		self.reconnect_initial_seconds = reconnect_initial_seconds
+		self.reconnect_max_seconds = reconnect_max_seconds
+		self.__listeners = []
+		self.__consumers = []
+		self.__paused = False
+		self.__closing = False
 
 		tries=0
 		while tries < max_retries:
 
 			try:
 
-				self.listen_connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host,port=self.port,credentials=self.credentials))
+				self.listen_connection = pika.BlockingConnection(self.connection_parameters)
 				self.listen_channel = self.listen_connection.channel()
 
 			except (OSError,pika.exceptions.AMQPError):
 
 				logging.warning("Connection was closed, retrying...")
+				RECONNECTS.labels('listen').inc()
 				time.sleep(retry_sleep_seconds)
 
 			else:
 
+				if publish_confirm:
+
+					self.confirmed_publisher = ConfirmedPublisher(self.connection_parameters,retry_hook,max_retries,retry_sleep_seconds,self.flow_control,max_pending_publications)
+
 				return
 
 			tries+=1
@@ -90,6 +170,7 @@ class MessageService:
 	def close(self):
 		"""Close the connections."""
 
+		self.__closing = True
 		try:
 
 			if self.listen_connection.is_open is True:
@@ -105,9 +186,17 @@ class MessageService:
 
 			logging.exception("Unexpected close RabbitMQ connection status")
 
+		for worker_pool in self.worker_pools:
+
+			worker_pool.shutdown()
+
+		self.publisher_pool.close()
+		if self.confirmed_publisher is not None:
+
+			self.confirmed_publisher.close()
 
 
-	def listen_for(self,queue:str,callback):
+	def listen_for(self,queue:str,callback,workers:int=0,prefetch:int=0,auto_ack:bool=True):
 		"""Register a input channel
 
 		Parameters
@@ -116,70 +205,429 @@ class MessageService:
 			The name of the queue to listen.
 		callback: method
 			The method to call when a message is received.
+		workers : int
+			The number of threads that process the messages of the queue. If it is '0' the
+			messages are acknowledged when they are received and processed on the consuming thread.
+			Otherwise they are acknowledged when the callback finishes on a worker thread.
+		prefetch : int
+			The maximum number of messages that are not acknowledged. It is only used when
+			there are workers, and if it is '0' it is the number of workers, or when the messages
+			are not acknowledged automatically, and if it is '0' it is unlimited.
+		auto_ack : bool
+			If it is false and there are not workers, the messages are not acknowledged when they are
+			received and the callback must acknowledge them with the received channel.
 		"""
 
+		callback = instrument_callback(queue,decompress_callback(callback,not auto_ack and workers == 0))
+		if workers > 0:
+
+			worker_pool = ConsumerWorkerPool(callback,workers)
+			self.worker_pools.append(worker_pool)
+			listener = (queue,worker_pool.on_message,prefetch if prefetch > 0 else workers,False)
+
+		else:
+
+			listener = (queue,callback,prefetch if not auto_ack else 0,auto_ack)
+
+		# Registered to subscribe again when the connection is open again
+		self.__listeners.append(listener)
+		self.__subscribe(*listener)
+		logging.debug("Listen for the queue %s",queue)
+
+
+	def __subscribe(self,queue:str,on_message,prefetch:int,auto_ack:bool):
+		"""Declare a queue and start to consume it on the listen channel, if the consumers are not paused."""
+
 		self.listen_channel.queue_declare(queue=queue,
 			durable=True,
 			exclusive=False,
 			auto_delete=False)
-		self.listen_channel.basic_consume(queue=queue,
-			auto_ack=True,
-			on_message_callback=callback)
-		logging.debug("Listen for the queue %s",queue)
+		if not self.__paused:
 
+			self.__consume(queue,on_message,prefetch,auto_ack)
 
-	def publish_to(self,queue:str,msg):
-		"""Register a input channel
+
+	def __consume(self,queue:str,on_message,prefetch:int,auto_ack:bool):
+		"""Start to consume a queue on the listen channel, with the prefetch of its listener."""
+
+		# The prefetch applies to the consumers started after it, so it is set for each one, including the unlimited ones
+		self.listen_channel.basic_qos(prefetch_count=prefetch)
+		consumer_tag = self.listen_channel.basic_consume(queue=queue,
+			auto_ack=auto_ack,
+			on_message_callback=on_message)
+		self.__consumers.append((consumer_tag,on_message))
+
+
+	def __on_flow_control(self,blocked:bool):
+		"""Called when the broker blocks or unblocks the publications, to pause or resume the consumers."""
+
+		try:
+
+			self.listen_connection.add_callback_threadsafe(self.__pause_consuming if blocked else self.__resume_consuming)
+
+		except (OSError,pika.exceptions.AMQPError):
+
+			logging.debug("Cannot change the consumers of a closed connection",exc_info=True)
+
+
+	def __pause_consuming(self):
+		"""Cancel the consumers, so no more messages are received that cannot be published. It must be
+		called on the consuming thread. The messages that have been received are still processed."""
+
+		if self.__paused:
+
+			return
+
+		self.__paused = True
+		for consumer_tag,on_message in self.__consumers:
+
+			# The messages that are acknowledged automatically and have arrived before the cancellation are returned
+			for method,properties,body in self.listen_channel.basic_cancel(consumer_tag):
+
+				on_message(self.listen_channel,method,properties,body)
+
+		self.__consumers = []
+		logging.warning("Paused the consumers while the RabbitMQ blocks the publications")
+
+
+	def __resume_consuming(self):
+		"""Start again the consumers that have been paused. It must be called on the consuming thread."""
+
+		if not self.__paused:
+
+			return
+
+		self.__paused = False
+		for listener in self.__listeners:
+
+			self.__consume(*listener)
+
+		logging.info("Resumed the consumers")
+
+
+	def __encode(self,msg):
+		"""Return the body to publish a message, that is not encoded again if it is already bytes, and its
+		content encoding, that is None if it is not compressed."""
+
+		if isinstance(msg,(bytes,bytearray,memoryview)):
+
+			return self.compressor.compress(msg)
+
+		return self.compressor.compress(self.codec.encode(msg))
+
+
+	def __message_properties(self,trace_id:str=None,content_encoding:str=None):
+		"""Return the properties to publish a message, with the headers to trace it."""
+
+		if self.confirmed_publisher is not None:
+
+			return pika.BasicProperties(content_type='application/json',content_encoding=content_encoding,delivery_mode=pika.DeliveryMode.Persistent,headers=trace_headers(trace_id))
+
+		else:
+
+			return pika.BasicProperties(content_type='application/json',content_encoding=content_encoding,headers=trace_headers(trace_id))
+
+
+	def publish_to(self,queue:str,msg,trace_id:str=None):
+		"""Publish a message into a queue using the long-lived publisher connections
 
 		Parameters
 		----------
 		queue : str
 			The name of the queue to publish the event.
 		msg: object
-			The message to send.
+			The message to send, or the bytes of the message already encoded as JSON.
+		trace_id: str
+			The identifier of the trace of the message, like the one of a received message that it answers,
+			or None to start a new trace. It is sent with the time of the publication in the headers.
 		"""
 
+		start = time.perf_counter()
 		try:
 
-			body=json.dumps(msg)
-			properties=pika.BasicProperties(content_type='application/json')
-			publish_connection =  pika.BlockingConnection(pika.ConnectionParameters(host=self.host,port=self.port,credentials=self.credentials))
-			publish_channel = publish_connection.channel()
-			publish_channel.basic_publish(exchange='',routing_key=queue,body=body,properties=properties)
-			logging.debug("Publish message to the queue %s",queue)
-			publish_channel.close()
-			publish_connection.close()
+			body,content_encoding=self.__encode(msg)
+			properties=self.__message_properties(trace_id,content_encoding)
+			if self.confirmed_publisher is not None:
+
+				published = self.confirmed_publisher.publish(queue,body,properties)
+
+			else:
+
+				self.publisher_pool.publish(queue,body,properties)
+				published = True
+
+			if published:
+
+				MESSAGES_PUBLISHED.labels(queue).inc()
+				logging.debug("Publish message to the queue %s",queue)
+
+			else:
+
+				PUBLISH_FAILURES.labels(queue).inc()
+				logging.warning("Cannot publish a msg in the queue %s, because there are too many messages pending to publish",queue)
+
+		except pika.exceptions.ConnectionBlockedTimeout:
+
+			PUBLISH_FAILURES.labels(queue).inc()
+			logging.warning("Cannot publish a msg in the queue %s, because the RabbitMQ is blocking the publications",queue)
 
 		except (OSError,pika.exceptions.AMQPError):
 
+			PUBLISH_FAILURES.labels(queue).inc()
 			logging.exception("Cannot publish a msg in the queue %s",queue)
 
-		except ValueError:
+		except (TypeError,ValueError):
 
+			PUBLISH_FAILURES.labels(queue).inc()
 			logging.exception("Cannot publish a msg because can not encode the message")
 
+		PUBLISH_DURATION.observe(time.perf_counter() - start)
+
+
+	def publish_many(self,queue:str,msgs,trace_ids=None):
+		"""Publish a batch of messages into a queue
+
+		Parameters
+		----------
+		queue : str
+			The name of the queue to publish the events.
+		msgs: iterable
+			The messages to send, or the bytes of the messages already encoded as JSON.
+		trace_ids: iterable
+			The identifier of the trace of each message, or None to start a new trace for each one.
+
+		Returns
+		-------
+		list of bool
+			For each message, True if it has been published.
+		"""
+
+		return self.publish_batch(((queue,msg) for msg in msgs),trace_ids)
+
+
+	def publish_batch(self,messages,trace_ids=None):
+		"""Publish a batch of messages, that can go to different queues, over the same channel
+
+		Parameters
+		----------
+		messages : iterable
+			The pairs with the name of the queue and the message to send, or the bytes of the message
+			already encoded as JSON.
+		trace_ids: iterable
+			The identifier of the trace of each message, or None to start a new trace for each one.
+
+		Returns
+		-------
+		list of bool
+			For each message, True if it has been published.
+		"""
+
+		start = time.perf_counter()
+		trace_ids = list(trace_ids) if trace_ids is not None else None
+		outcomes = []
+		encoded = []
+		for index,(queue,msg) in enumerate(messages):
+
+			outcomes.append(False)
+			try:
+
+				body,content_encoding=self.__encode(msg)
+				properties=self.__message_properties(trace_ids[index] if trace_ids is not None else None,content_encoding)
+				encoded.append((index,queue,body,properties))
+
+			except (TypeError,ValueError):
+
+				PUBLISH_FAILURES.labels(queue).inc()
+				logging.exception("Cannot publish a msg because can not encode the message")
+
+		if len(encoded) == 0:
+
+			return outcomes
+
+		if self.confirmed_publisher is not None:
+
+			for index,queue,body,properties in encoded:
+
+				try:
+
+					outcomes[index] = self.confirmed_publisher.publish(queue,body,properties)
+					if not outcomes[index]:
+
+						logging.warning("Cannot publish a msg in the queue %s, because there are too many messages pending to publish",queue)
+
+				except (OSError,pika.exceptions.AMQPError):
+
+					logging.exception("Cannot publish a msg in the queue %s",queue)
+
+		else:
+
+			with self.publisher_pool.lease() as channel:
+
+				for index,queue,body,properties in encoded:
+
+					try:
+
+						channel.basic_publish(queue,body,properties)
+						outcomes[index] = True
+
+					except pika.exceptions.ConnectionBlockedTimeout:
+
+						logging.warning("Cannot publish a msg in the queue %s, because the RabbitMQ is blocking the publications",queue)
+						break
+
+					except (OSError,pika.exceptions.AMQPError):
+
+						logging.exception("Cannot publish a msg in the queue %s",queue)
+						break
+
+		for index,queue,_body,_properties in encoded:
+
+			(MESSAGES_PUBLISHED if outcomes[index] else PUBLISH_FAILURES).labels(queue).inc()
+
+		PUBLISH_DURATION.observe(time.perf_counter() - start)
+		logging.debug("Published %s of %s messages",outcomes.count(True),len(outcomes))
+		return outcomes
+
 
 	def start_consuming(self):
-		"""Start to consume the messages."""
+		"""Start to consume the messages until the service is closed. When the connection is lost,
+		it is open again and all the listened queues are subscribed again."""
 
-		try:
+		logging.info("Start listening for events")
+		while True:
 
-			logging.info("Start listening for events")
-			self.listen_channel.start_consuming()
+			try:
 
-		except KeyboardInterrupt:
+				if self.__paused:
 
-			logging.info("Stop listening for events")
+					if self.__closing:
 
-		except pika.exceptions.AMQPError:
+						return
 
-			logging.info("Closed connection")
+					# The idle publisher connections are checked to know when the broker unblocks them
+					self.publisher_pool.process_events()
+					self.listen_connection.process_data_events(time_limit=1)
+					continue
 
-		except BaseException:
+				self.listen_channel.start_consuming()
+
+			except KeyboardInterrupt:
+
+				logging.info("Stop listening for events")
+				return
+
+			except (OSError,pika.exceptions.AMQPError):
+
+				if self.__closing:
+
+					logging.info("Closed connection")
+					return
+
+				logging.warning("Lost the connection to RabbitMQ, reconnecting...")
+
+			except BaseException:
+
+				logging.exception("Consuming messages error.")
+				return
+
+			else:
+
+				if self.__closing:
+
+					return
+
+				if self.__paused:
+
+					continue
+
+				logging.warning("The consumers have been cancelled, subscribing again...")
+
+			if not self.__reconnect():
 
-			logging.exception("Consuming messages error.")
+				return
+
+
+	def __reconnect(self):
+		"""Open again the listen connection, waiting between the tries with a capped exponential backoff
+		and jitter, and subscribe again to all the listened queues.
+
+		Returns
+		-------
+		bool
+			True if the queues are consumed again, or False if the service is closed or it cannot connect.
+		"""
+
+		self.__close_lost_connection()
+		for attempt in range(self.max_retries):
+
+			time.sleep(backoff_delay(attempt,self.reconnect_initial_seconds,self.reconnect_max_seconds))
+			if self.__closing:
+
+				return False
+
+			RECONNECTS.labels('listen').inc()
+			try:
+
+				self.listen_connection = pika.BlockingConnection(self.connection_parameters)
+				self.listen_channel = self.listen_connection.channel()
+				self.__consumers = []
+				for listener in self.__listeners:
+
+					self.__subscribe(*listener)
+
+			except (OSError,pika.exceptions.AMQPError):
+
+				logging.warning("Cannot reconnect to RabbitMQ, retrying...")
+				self.__close_lost_connection()
+
+			else:
+
+				logging.info("Reconnected to RabbitMQ after %s tries",attempt + 1)
+				return True
+
+		logging.error("Cannot reconnect to the RabbitMQ at %s:%s",self.host,self.port)
+		return False
+
+
+	def __close_lost_connection(self):
+		"""Close the listen connection if it is still open after it has failed."""
+
+		try:
+
+			if self.listen_connection.is_open:
+
+				self.listen_connection.close()
+
+		except (OSError,pika.exceptions.AMQPError):
+
+			logging.debug("Cannot close the lost connection")
 
 	def start_consuming_and_forget(self):
 		"""Start to consume the messages using an independent Thread."""
 
 		Thread(target=self.start_consuming).start()
+
+	def call_later(self,delay:float,callback):
+		"""Call a function on the consuming thread after a delay. It must be called from
+		the consuming thread, like from the callback of a listened queue.
+
+		Parameters
+		----------
+		delay : float
+			The seconds to wait before calling the function.
+		callback: method
+			The function to call without arguments.
+		"""
+
+		self.listen_connection.call_later(delay,callback)
+
+	def process_events(self,time_limit:float=0):
+		"""Consume the received messages for a while on the calling thread.
+
+		Parameters
+		----------
+		time_limit : float
+			The maximum seconds to wait for messages.
+		"""
+
+		self.listen_connection.process_data_events(time_limit=time_limit)
@@ -0,0 +1,431 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import abc
+import bisect
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tracing import queue_wait_seconds
+
+DEFAULT_BUCKETS = (0.0001,0.00025,0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0)
+
+
+def _escape(value:str):
+	"""Escape a label value of the text format of Prometheus."""
+
+	return str(value).replace('\\','\\\\').replace('\n','\\n').replace('"','\\"')
+
+
+def _format_labels(names, values, extra:str=''):
+	"""Return the labels of a sample of the text format of Prometheus."""
+
+	labels = [f'{name}="{_escape(value)}"' for name,value in zip(names,values)]
+	if extra:
+
+		labels.append(extra)
+
+	return '{' + ','.join(labels) + '}' if labels else ''
+
+
+class _CounterChild:
+	"""The value of a counter for some label values."""
+
+	def __init__(self):
+		self.value = 0.0
+		self.lock = threading.Lock()
+
+	def inc(self, amount:float=1):
+		"""Increment the counter."""
+
+		with self.lock:
+
+			self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+	"""The value of a gauge for some label values."""
+
+	def dec(self, amount:float=1):
+		"""Decrement the gauge."""
+
+		self.inc(-amount)
+
+	def set(self, value:float):
+		"""Set the value of the gauge."""
+
+		with self.lock:
+
+			self.value = float(value)
+
+
+class _HistogramChild:
+	"""The observations of a histogram for some label values."""
+
+	def __init__(self, buckets):
+		self.buckets = buckets
+		self.counts = [0] * (len(buckets) + 1)
+		self.sum = 0.0
+		self.lock = threading.Lock()
+
+	def observe(self, value:float):
+		"""Count an observed value."""
+
+		index = bisect.bisect_left(self.buckets,value)
+		with self.lock:
+
+			self.counts[index] += 1
+			self.sum += value
+
+
+class Metric(abc.ABC):
+	"""A metric with a value, or some observations, for each combination of the values of its labels."""
+
+	type = 'untyped'
+
+	def __init__(self, name:str, documentation:str, labelnames=(), registry=None):
+		"""Initialize the metric and add it to a registry
+
+		Parameters
+		----------
+		name : str
+			The name of the metric.
+		documentation : str
+			The description of the metric.
+		labelnames : tuple of str
+			The names of the labels of the metric.
+		registry : MetricsRegistry
+			The registry to add the metric. By default it is the registry of the component.
+		"""
+		self.name = name
+		self.documentation = documentation
+		self.labelnames = tuple(labelnames)
+		self.__children = {}
+		self.__lock = threading.Lock()
+		(registry if registry is not None else REGISTRY).register(self)
+
+	@abc.abstractmethod
+	def _new_child(self):
+		"""Create the value for some label values."""
+
+	def labels(self, *values):
+		"""Return the value of the metric for some label values, creating it the first time."""
+
+		if len(values) != len(self.labelnames):
+
+			raise ValueError(f"The metric {self.name} needs the labels {self.labelnames}")
+
+		key = tuple(str(value) for value in values)
+		child = self.__children.get(key)
+		if child is None:
+
+			with self.__lock:
+
+				child = self.__children.setdefault(key,self._new_child())
+
+		return child
+
+	def children(self):
+		"""Return the label values and the value of each combination of labels."""
+
+		with self.__lock:
+
+			return list(self.__children.items())
+
+	def samples(self):
+		"""Return the lines of the metric in the text format of Prometheus."""
+
+		return [f"{self.name}{_format_labels(self.labelnames,values)} {child.value}" for values,child in self.children()]
+
+
+class Counter(Metric):
+	"""A value that only increases, like the number of messages."""
+
+	type = 'counter'
+
+	def _new_child(self):
+		return _CounterChild()
+
+	def inc(self, amount:float=1):
+		"""Increment the counter of a metric without labels."""
+
+		self.labels().inc(amount)
+
+
+class Gauge(Metric):
+	"""A value that can increase and decrease, like the number of messages in process."""
+
+	type = 'gauge'
+
+	def _new_child(self):
+		return _GaugeChild()
+
+	def set(self, value:float):
+		"""Set the value of a metric without labels."""
+
+		self.labels().set(value)
+
+
+class Histogram(Metric):
+	"""The distribution of some observed values, like the seconds to process the messages."""
+
+	type = 'histogram'
+
+	def __init__(self, name:str, documentation:str, labelnames=(), registry=None, buckets=DEFAULT_BUCKETS):
+		"""Initialize the histogram
+
+		Parameters
+		----------
+		name : str
+			The name of the metric.
+		documentation : str
+			The description of the metric.
+		labelnames : tuple of str
+			The names of the labels of the metric.
+		registry : MetricsRegistry
+			The registry to add the metric. By default it is the registry of the component.
+		buckets : tuple of float
+			The upper bounds of the buckets, in increasing order.
+		"""
+		self.buckets = tuple(sorted(buckets))
+		super().__init__(name,documentation,labelnames,registry)
+
+	def _new_child(self):
+		return _HistogramChild(self.buckets)
+
+	def observe(self, value:float):
+		"""Count an observed value of a metric without labels."""
+
+		self.labels().observe(value)
+
+	def samples(self):
+		lines = []
+		for values,child in self.children():
+
+			with child.lock:
+
+				counts = list(child.counts)
+				total = child.sum
+
+			accumulated = 0
+			for le,count in zip([repr(bound) for bound in self.buckets] + ['+Inf'],counts):
+
+				accumulated += count
+				bucket = f'le="{le}"'
+				lines.append(f"{self.name}_bucket{_format_labels(self.labelnames,values,bucket)} {accumulated}")
+
+			lines.append(f"{self.name}_sum{_format_labels(self.labelnames,values)} {total}")
+			lines.append(f"{self.name}_count{_format_labels(self.labelnames,values)} {accumulated}")
+
+		return lines
+
+
+class MetricsRegistry:
+	"""The metrics of the component, that are exported in the text format of Prometheus."""
+
+	def __init__(self):
+		self.metrics = {}
+		self.__lock = threading.Lock()
+
+	def register(self, metric:Metric):
+		"""Add a metric, that must have a new name."""
+
+		with self.__lock:
+
+			if metric.name in self.metrics:
+
+				raise ValueError(f"The metric {metric.name} is already registered")
+
+			self.metrics[metric.name] = metric
+
+	def render(self):
+		"""Return the values of the metrics in the text format of Prometheus."""
+
+		with self.__lock:
+
+			metrics = list(self.metrics.values())
+
+		lines = []
+		for metric in metrics:
+
+			lines.append(f"# HELP {metric.name} {metric.documentation}")
+			lines.append(f"# TYPE {metric.name} {metric.type}")
+			lines.extend(metric.samples())
+
+		return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+MESSAGES_CONSUMED = Counter('c1_echo_messages_consumed_total',"The messages received from each queue.",('queue',))
+MESSAGES_PUBLISHED = Counter('c1_echo_messages_published_total',"The messages published to each queue.",('queue',))
+PUBLISH_FAILURES = Counter('c1_echo_publish_failures_total',"The messages that could not be published to each queue.",('queue',))
+PUBLISH_DURATION = Histogram('c1_echo_publish_duration_seconds',"The seconds to publish a message, or a batch of messages.")
+HANDLER_DURATION = Histogram('c1_echo_handler_duration_seconds',"The seconds that the callbacks of each queue need to process a message.",('queue',))
+QUEUE_WAIT_DURATION = Histogram('c1_echo_queue_wait_seconds',"The seconds since the received messages of each queue were published until they are processed.",('queue',))
+ECHO_STAGE_DURATION = Histogram('c1_echo_echo_stage_duration_seconds',"The seconds to validate the received messages and to publish their echoes, by stage.",('stage',))
+HANDLER_FAILURES = Counter('c1_echo_handler_failures_total',"The messages of each queue whose callback has failed.",('queue',))
+VALIDATION_FAILURES = Counter('c1_echo_validation_failures_total',"The received messages to echo that are not valid, by reason.",('reason',))
+RECONNECTS = Counter('c1_echo_reconnects_total',"The times that each connection to the RabbitMQ has been open again.",('connection',))
+BROKER_BLOCKED = Gauge('c1_echo_broker_blocked',"If the RabbitMQ is blocking the publications because of a memory or disk alarm.")
+MEMORY_RSS_BYTES = Gauge('c1_echo_memory_rss_bytes',"The resident memory of the process, in bytes.")
+MEMORY_TRACED_BYTES = Gauge('c1_echo_memory_traced_bytes',"The memory allocated by Python that is traced, in bytes.")
+MOV_LOGS_DROPPED = Counter('c1_echo_mov_logs_dropped_total',"The log messages that have not been sent to the MOV, by reason.",('reason',))
+DEDUP_LOOKUPS = Counter('c1_echo_dedup_lookups_total',"The received messages checked to detect the duplicated ones, by result.",('result',))
+DEDUP_EVICTIONS = Counter('c1_echo_dedup_evictions_total',"The keys of the received messages removed from the cache to detect duplicates, by reason.",('reason',))
+DEDUP_ENTRIES = Gauge('c1_echo_dedup_entries',"The keys of the received messages in the cache to detect duplicates.")
+
+
+def instrument_callback(queue:str, callback):
+	"""Wrap the callback of a queue to count the received messages, measure how long they have waited since
+	they were published, for the traced messages, and how long they are processed.
+
+	Parameters
+	----------
+	queue : str
+		The name of the queue.
+	callback: method
+		The method, or coroutine function, to call when a message is received.
+
+	Returns
+	-------
+	method
+		The callback that updates the metrics, that is a coroutine function if the callback is.
+	"""
+
+	consumed = MESSAGES_CONSUMED.labels(queue)
+	queue_wait = QUEUE_WAIT_DURATION.labels(queue)
+	duration = HANDLER_DURATION.labels(queue)
+	failures = HANDLER_FAILURES.labels(queue)
+
+	def received(properties):
+		consumed.inc()
+		wait = queue_wait_seconds(properties)
+		if wait is not None:
+
+			queue_wait.observe(wait)
+
+	if inspect.iscoroutinefunction(callback):
+
+		@functools.wraps(callback)
+		async def instrumented(ch, method, properties, body):
+			received(properties)
+			start = time.perf_counter()
+			try:
+
+				return await callback(ch,method,properties,body)
+
+			except BaseException:
+
+				failures.inc()
+				raise
+
+			finally:
+
+				duration.observe(time.perf_counter() - start)
+
+	else:
+
+		@functools.wraps(callback)
+		def instrumented(ch, method, properties, body):
+			received(properties)
+			start = time.perf_counter()
+			try:
+
+				return callback(ch,method,properties,body)
+
+			except BaseException:
+
+				failures.inc()
+				raise
+
+			finally:
+
+				duration.observe(time.perf_counter() - start)
+
+	return instrumented
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+	"""Answer the requests of the metrics with the values of the registry of the server."""
+
+	def do_GET(self):
+		"""Return the metrics in the text format of Prometheus."""
+
+		if self.path.split('?',1)[0] not in ('/','/metrics'):
+
+			self.send_error(404)
+			return
+
+		body = self.server.registry.render().encode('utf-8')
+		self.send_response(200)
+		self.send_header('Content-Type','text/plain; version=0.0.4; charset=utf-8')
+		self.send_header('Content-Length',str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		"""Log the requests as debug messages instead of writing them to the standard error."""
+
+		logging.debug("Metrics request: " + format,*args)
+
+
+def start_metrics_server(port:int=int(os.getenv('METRICS_PORT',"0")), host:str=os.getenv('METRICS_HOST','0.0.0.0'), registry:MetricsRegistry=None):
+	"""Start a HTTP server, on a daemon thread, that returns the metrics in the text format of Prometheus.
+
+	Parameters
+	----------
+	port : int
+		The port of the server. By default uses the environment variable METRICS_PORT and if it is not defined
+		uses '0', that means that the server is not started.
+	host : str
+		The address to listen. By default uses the environment variable METRICS_HOST and if it is not defined
+		uses '0.0.0.0'.
+	registry : MetricsRegistry
+		The metrics to return. By default it is the registry of the component.
+
+	Returns
+	-------
+	ThreadingHTTPServer
+		The started server, or None if the port is '0' or the server cannot be started.
+	"""
+
+	if port <= 0:
+
+		return None
+
+	try:
+
+		server = ThreadingHTTPServer((host,port),_MetricsRequestHandler)
+
+	except OSError:
+
+		logging.exception("Cannot start the metrics server on the port %s",port)
+		return None
+
+	server.daemon_threads = True
+	server.registry = registry if registry is not None else REGISTRY
+	threading.Thread(target=server.serve_forever,name='metrics-server',daemon=True).start()
+	logging.info("Serving the metrics on the port %s",port)
+	return server
@@ -19,50 +19,79 @@
 import json
 import logging
 import os.path
-import re
+import threading
+import time
+from collections import deque
 
+import component_metadata
+from log_filter import MOVLogFilter, parse_level_values
 from message_service import MessageService
+from metrics import MOV_LOGS_DROPPED
 
 
 class MOVService:
 	"""The component used to interact with the Master Of VALAWAI (MOV)"""
 
-	def __init__(self, message_service:MessageService):
+	def __init__(self, message_service:MessageService,
+			log_buffer_size:int=int(os.getenv('MOV_LOG_BUFFER_SIZE',"10000")),
+			log_batch_size:int=int(os.getenv('MOV_LOG_BATCH_SIZE',"100")),
+			log_flush_interval:float=float(os.getenv('MOV_LOG_FLUSH_INTERVAL',"0.5")),
+			log_filter:MOVLogFilter=None
+		):
 		"""Initialize the MOV service
 
 		Parameters
 		----------
 		message_service: MessageService
 			The service to receive or send messages thought RabbitMQ
+		log_buffer_size: int
+			The maximum number of log messages that are waiting to be sent to the MOV. When it is full
+			the oldest log message is dropped. By default uses the environment variable MOV_LOG_BUFFER_SIZE
+			and if it is not defined uses '10000'. If it is '0' the log messages are sent when they are added.
+		log_batch_size: int
+			The maximum number of log messages to send at once. By default uses the environment
+			variable MOV_LOG_BATCH_SIZE and if it is not defined uses '100'.
+		log_flush_interval: float
+			The maximum seconds that a log message waits to be sent. By default uses the environment
+			variable MOV_LOG_FLUSH_INTERVAL and if it is not defined uses '0.5'.
+		log_filter: MOVLogFilter
+			The filter that decides which log messages are sent to the MOV. By default it is created with
+			the rate limits of the environment variable MOV_LOG_RATE_LIMITS, the sample rates of the environment
+			variable MOV_LOG_SAMPLE_RATES and the window of the environment variable MOV_LOG_DEDUP_WINDOW.
 		"""
 		self.message_service = message_service
 		self.component_id = None
+		self.log_batch_size = max(1,log_batch_size)
+		self.log_flush_interval = log_flush_interval
+		self.dropped_logs = 0
+		self.__log_buffer = deque(maxlen=log_buffer_size) if log_buffer_size > 0 else None
+		self.__log_condition = threading.Condition()
+		self.__log_flusher = None
+		self.__log_stopped = False
+		if log_filter is None:
+
+			log_filter = MOVLogFilter(
+				rate_limits=parse_level_values(os.getenv('MOV_LOG_RATE_LIMITS',"")),
+				sample_rates=parse_level_values(os.getenv('MOV_LOG_SAMPLE_RATES',"")),
+				dedup_window=float(os.getenv('MOV_LOG_DEDUP_WINDOW',"0"))
+			)
+
+		self.log_filter = log_filter if log_filter.is_enabled() else None
 
-	def __read_file(self, path:str):
-		"""Read a file and return its content."""
-
-		class_file_path = os.path.abspath(os.path.dirname(__file__))
-		file_path = os.path.join(class_file_path, path)
-		with open(file_path) as file:
-			return file.read()
-			
 	def load_default_project_version(self):
 		"""Obtain the default version of the project"""
-		setup = self.__read_file('../../pyproject.toml')
-		version = re.findall(r"version\s*=\s*\"(\d+\.\d+\.\d+)\"", setup)[0]
-		return version
+
+		return component_metadata.project_version()
 
 	def load_default_asyncapi_yaml(self):
 		"""Obtain the default AsyncAPI of the component"""
-		async_api = self.__read_file('../../asyncapi.yaml')
-		return async_api
-		
+
+		return component_metadata.asyncapi_yaml()
+
 	def extract_default_component_name(self,asyncapi_yaml:str):
 		"""Obtain the default name of the component from the AsyncAPI description"""
-		
-		match = re.findall(r"valawai/(c[0|1|2]/\w+)/control/registered:", asyncapi_yaml)[0]
-		return match[0:2] + '_' + match[3:]
-		
+
+		return component_metadata.component_name(asyncapi_yaml)
 
 	def listen_for_registered_component(self,name:str):
 		""" The message to register this component into the MOV
@@ -101,7 +130,7 @@ class MOVService:
 		"""Called when the component has been registered."""
 
 		logging.debug("Received registered component %s", body)
-		msg = json.loads(body)
+		msg = self.message_service.codec.decode(body)
 		self.component_id = msg['id']
 		logging.info("Register C2 Treatment autonomy valuator with the identifier '%s'",self.component_id)
 
@@ -156,7 +185,7 @@ class MOVService:
 		msg : str
 			The log message
 		payload: object
-			The payload associated to the log message.
+			The payload associated to the log message, or the bytes of the payload already encoded as JSON.
 		"""
 		self.__log('DEBUG', msg, payload)
 		logging.debug(msg)
@@ -170,7 +199,7 @@ class MOVService:
 		msg : str
 			The log message
 		payload: object
-			The payload associated to the log message.
+			The payload associated to the log message, or the bytes of the payload already encoded as JSON.
 		"""
 		self.__log('INFO', msg, payload)
 		logging.info(msg)
@@ -184,7 +213,7 @@ class MOVService:
 		msg : str
 			The log message
 		payload: object
-			The payload associated to the log message.
+			The payload associated to the log message, or the bytes of the payload already encoded as JSON.
 		"""
 		self.__log('WARN', msg, payload)
 		logging.warning(msg)
@@ -198,7 +227,7 @@ class MOVService:
 		msg : str
 			The log message
 		payload: object
-			The payload associated to the log message.
+			The payload associated to the log message, or the bytes of the payload already encoded as JSON.
 		"""
 		self.__log('ERROR', msg, payload)
 		logging.error(msg)
@@ -214,18 +243,149 @@ class MOVService:
 		msg : str
 			The log message
 		payload: object
-			The payload associated to the log message.
+			The payload associated to the log message, or the bytes of the payload already encoded as JSON.
 		"""
 
+		if self.log_filter is not None:
+
+			if self.__log_buffer is None:
+
+				self.__add_repeated_logs()
+
+			if not self.log_filter.accept(level, msg, payload):
+
+				MOV_LOGS_DROPPED.labels('filter').inc()
+				return
+
+		self.__add_log(level, msg, payload)
+
+	def __add_repeated_logs(self, force:bool=False):
+		"""Send the log messages that have been collapsed with the times they have been repeated."""
+
+		for level,msg,payload,count in self.log_filter.expired_repeats(force):
+
+			self.__add_log(level, f"{msg} (repeated {count} more times)", payload)
+
+	def __add_log(self, level:str, msg:str, payload=None):
+		"""Send, or buffer to send, a log message to the MOV."""
+
 		msg = msg.replace("{"," ")
 		add_log_payload = {"level":level, "message": msg}
 
-		if payload is not None:
+		if isinstance(payload,(bytes,bytearray,memoryview)):
+
+			# Already encoded, so it is only encoded once as a string of the log message
+			add_log_payload["payload"] = str(payload,'utf-8')
 
-			add_log_payload["payload"] = json.dumps(payload)
+		elif payload is not None:
+
+			add_log_payload["payload"] = str(self.message_service.codec.encode(payload),'utf-8')
 
 		if self.component_id is not None:
 
 			add_log_payload["component_id"] = self.component_id
 
+		if self.__log_buffer is not None:
+
+			with self.__log_condition:
+
+				if not self.__log_stopped:
+
+					if len(self.__log_buffer) == self.__log_buffer.maxlen:
+
+						self.dropped_logs += 1
+						MOV_LOGS_DROPPED.labels('buffer').inc()
+
+					self.__log_buffer.append(add_log_payload)
+					if self.__log_flusher is None:
+
+						self.__log_flusher = threading.Thread(target=self.__flush_logs,name='mov-log-flusher',daemon=True)
+						self.__log_flusher.start()
+
+					self.__log_condition.notify()
+					return
+
+		# Without buffer, or once stopped, the log message is sent immediately
 		self.message_service.publish_to('valawai/log/add', add_log_payload)
+
+	def __next_log_batch(self):
+		"""Wait until there are enough log messages to send, or the oldest has waited enough, and return them."""
+
+		with self.__log_condition:
+
+			# When messages are collapsed, wake up periodically to report the repeated ones
+			timeout = self.log_flush_interval if self.log_filter is not None else None
+			if not self.__log_condition.wait_for(lambda: self.__log_buffer or self.__log_stopped, timeout):
+
+				return []
+
+			if self.__log_stopped and not self.__log_buffer:
+
+				return None
+
+			deadline = time.monotonic() + self.log_flush_interval
+			while len(self.__log_buffer) < self.log_batch_size and not self.__log_stopped:
+
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+
+					break
+
+				self.__log_condition.wait(remaining)
+
+			size = min(self.log_batch_size,len(self.__log_buffer))
+			return [self.__log_buffer.popleft() for _i in range(size)]
+
+	def __flush_logs(self):
+		"""Send the buffered log messages to the MOV until the service is stopped."""
+
+		while True:
+
+			if self.log_filter is not None:
+
+				self.__add_repeated_logs()
+
+			batch = self.__next_log_batch()
+			if batch is None:
+
+				# Stopped and all the log messages are sent
+				return
+
+			if len(batch) == 0:
+
+				continue
+
+			try:
+
+				self.message_service.publish_many('valawai/log/add', batch)
+
+			except Exception:
+
+				logging.exception("Cannot send %s log messages to the MOV",len(batch))
+
+	def stop(self, timeout:float=10):
+		""" Send the buffered log messages and stop the thread that sends them.
+
+		Parameters
+		----------
+		timeout : float
+			The maximum seconds to wait for the buffered log messages to be sent.
+		"""
+
+		if self.log_filter is not None:
+
+			self.__add_repeated_logs(force=True)
+
+		with self.__log_condition:
+
+			self.__log_stopped = True
+			self.__log_condition.notify_all()
+			flusher = self.__log_flusher
+
+		if flusher is not None:
+
+			flusher.join(timeout)
+
+		if self.dropped_logs > 0:
+
+			logging.warning("Dropped %s log messages because the buffer to send them to the MOV was full",self.dropped_logs)
@@ -0,0 +1,209 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler:
+	"""Profile a thread, while it runs, by sampling its stack at a fixed interval from another thread.
+
+	The profiled thread is not interrupted or slowed down by tracing, so it can be used on the running
+	component without stopping the processing of the messages. The samples are written as collapsed
+	stacks, one line with the functions from the root separated by ';' and the times it has been sampled,
+	that can be converted to a flame graph with tools like 'flamegraph.pl' or 'speedscope'.
+	"""
+
+	def __init__(self, thread_id:int=None,
+			interval_ms:float=float(os.getenv('PROFILE_INTERVAL_MS',"5")),
+			log_dir:str=os.getenv('LOG_DIR','logs')
+		):
+		"""Initialize the profiler
+
+		Parameters
+		----------
+		thread_id : int
+			The identifier of the thread to profile. By default it is the main thread, that is the one that
+			consumes the messages.
+		interval_ms : float
+			The milliseconds between two samples. By default uses the environment variable PROFILE_INTERVAL_MS
+			and if it is not defined uses '5'.
+		log_dir : str
+			The directory to write the profiles. By default uses the environment variable LOG_DIR and
+			if it is not defined uses 'logs'.
+		"""
+		self.thread_id = thread_id if thread_id is not None else threading.main_thread().ident
+		self.interval_ms = interval_ms
+		self.log_dir = log_dir
+		self.stacks = Counter()
+		self.__labels = {}
+		self.__thread = None
+		self.__lock = threading.Lock()
+
+	def is_running(self):
+		"""Return True if the thread is being profiled."""
+
+		return self.__thread is not None and self.__thread.is_alive()
+
+	def start(self, seconds:float=float(os.getenv('PROFILE_SECONDS',"30"))):
+		"""Start to profile the thread in the background, if it is not being profiled.
+
+		Parameters
+		----------
+		seconds : float
+			The seconds to profile. By default uses the environment variable PROFILE_SECONDS and
+			if it is not defined uses '30'.
+
+		Returns
+		-------
+		bool
+			True if the profile has started, or False if another one is running.
+		"""
+
+		with self.__lock:
+
+			if self.is_running():
+
+				logging.warning("The profiler is already running")
+				return False
+
+			self.__thread = threading.Thread(target=self.run,args=(seconds,),name='sampling-profiler',daemon=True)
+			self.__thread.start()
+			return True
+
+	def __label(self, code):
+		"""Return the name of a function in the collapsed stacks."""
+
+		label = self.__labels.get(code)
+		if label is None:
+
+			label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';',':')
+			self.__labels[code] = label
+
+		return label
+
+	def sample(self):
+		"""Count the current stack of the profiled thread.
+
+		Returns
+		-------
+		bool
+			True if the thread is alive and its stack has been counted.
+		"""
+
+		frame = sys._current_frames().get(self.thread_id)
+		if frame is None:
+
+			return False
+
+		labels = []
+		while frame is not None:
+
+			labels.append(self.__label(frame.f_code))
+			frame = frame.f_back
+
+		labels.reverse()
+		self.stacks[';'.join(labels)] += 1
+		return True
+
+	def run(self, seconds:float):
+		"""Profile the thread during some time and write the profile.
+
+		Parameters
+		----------
+		seconds : float
+			The seconds to profile.
+
+		Returns
+		-------
+		str
+			The path of the written profile, or None if it cannot be written.
+		"""
+
+		logging.info("Profiling the thread %s for %s seconds",self.thread_id,seconds)
+		self.stacks = Counter()
+		interval = self.interval_ms / 1000
+		deadline = time.monotonic() + seconds
+		next_sample = time.monotonic()
+		while next_sample < deadline and self.sample():
+
+			next_sample += interval
+			time.sleep(max(0,next_sample - time.monotonic()))
+
+		path = os.path.join(self.log_dir,f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.collapsed")
+		try:
+
+			self.write(path)
+
+		except OSError:
+
+			logging.exception("Cannot write the profile %s",path)
+			return None
+
+		logging.info("Written the profile %s with %s samples",path,sum(self.stacks.values()))
+		return path
+
+	def write(self, path:str):
+		"""Write the sampled stacks, from the most to the least frequent, as collapsed stacks."""
+
+		os.makedirs(os.path.dirname(path) or '.',exist_ok=True)
+		with open(path,'w') as file:
+
+			for stack,count in self.stacks.most_common():
+
+				file.write(f"{stack} {count}\n")
+
+
+def install_profiler_signal(signal_name:str=os.getenv('PROFILE_SIGNAL','SIGUSR1'), profiler:SamplingProfiler=None):
+	"""Profile the consuming thread when the process receives a signal.
+
+	It must be called from the main thread, that is the one that is profiled by default.
+
+	Parameters
+	----------
+	signal_name : str
+		The name of the signal that starts the profiler. By default uses the environment variable PROFILE_SIGNAL
+		and if it is not defined uses 'SIGUSR1'. If it is empty the profiler is not installed.
+	profiler : SamplingProfiler
+		The profiler to start. By default it profiles the main thread.
+
+	Returns
+	-------
+	SamplingProfiler
+		The profiler that is started by the signal, or None if it is not installed.
+	"""
+
+	if not signal_name:
+
+		return None
+
+	signum = getattr(signal,signal_name,None)
+	if not isinstance(signum,signal.Signals):
+
+		logging.warning("Cannot profile with the unknown signal %s",signal_name)
+		return None
+
+	profiler = profiler if profiler is not None else SamplingProfiler()
+	signal.signal(signum,lambda _signum,_frame: profiler.start())
+	return profiler
@@ -0,0 +1,298 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import pika
+
+from flow_control import FlowControl
+from metrics import RECONNECTS
+
+# The seconds between the checks of the notifications of the broker on a connection that publishes
+EVENTS_INTERVAL_SECONDS = 1
+
+
+class PublisherChannel:
+	"""A long-lived channel, with its own connection, used to publish messages."""
+
+	def __init__(self, parameters:pika.ConnectionParameters, flow_control:FlowControl=None, blocked_seconds:float=5):
+		"""Initialize the channel
+
+		Parameters
+		----------
+		parameters : pika.ConnectionParameters
+			The parameters to connect to the RabbitMQ.
+		flow_control : FlowControl
+			The state to update when the broker blocks or unblocks the connection.
+		blocked_seconds : float
+			The maximum seconds that a publication waits while the broker blocks the connection.
+		"""
+		self.parameters = parameters
+		self.flow_control = flow_control if flow_control is not None else FlowControl()
+		self.blocked_seconds = blocked_seconds
+		self.connection = None
+		self.channel = None
+		self.__events_at = 0.0
+
+	def is_open(self):
+		"""Check if the channel can be used to publish."""
+
+		return self.connection is not None and self.connection.is_open and self.channel is not None and self.channel.is_open
+
+	def open(self):
+		"""Open the connection and the channel if they are not open."""
+
+		if not self.is_open():
+
+			self.close()
+			self.connection = pika.BlockingConnection(self.parameters)
+			self.flow_control.watch(self.connection)
+			self.channel = self.connection.channel()
+			self.__events_at = time.monotonic()
+
+	def close(self):
+		"""Close the connection of the channel."""
+
+		try:
+
+			if self.connection is not None and self.connection.is_open:
+
+				self.connection.close()
+
+		except (OSError,pika.exceptions.AMQPError):
+
+			logging.debug("Cannot close the publisher connection",exc_info=True)
+
+		if self.connection is not None:
+
+			self.flow_control.unblock(self.connection)
+
+		self.connection = None
+		self.channel = None
+
+	def basic_publish(self, queue:str, body, properties:pika.BasicProperties):
+		"""Publish a message into a queue, reconnecting once if the connection is lost.
+
+		Parameters
+		----------
+		queue : str
+			The name of the queue to publish the message.
+		body: bytes
+			The encoded message to send.
+		properties: pika.BasicProperties
+			The properties of the message.
+		"""
+
+		try:
+
+			self.open()
+			self.__wait_unblocked()
+			self.channel.basic_publish(exchange='',routing_key=queue,body=body,properties=properties)
+
+		except pika.exceptions.ConnectionBlockedTimeout:
+
+			# A new connection would be blocked too
+			raise
+
+		except (OSError,pika.exceptions.AMQPConnectionError,pika.exceptions.AMQPChannelError):
+
+			# The broker can close idle connections (missed heartbeats), so retry with a new one
+			logging.warning("Publisher connection was closed, reconnecting...")
+			RECONNECTS.labels('publish').inc()
+			self.close()
+			self.open()
+			self.channel.basic_publish(exchange='',routing_key=queue,body=body,properties=properties)
+
+	def process_events(self, time_limit:float=0):
+		"""Process the notifications that the broker has sent to the connection, like the blocked and unblocked ones."""
+
+		self.__events_at = time.monotonic()
+		self.connection.process_data_events(time_limit)
+
+	def __wait_unblocked(self):
+		"""Wait, processing the notifications of the broker, while it blocks the connection.
+
+		The connection of pika only receives the notifications when it processes its events, so
+		they are checked at most once every EVENTS_INTERVAL_SECONDS while publishing.
+
+		Raises
+		------
+		pika.exceptions.ConnectionBlockedTimeout
+			If the connection is still blocked after the maximum seconds to wait.
+		"""
+
+		if time.monotonic() - self.__events_at >= EVENTS_INTERVAL_SECONDS:
+
+			self.process_events()
+
+		deadline = time.monotonic() + self.blocked_seconds
+		while self.flow_control.is_blocked(self.connection):
+
+			remaining = deadline - time.monotonic()
+			if remaining <= 0:
+
+				raise pika.exceptions.ConnectionBlockedTimeout()
+
+			self.process_events(min(remaining,EVENTS_INTERVAL_SECONDS))
+
+
+class PublisherPool:
+	"""A thread-safe pool of long-lived channels used to publish messages.
+
+	The connections of pika are not thread-safe, so each pooled channel owns its
+	connection and it is leased to only one thread at a time. The channels are
+	opened lazily, so the pool only has as many connections as concurrent publishers.
+	"""
+
+	def __init__(self, parameters:pika.ConnectionParameters, size:int=2, flow_control:FlowControl=None, blocked_seconds:float=5):
+		"""Initialize the pool
+
+		Parameters
+		----------
+		parameters : pika.ConnectionParameters
+			The parameters to connect to the RabbitMQ.
+		size : int
+			The maximum number of channels on the pool.
+		flow_control : FlowControl
+			The state to update when the broker blocks or unblocks the connections.
+		blocked_seconds : float
+			The maximum seconds that a publication waits while the broker blocks its connection.
+		"""
+		self.parameters = parameters
+		self.size = max(1,size)
+		self.flow_control = flow_control if flow_control is not None else FlowControl()
+		self.blocked_seconds = blocked_seconds
+		self.__idle = queue.LifoQueue()
+		self.__lock = threading.Lock()
+		self.__created = 0
+		self.__closed = False
+
+	@contextmanager
+	def lease(self):
+		"""Obtain a channel of the pool to publish and return it when finished."""
+
+		channel = self.__acquire()
+		try:
+
+			yield channel
+
+		finally:
+
+			self.__release(channel)
+
+	def __acquire(self):
+		"""Obtain an idle channel or create a new one if the pool is not full."""
+
+		try:
+
+			return self.__idle.get_nowait()
+
+		except queue.Empty:
+
+			with self.__lock:
+
+				if self.__created < self.size:
+
+					self.__created += 1
+					return PublisherChannel(self.parameters,self.flow_control,self.blocked_seconds)
+
+		return self.__idle.get()
+
+	def __release(self, channel:PublisherChannel):
+		"""Return a leased channel to the pool."""
+
+		if self.__closed:
+
+			channel.close()
+
+		self.__idle.put(channel)
+
+	def publish(self, queue:str, body, properties:pika.BasicProperties):
+		"""Publish a message into a queue using a channel of the pool.
+
+		Parameters
+		----------
+		queue : str
+			The name of the queue to publish the message.
+		body: bytes
+			The encoded message to send.
+		properties: pika.BasicProperties
+			The properties of the message.
+		"""
+
+		with self.lease() as channel:
+
+			channel.basic_publish(queue,body,properties)
+
+	def process_events(self):
+		"""Process the notifications of the broker on the idle connections that it has blocked, so
+		they can be unblocked while nothing is published.
+		"""
+
+		channels = []
+		while True:
+
+			try:
+
+				channels.append(self.__idle.get_nowait())
+
+			except queue.Empty:
+
+				break
+
+		for channel in reversed(channels):
+
+			try:
+
+				if channel.is_open() and self.flow_control.is_blocked(channel.connection):
+
+					channel.process_events()
+
+			except (OSError,pika.exceptions.AMQPError):
+
+				logging.debug("Cannot process the events of the publisher connection",exc_info=True)
+				channel.close()
+
+			self.__idle.put(channel)
+
+	def close(self):
+		"""Close all the connections of the pool. The channels that are leased are closed when
+		they are returned, so any publish after closing does not keep a connection open.
+		"""
+
+		self.__closed = True
+		channels = []
+		while True:
+
+			try:
+
+				channels.append(self.__idle.get_nowait())
+
+			except queue.Empty:
+
+				break
+
+		for channel in channels:
+
+			channel.close()
+			self.__idle.put(channel)
@@ -0,0 +1,103 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import time
+
+# The header with the identifier of the trace that a message belongs to
+TRACE_ID_HEADER = 'x-trace-id'
+# The header with the microseconds since the epoch when a message has been published
+SENT_AT_HEADER = 'x-sent-at'
+
+
+def new_trace_id():
+	"""Return a random identifier for a new trace, as 32 hexadecimal characters."""
+
+	return os.urandom(16).hex()
+
+
+def trace_headers(trace_id:str=None):
+	"""Return the headers to publish a message.
+
+	Parameters
+	----------
+	trace_id : str
+		The identifier of the trace of the message, or None to start a new trace.
+
+	Returns
+	-------
+	dict
+		The headers with the identifier of the trace and the time when the message is sent. The time is
+		in microseconds as an integer, because the AMQP tables of pika cannot contain floats.
+	"""
+
+	return {
+		TRACE_ID_HEADER: trace_id if trace_id is not None else new_trace_id(),
+		SENT_AT_HEADER: time.time_ns() // 1000
+	}
+
+
+def trace_id_of(properties):
+	"""Return the identifier of the trace of a received message, or None if it has not been traced."""
+
+	headers = getattr(properties,'headers',None)
+	if not headers:
+
+		return None
+
+	trace_id = headers.get(TRACE_ID_HEADER)
+	if isinstance(trace_id,bytes):
+
+		trace_id = str(trace_id,'utf-8',errors='replace')
+
+	return trace_id
+
+
+def queue_wait_seconds(properties, received_at_us:int=None):
+	"""Return the seconds since a received message has been published.
+
+	Parameters
+	----------
+	properties : pika.BasicProperties
+		The properties of the received message.
+	received_at_us : int
+		The microseconds since the epoch when the message has been received, or None to use the current time.
+
+	Returns
+	-------
+	float
+		The seconds that the message has waited in the broker, that are never negative even if the clocks
+		of the publisher and the consumer differ, or None if the message has not been traced.
+	"""
+
+	headers = getattr(properties,'headers',None)
+	if not headers:
+
+		return None
+
+	sent_at = headers.get(SENT_AT_HEADER)
+	if not isinstance(sent_at,int) or isinstance(sent_at,bool):
+
+		return None
+
+	if received_at_us is None:
+
+		received_at_us = time.time_ns() // 1000
+
+	return max(0,received_at_us - sent_at) / 1000000
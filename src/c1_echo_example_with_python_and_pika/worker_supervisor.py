@@ -0,0 +1,121 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.	If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging
+import multiprocessing
+import os
+import time
+
+
+class WorkerSupervisor:
+	"""Run a function on several forked processes and restart them when they finish."""
+
+	def __init__(self, workers:int, target, args=(), restart_delay:float=1):
+		"""Initialize the supervisor
+
+		Parameters
+		----------
+		workers : int
+			The number of processes to run.
+		target: method
+			The function that each process runs.
+		args: tuple
+			The arguments to pass to the function.
+		restart_delay : float
+			The minimum seconds between two starts of the same worker, to not restart
+			in a loop a worker that fails when it starts.
+		"""
+		self.context = multiprocessing.get_context('fork')
+		self.target = target
+		self.args = args
+		self.restart_delay = restart_delay
+		self.processes = [None] * workers
+		self.started_at = [0.0] * workers
+
+	def __start_worker(self, index:int):
+		"""Start the process of a worker."""
+
+		process = self.context.Process(target=self.target,args=self.args,name=f"worker-{index}")
+		process.start()
+		self.processes[index] = process
+		self.started_at[index] = time.monotonic()
+		logging.info("Started the worker %s with the pid %s",index,process.pid)
+
+	def start(self):
+		"""Start all the workers."""
+
+		for index in range(len(self.processes)):
+
+			self.__start_worker(index)
+
+	def restart_dead_workers(self):
+		"""Start again the workers that have finished."""
+
+		for index,process in enumerate(self.processes):
+
+			if process is not None and not process.is_alive() and time.monotonic() - self.started_at[index] >= self.restart_delay:
+
+				logging.warning("The worker %s with the pid %s finished with the code %s, restarting...",index,process.pid,process.exitcode)
+				process.join()
+				self.__start_worker(index)
+
+	def alive_workers(self):
+		"""Return the number of workers that are running."""
+
+		return sum(1 for process in self.processes if process is not None and process.is_alive())
+
+	def signal_workers(self, signum:int):
+		"""Send a signal to the workers that are running."""
+
+		for process in self.processes:
+
+			if process is not None and process.is_alive():
+
+				os.kill(process.pid,signum)
+
+	def stop(self, timeout:float=10):
+		"""Ask the workers to finish and wait for them.
+
+		Parameters
+		----------
+		timeout : float
+			The seconds to wait for the workers before killing them.
+		"""
+
+		for process in self.processes:
+
+			if process is not None and process.is_alive():
+
+				process.terminate()
+
+		deadline = time.monotonic() + timeout
+		for index,process in enumerate(self.processes):
+
+			if process is None:
+
+				continue
+
+			process.join(max(0,deadline - time.monotonic()))
+			if process.is_alive():
+
+				logging.warning("The worker %s with the pid %s does not finish, killing...",index,process.pid)
+				process.kill()
+				process.join()
+
+			self.processes[index] = None
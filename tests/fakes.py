@@ -0,0 +1,117 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import threading
+
+from c1_echo_example_with_python_and_pika.codec import JsonCodec
+
+
+class FakeMethod:
+	"""The delivery information of a received message."""
+
+	def __init__(self, delivery_tag:int, routing_key:str='queue'):
+		self.delivery_tag = delivery_tag
+		self.routing_key = routing_key
+
+
+class FakeChannel:
+	"""A channel that records the consumers and the acknowledged and rejected messages."""
+
+	def __init__(self):
+		self.is_open = True
+		self.consumers = {}
+		self.acks = []
+		self.nacks = []
+
+	def basic_qos(self, prefetch_count:int=0):
+		pass
+
+	def queue_declare(self, queue:str, callback=None, **_arguments):
+		callback(None)
+
+	def basic_consume(self, queue:str, on_message_callback, auto_ack:bool=False):
+		self.consumers[queue] = on_message_callback
+		return queue
+
+	def basic_ack(self, delivery_tag:int=0, multiple:bool=False):
+		self.acks.append((delivery_tag,multiple))
+
+	def basic_nack(self, delivery_tag:int=0, multiple:bool=False, requeue:bool=True):
+		self.nacks.append((delivery_tag,requeue))
+
+
+class RecordingMessageService:
+	"""A message service that records the listened queues and the published messages."""
+
+	def __init__(self):
+		self.codec = JsonCodec()
+		self.condition = threading.Condition()
+		self.published = []
+		self.batches = []
+		self.trace_ids = []
+		self.listened = []
+		self.timers = []
+		self.outcomes = None
+
+	def listen_for(self, queue:str, callback, workers:int=0, prefetch:int=0, auto_ack:bool=True):
+		self.listened.append((queue,workers,prefetch,auto_ack))
+
+	def call_later(self, delay:float, callback):
+		self.timers.append((delay,callback))
+
+	def publish_to(self, queue:str, msg, trace_id:str=None):
+		self.publish_many(queue,[msg],[trace_id])
+
+	def publish_many(self, queue:str, msgs, trace_ids=None):
+		msgs = list(msgs)
+		with self.condition:
+			self.published.extend((queue,msg) for msg in msgs)
+			self.batches.append((queue,msgs))
+			self.trace_ids.extend(trace_ids if trace_ids is not None else [None] * len(msgs))
+			self.condition.notify_all()
+		return self.outcomes if self.outcomes is not None else [True] * len(msgs)
+
+	def published_msgs(self):
+		with self.condition:
+			return [msg for _queue,msg in self.published]
+
+	def run_timers(self):
+		timers = self.timers
+		self.timers = []
+		for _delay,callback in timers:
+			callback()
+
+
+class RecordingMOV:
+	"""A MOV service that records the log messages."""
+
+	def __init__(self):
+		self.logs = []
+
+	def debug(self, msg:str, payload=None):
+		self.logs.append(('DEBUG',msg,payload))
+
+	def info(self, msg:str, payload=None):
+		self.logs.append(('INFO',msg,payload))
+
+	def warn(self, msg:str, payload=None):
+		self.logs.append(('WARN',msg,payload))
+
+	def error(self, msg:str, payload=None):
+		self.logs.append(('ERROR',msg,payload))
@@ -0,0 +1,127 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import json
+import time
+import unittest
+
+from c1_echo_example_with_python_and_pika.async_message_service import AsyncMessageService
+from fakes import FakeChannel, FakeMethod
+
+
+class TestAsyncMessageService(unittest.TestCase):
+    """Class to test the service to interact with the RabbitMQ using asyncio"""
+
+    def setUp(self):
+        """Create the message service."""
+
+        self.message_service=AsyncMessageService()
+
+    def tearDown(self):
+        """Stops the message service."""
+
+        self.message_service.close()
+
+    def test_should_not_initilize_to_an_undefined_server(self):
+        """Test that can not connect to an undefined server"""
+
+        message_service=AsyncMessageService(host='undefined',max_retries=3,retry_sleep_seconds=1)
+        with self.assertRaises(ValueError):
+
+            message_service.loop.run_until_complete(message_service.connect())
+
+    def test_fail_publications_when_too_many_are_pending(self):
+        """Test that the messages are not published when too many wait for the connection to be open."""
+
+        queue="Queue_to_test_async_message_service"
+        message_service=AsyncMessageService(max_pending_publications=2)
+        for i in range(3):
+
+            message_service.publish_to(queue,{"id": i})
+
+        message_service.loop.run_until_complete(asyncio.sleep(0))
+        assert message_service.publish_many(queue,[{"id": 3}]) == [False]
+        message_service.close()
+
+    def test_reject_messages_of_failed_coroutine_callback(self):
+        """Test that the messages of a coroutine callback are acknowledged when it finishes and rejected when it fails."""
+
+        message_service=AsyncMessageService()
+        channel=FakeChannel()
+        message_service.channel=channel
+        async def callback(_ch, _method, _properties, body):
+            if body == b'{}':
+                raise ValueError("Invalid message")
+        message_service.listen_for('queue',callback)
+        message_service.loop.run_until_complete(asyncio.sleep(0))
+        channel.consumers['queue'](channel,FakeMethod(1),None,b'{"id": 1}')
+        channel.consumers['queue'](channel,FakeMethod(2),None,b'{}')
+        message_service.loop.run_until_complete(asyncio.sleep(0.1))
+        assert channel.acks == [(1,False)]
+        assert channel.nacks == [(2,False)]
+
+    def test_publish_before_connect_and_listen(self):
+        """Test that the messages published before the connection is open are sent."""
+
+        queue="Queue_to_test_async_message_service"
+        msgs=[]
+        def callback(_ch, _method, _properties, body):
+            return msgs.append(body)
+        self.message_service.listen_for(queue,callback)
+        msg={
+            "id": 1,
+            "name": "name"
+        }
+        self.message_service.publish_to(queue,msg)
+        self.message_service.start_consuming_and_forget()
+        for _i in range(10):
+
+            if len(msgs) != 0:
+                break
+
+            time.sleep(1)
+
+        assert len(msgs) == 1
+        assert msg == json.loads(msgs[0])
+
+    def test_listen_with_coroutine_callback(self):
+        """Test that many messages are processed at the same time by a coroutine callback."""
+
+        queue="Queue_to_test_async_message_service_coroutine"
+        msgs=[]
+        async def callback(_ch, _method, _properties, body):
+            await asyncio.sleep(1)
+            msgs.append(json.loads(body))
+        self.message_service.listen_for(queue,callback)
+        self.message_service.start_consuming_and_forget()
+        self.message_service.publish_many(queue,[{"id": i} for i in range(100)])
+        for _i in range(10):
+
+            if len(msgs) == 100:
+                break
+
+            time.sleep(1)
+
+        # All the messages are processed concurrently, so it must not take 100 seconds
+        assert len(msgs) == 100
+
+
+if __name__ == '__main__':
+    unittest.main()
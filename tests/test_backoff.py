@@ -0,0 +1,44 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import unittest
+
+from c1_echo_example_with_python_and_pika.backoff import backoff_delay
+
+
+class TestBackoff(unittest.TestCase):
+	"""Class to test the delays between the retries"""
+
+	def test_exponential_with_jitter(self):
+		"""Check that the delay doubles with each attempt and it is between the half and the whole of it."""
+
+		for attempt,expected in enumerate([0.1,0.2,0.4,0.8]):
+
+			delays = [backoff_delay(attempt,0.1,10) for _i in range(100)]
+			assert all(expected / 2 <= delay <= expected for delay in delays)
+			assert len(set(delays)) > 1
+
+	def test_capped(self):
+		"""Check that the delay is never greater than the maximum."""
+
+		assert all(5 <= backoff_delay(attempt,0.1,10) <= 10 for attempt in range(10,1000))
+
+
+if __name__ == '__main__':
+	unittest.main()
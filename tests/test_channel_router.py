@@ -0,0 +1,231 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import time
+import unittest
+from types import SimpleNamespace
+
+from c1_echo_example_with_python_and_pika.channel_router import ChannelRouter, component_channels, parse_channels
+from c1_echo_example_with_python_and_pika.echo_payload import EchoPayload
+from c1_echo_example_with_python_and_pika.in_memory_message_service import InMemoryBroker, InMemoryMessageService
+import pika
+from pydantic import BaseModel
+
+ASYNCAPI = """asyncapi: '2.6.0'
+info:
+  title: Test
+  description: |
+    A multiline: description.
+channels:
+  valawai/c0/test/data/input:
+    description: Receive the input. # The channel of the input
+    subscribe:
+      message:
+        $ref: '#/components/messages/input_message'
+  valawai/c0/test/data/output:
+    publish:
+      message:
+        payload:
+          $ref: '#/components/schemas/output_payload'
+components:
+  messages:
+    input_message:
+      contentType: application/json
+      payload:
+        $ref: '#/components/schemas/input_payload'
+  schemas:
+    input_payload:
+      allOf:
+        - $ref: '#/components/schemas/other'
+        - type: object
+          properties:
+            type:
+              const: 'INPUT'
+"""
+
+
+class TestChannelRouter(unittest.TestCase):
+	"""Class to test the router of the received messages to their handlers"""
+
+	def test_parse_channels(self):
+		"""Check that the channels are read with their operation and the schema of their payload."""
+
+		channels = parse_channels(ASYNCAPI)
+		assert list(channels) == ['valawai/c0/test/data/input','valawai/c0/test/data/output']
+		assert vars(channels['valawai/c0/test/data/input']) == {"name": 'valawai/c0/test/data/input',"description": "Receive the input.","operation": 'subscribe',"schema": 'input_payload',
+			"payload": {"allOf": [{"$ref": '#/components/schemas/other'},{"type": 'object',"properties": {"type": {"const": 'INPUT'}}}]}}
+		assert channels['valawai/c0/test/data/output'].operation == 'publish'
+		assert channels['valawai/c0/test/data/output'].schema == 'output_payload'
+
+	def test_parse_channels_with_flow_collections_and_anchors(self):
+		"""Check that the channels are read when the AsyncAPI uses flow collections, anchors and multiline values."""
+
+		channels = parse_channels("""asyncapi: '2.6.0'
+channels:
+  valawai/c0/test/data/input:
+    description: >-
+      Receive
+      the input.
+    subscribe:
+      message: &input_message
+        payload: {type: object, properties: {content: {type: string}}}
+  valawai/c0/test/data/copy:
+    subscribe:
+      message: *input_message
+""")
+		assert channels['valawai/c0/test/data/input'].description == 'Receive the input.'
+		assert channels['valawai/c0/test/data/input'].payload == {"type": 'object',"properties": {"content": {"type": 'string'}}}
+		assert channels['valawai/c0/test/data/copy'].payload == channels['valawai/c0/test/data/input'].payload
+		assert parse_channels('') == {}
+
+	def test_component_channels(self):
+		"""Check that all the channels of the component have the schema of their payload."""
+
+		channels = component_channels()
+		assert {name:channel.schema for name,channel in channels.items()} == {
+			'valawai/c1/echo_example_with_python_and_pika/control/registered': 'component_payload',
+			'valawai/c1/echo_example_with_python_and_pika/data/received_message': 'echo_payload',
+			'valawai/c1/echo_example_with_python_and_pika/data/publish_message': 'echo_payload'
+			}
+
+	def test_not_route_unknown_or_published_channels(self):
+		"""Check that only the channels that the component receives can be routed."""
+
+		router = ChannelRouter(parse_channels(ASYNCAPI))
+		assert router.channel('data/input') == 'valawai/c0/test/data/input'
+		with self.assertRaises(ValueError):
+
+			router.route('data/unknown')
+
+		with self.assertRaises(ValueError):
+
+			router.route('data/output')
+
+	def test_check_payload_type(self):
+		"""Check that the payload type of a route must have the properties of the schema of the channel."""
+
+		class OtherPayload(BaseModel):
+			text: str
+
+		class NumberPayload(BaseModel):
+			content: int
+
+		router = ChannelRouter()
+		assert router.payload_type('data/received_message').__name__ == 'EchoPayload'
+		assert router.validator('data/received_message') is router.validator('data/received_message')
+		assert router.payload_type('control/registered') is None
+		assert router.validator('control/registered') is None
+		router.route('data/received_message',EchoPayload)
+		with self.assertRaises(ValueError):
+
+			router.route('data/received_message',OtherPayload)
+
+		with self.assertRaises(ValueError):
+
+			router.route('data/received_message',NumberPayload)
+
+	def test_route_validated_payloads(self):
+		"""Check that the handlers receive the validated payloads and the invalid messages are rejected."""
+
+		broker = InMemoryBroker()
+		message_service = InMemoryMessageService(broker)
+		router = ChannelRouter()
+		received = []
+
+		@router.route('data/received_message',prefetch=10,auto_ack=False)
+		def handle(ch, method, _properties, payload):
+			received.append(payload)
+			ch.basic_ack(delivery_tag=method.delivery_tag)
+
+		@router.route('control/registered')
+		def registered(_ch, _method, _properties, body):
+			received.append(json.loads(body))
+
+		router.bind(message_service)
+		message_service.publish_many(router.channel('data/received_message'),[{"content": "Hello!"},{"content": ""}])
+		message_service.publish_to(router.channel('control/registered'),{"id": "1"})
+		message_service.process_events()
+		assert len(received) == 2
+		assert received[0].content == "Hello!"
+		assert received[1] == {"id": "1"}
+		assert len(message_service.listen_channel.unacked) == 0
+		assert broker.message_count(router.channel('data/received_message')) == 0
+		message_service.close()
+
+	def test_reject_once_the_invalid_messages_of_workers(self):
+		"""Check that the invalid messages processed by the workers are only rejected by the worker pool."""
+
+		broker = InMemoryBroker()
+		message_service = InMemoryMessageService(broker)
+		channel = message_service.listen_channel
+		settles = []
+		basic_ack = channel.basic_ack
+		basic_nack = channel.basic_nack
+		channel.basic_ack = lambda delivery_tag=0,multiple=False: settles.append(('ack',delivery_tag)) or basic_ack(delivery_tag,multiple)
+		channel.basic_nack = lambda delivery_tag=0,multiple=False,requeue=True: settles.append(('nack',delivery_tag)) or basic_nack(delivery_tag,multiple,requeue)
+		router = ChannelRouter()
+		received = []
+		router.route('data/received_message',workers=1,auto_ack=False)(lambda _ch,_method,_properties,payload: received.append(payload))
+		router.bind(message_service)
+		message_service.publish_to(router.channel('data/received_message'),b'{"content": ""}')
+		message_service.start_consuming_and_forget()
+		deadline = time.monotonic() + 5
+		while (not settles or len(channel.unacked) > 0) and time.monotonic() < deadline:
+
+			time.sleep(0.05)
+
+		time.sleep(0.1)
+		assert received == []
+		assert settles == [('nack',1)]
+		assert broker.message_count(router.channel('data/received_message')) == 0
+		message_service.close()
+
+	def test_bind_the_callback_of_each_route(self):
+		"""Check that each queue is listened with the callback of its route, so the routing key of the messages is not used."""
+
+		router = ChannelRouter()
+		received = []
+		router.route('data/received_message',validate=False,workers=2)(lambda _ch,_method,_properties,body: received.append(body))
+		listened = []
+		router.bind(SimpleNamespace(listen_for=lambda queue,callback,**listen_options: listened.append((queue,callback,listen_options))))
+		assert len(listened) == 1
+		queue,callback,listen_options = listened[0]
+		assert queue == router.channel('data/received_message')
+		assert listen_options == {"workers": 2}
+		callback(None,pika.spec.Basic.Deliver(delivery_tag=1,routing_key='dead_letter'),None,b'{"content": "Hello!"}')
+		assert received == [b'{"content": "Hello!"}']
+
+	def test_route_not_validated_bodies(self):
+		"""Check that the handlers of the routes that do not validate receive the bodies."""
+
+		broker = InMemoryBroker()
+		message_service = InMemoryMessageService(broker)
+		router = ChannelRouter()
+		received = []
+		router.route('data/received_message',validate=False)(lambda _ch,_method,_properties,body: received.append(body))
+		router.bind(message_service)
+		message_service.publish_many(router.channel('data/received_message'),[b'{"content": "Hello!"}',b'{"content": ""}'])
+		message_service.process_events()
+		assert received == [b'{"content": "Hello!"}',b'{"content": ""}']
+		message_service.close()
+
+
+if __name__ == '__main__':
+	unittest.main()
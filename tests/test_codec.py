@@ -0,0 +1,70 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import unittest
+
+from unittest_parametrize import ParametrizedTestCase, param, parametrize
+
+from c1_echo_example_with_python_and_pika.codec import JsonCodec, available_codecs, create_codec
+
+
+class TestCodec(ParametrizedTestCase):
+	"""Class to test the codecs of the messages"""
+
+	@parametrize(
+		"name",
+		[param(name,id=name) for name in available_codecs()]
+	)
+	def test_encode_and_decode(self,name:str):
+		"""Check that a message is the same after encoding and decoding it."""
+
+		codec = create_codec(name)
+		assert codec.name == name
+		msg = {"content": "Hello «world»!", "values": [1,2.5,True,None]}
+		body = codec.encode(msg)
+		assert isinstance(body,bytes)
+		assert codec.decode(body) == msg
+		assert JsonCodec().decode(body) == msg
+
+	@parametrize(
+		"name",
+		[param(name,id=name) for name in available_codecs()]
+	)
+	def test_decode_invalid_json(self,name:str):
+		"""Check that decoding an invalid JSON raises a ValueError."""
+
+		codec = create_codec(name)
+		with self.assertRaises(ValueError):
+
+			codec.decode(b'{"content":')
+
+	def test_auto_is_the_fastest_available(self):
+		"""Check that the auto codec is the first available codec."""
+
+		assert create_codec('auto').name == available_codecs()[0]
+		assert available_codecs()[-1] == 'json'
+
+	def test_undefined_codec_uses_json(self):
+		"""Check that a codec that is not available uses the JSON library of Python."""
+
+		assert create_codec('undefined').name == 'json'
+
+
+if __name__ == '__main__':
+	unittest.main()
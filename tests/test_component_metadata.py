@@ -0,0 +1,49 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import re
+import unittest
+
+from c1_echo_example_with_python_and_pika.component_metadata import asyncapi_yaml, component_name, project_version
+
+
+class TestComponentMetadata(unittest.TestCase):
+	"""Class to test the metadata used to register the component"""
+
+	def test_project_version(self):
+		"""Check that the version of the component is loaded."""
+
+		assert re.match(r'^\d+\.\d+\.\d+',project_version())
+
+	def test_asyncapi_and_component_name(self):
+		"""Check that the AsyncAPI is loaded once and it defines the name of the component."""
+
+		asyncapi = asyncapi_yaml()
+		assert 'valawai/c1/echo_example_with_python_and_pika/control/registered:' in asyncapi
+		assert asyncapi_yaml() is asyncapi
+		assert component_name(asyncapi) == 'c1_echo_example_with_python_and_pika'
+
+	def test_component_name_of_other_asyncapi(self):
+		"""Check the name of a component from the channel where it is notified that it has been registered."""
+
+		assert component_name("channels:\n  valawai/c2/other_component/control/registered:\n") == 'c2_other_component'
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,100 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import os
+import unittest
+import zlib
+
+import pika
+
+from c1_echo_example_with_python_and_pika.compression import PayloadCompressor, ZlibCompression, available_compressions, create_compressor, decompress, decompress_callback
+from c1_echo_example_with_python_and_pika.in_memory_message_service import InMemoryBroker, InMemoryMessageService
+from fakes import FakeChannel, FakeMethod
+
+
+class TestCompression(unittest.TestCase):
+	"""Class to test the compression of the published messages"""
+
+	def test_compress_large_bodies(self):
+		"""Check that only the bodies larger than the threshold that get smaller are compressed."""
+
+		compressor = PayloadCompressor(ZlibCompression(),100)
+		large = json.dumps({"content": "Hello! " * 100}).encode()
+		body,content_encoding = compressor.compress(large)
+		assert content_encoding == 'deflate'
+		assert len(body) < len(large)
+		assert decompress(body,content_encoding) == large
+
+		small = b'{"content":"Hello!"}'
+		assert compressor.compress(small) == (small,None)
+		random = os.urandom(200)
+		assert compressor.compress(random) == (random,None)
+
+	def test_create_compressor(self):
+		"""Check that the compression can be disabled, and that the one that is not installed is replaced by zlib."""
+
+		assert create_compressor('none').compression is None
+		assert create_compressor('auto',10).name == available_compressions()[0]
+		assert create_compressor('deflate',10).threshold == 10
+		assert create_compressor('unknown').name == 'deflate'
+
+	def test_decompress_unknown_encoding(self):
+		"""Check that a body with a content encoding that is not a compression of this module is not changed."""
+
+		assert decompress(b'{}',None) == b'{}'
+		assert decompress(b'{}','identity') == b'{}'
+		assert decompress(b'{}','UTF-8') == b'{}'
+		assert decompress(b'{}','gzip') == b'{}'
+		with self.assertRaises(ValueError):
+
+			decompress(b'{}','deflate')
+
+	def test_reject_message_that_cannot_be_decompressed(self):
+		"""Check that the callback is not called for a body that cannot be decompressed, and that it is rejected."""
+
+		bodies = []
+		callback = decompress_callback(lambda _ch,_method,_properties,body: bodies.append(body),True)
+		channel = FakeChannel()
+		callback(channel,FakeMethod(1),pika.BasicProperties(content_encoding='deflate'),zlib.compress(b'{"id": 1}'))
+		callback(channel,FakeMethod(2),pika.BasicProperties(content_encoding='deflate'),b'{"id": 2}')
+		callback(channel,FakeMethod(3),pika.BasicProperties(),b'{"id": 3}')
+		callback(channel,FakeMethod(4),pika.BasicProperties(content_encoding='UTF-8'),b'{"id": 4}')
+		assert bodies == [b'{"id": 1}',b'{"id": 3}',b'{"id": 4}']
+		assert channel.nacks == [(2,False)]
+
+	def test_publish_and_listen_compressed(self):
+		"""Check that the large messages are published compressed and received decompressed."""
+
+		broker = InMemoryBroker()
+		message_service = InMemoryMessageService(broker,compressor=create_compressor('deflate',100))
+		msgs = []
+		message_service.listen_for('queue',lambda _ch,_method,_properties,body: msgs.append(json.loads(body)))
+		large = {"content": "Hello! " * 100}
+		message_service.publish_to('queue',large)
+		message_service.publish_many('queue',[{"content": "Hello!"},json.dumps(large).encode()])
+		assert [properties.content_encoding for _body,properties,_redelivered in broker.queues['queue']] == ['deflate',None,'deflate']
+
+		message_service.process_events()
+		assert msgs == [large,{"content": "Hello!"},large]
+		message_service.close()
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,101 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import unittest
+
+import pika
+
+from c1_echo_example_with_python_and_pika.confirmed_publisher import ConfirmedPublisher
+
+
+class TestConfirmedPublisher(unittest.TestCase):
+	"""Class to test the publisher that waits for the confirmations of the RabbitMQ"""
+
+	def setUp(self):
+		"""Create the queue to publish."""
+
+		credentials = pika.PlainCredentials(username=os.getenv('RABBITMQ_USERNAME','mov'),password=os.getenv('RABBITMQ_PASSWORD','password'))
+		self.parameters = pika.ConnectionParameters(host=os.getenv('RABBITMQ_HOST','mov-mq'),port=int(os.getenv('RABBITMQ_PORT',"5672")),credentials=credentials)
+		self.queue = "Queue_to_test_confirmed_publisher"
+		self.connection = pika.BlockingConnection(self.parameters)
+		self.channel = self.connection.channel()
+		self.channel.queue_delete(queue=self.queue)
+		self.retries = []
+
+	def tearDown(self):
+		"""Remove the queue."""
+
+		self.channel.queue_delete(queue=self.queue)
+		self.connection.close()
+
+	def retry_hook(self, queue, body, properties, attempts):
+		"""Called when a message is not delivered."""
+
+		self.retries.append((queue,body,properties,attempts))
+
+	def test_confirm_published_messages(self):
+		"""Check that the published messages are confirmed."""
+
+		self.channel.queue_declare(queue=self.queue,durable=True,auto_delete=False)
+		publisher = ConfirmedPublisher(self.parameters,self.retry_hook)
+		properties = pika.BasicProperties(content_type='application/json',delivery_mode=pika.DeliveryMode.Persistent)
+		for i in range(100):
+
+			publisher.publish(self.queue,f'{{"index": {i}}}'.encode(),properties)
+
+		assert publisher.wait_for_confirms(10)
+		publisher.close()
+		assert len(self.retries) == 0
+		assert self.channel.queue_declare(queue=self.queue,passive=True).method.message_count == 100
+
+	def test_retry_rejected_messages(self):
+		"""Check that the messages that the RabbitMQ rejects are passed to the retry hook."""
+
+		self.channel.queue_declare(queue=self.queue,durable=True,auto_delete=False,arguments={'x-max-length':1,'x-overflow':'reject-publish'})
+		publisher = ConfirmedPublisher(self.parameters,self.retry_hook)
+		properties = pika.BasicProperties(content_type='application/json')
+		for i in range(3):
+
+			publisher.publish(self.queue,f'{{"index": {i}}}'.encode(),properties)
+
+		assert publisher.wait_for_confirms(10)
+		publisher.close()
+		assert len(self.retries) == 2
+		assert self.retries[0][0] == self.queue
+		assert self.retries[0][1] == b'{"index": 1}'
+
+
+
+class TestConfirmedPublisherWithoutBroker(unittest.TestCase):
+	"""Class to test the publisher that waits for the confirmations when the RabbitMQ is not available"""
+
+	def test_fail_publications_when_too_many_are_pending(self):
+		"""Check that the messages are not published when too many wait for the connection to be open."""
+
+		parameters = pika.ConnectionParameters(host='localhost',port=1,connection_attempts=1)
+		publisher = ConfirmedPublisher(parameters,max_pending=2,retry_sleep_seconds=0.1)
+		properties = pika.BasicProperties(content_type='application/json')
+		assert [publisher.publish('queue',f'{{"index": {i}}}'.encode(),properties) for i in range(3)] == [True,True,False]
+		assert publisher.outstanding() == 2
+		publisher.close(0)
+
+
+if __name__ == '__main__':
+	unittest.main()
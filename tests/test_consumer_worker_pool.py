@@ -0,0 +1,103 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import queue
+import threading
+import unittest
+from types import SimpleNamespace
+
+from c1_echo_example_with_python_and_pika.consumer_worker_pool import ConsumerWorkerPool
+
+
+class ConnectionThread:
+	"""A connection that runs the thread-safe callbacks on its own thread, as pika does."""
+
+	def __init__(self):
+		self.callbacks = queue.Queue()
+		self.thread_ids = []
+
+	def add_callback_threadsafe(self, callback):
+		self.callbacks.put(callback)
+
+	def process(self, count:int):
+		for _i in range(count):
+			self.callbacks.get(timeout=10)()
+			self.thread_ids.append(threading.get_ident())
+
+
+class Channel:
+	"""A channel that records the acknowledgements."""
+
+	def __init__(self):
+		self.is_open = True
+		self.connection = ConnectionThread()
+		self.acks = []
+		self.nacks = []
+
+	def basic_ack(self, delivery_tag):
+		self.acks.append(delivery_tag)
+
+	def basic_nack(self, delivery_tag, requeue):
+		self.nacks.append((delivery_tag,requeue))
+
+
+class TestConsumerWorkerPool(unittest.TestCase):
+	"""Class to test the pool of threads that process the consumed messages"""
+
+	def test_ack_processed_messages_on_connection_thread(self):
+		"""Check that the messages are processed on the workers and acknowledged on the connection thread."""
+
+		worker_threads = set()
+		def callback(_ch, _method, _properties, _body):
+			worker_threads.add(threading.get_ident())
+
+		pool = ConsumerWorkerPool(callback,4)
+		channel = Channel()
+		for tag in range(1,11):
+
+			pool.on_message(channel,SimpleNamespace(delivery_tag=tag,routing_key='queue'),None,b'{}')
+
+		channel.connection.process(10)
+		pool.shutdown()
+		assert sorted(channel.acks) == list(range(1,11))
+		assert channel.nacks == []
+		assert threading.get_ident() not in worker_threads
+		assert set(channel.connection.thread_ids) == {threading.get_ident()}
+
+	def test_reject_failed_messages(self):
+		"""Check that a message is rejected when the callback fails."""
+
+		def callback(_ch, method, _properties, _body):
+			if method.delivery_tag == 2:
+				raise ValueError("Cannot process")
+
+		pool = ConsumerWorkerPool(callback,2)
+		channel = Channel()
+		for tag in range(1,4):
+
+			pool.on_message(channel,SimpleNamespace(delivery_tag=tag,routing_key='queue'),None,b'{}')
+
+		channel.connection.process(3)
+		pool.shutdown()
+		assert sorted(channel.acks) == [1,3]
+		assert channel.nacks == [(2,False)]
+
+
+if __name__ == '__main__':
+	unittest.main()
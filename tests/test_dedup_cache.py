@@ -0,0 +1,81 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import time
+import unittest
+
+import pika
+
+from c1_echo_example_with_python_and_pika.dedup_cache import DedupCache, message_key
+
+
+class TestDedupCache(unittest.TestCase):
+	"""Class to test the cache to detect the duplicated messages"""
+
+	def test_detect_duplicates(self):
+		"""Check that only the added keys are seen and that the statistics count the lookups."""
+
+		cache = DedupCache(10,60)
+		assert not cache.seen('a')
+		cache.add('a')
+		assert cache.seen('a')
+		assert not cache.seen('b')
+		assert cache.stats() == {"entries": 1,"max_entries": 10,"hits": 1,"misses": 2,"evictions": 0,"expirations": 0}
+
+	def test_evict_least_recently_seen(self):
+		"""Check that the least recently seen key is removed when the cache is full."""
+
+		cache = DedupCache(3,60)
+		for key in ('a','b','c'):
+
+			cache.add(key)
+
+		assert cache.seen('a')
+		cache.add('d')
+		assert len(cache) == 3
+		assert cache.seen('a')
+		assert not cache.seen('b')
+		assert cache.seen('c')
+		assert cache.seen('d')
+		assert cache.stats()['evictions'] == 1
+
+	def test_expire_keys(self):
+		"""Check that the keys are forgotten when their TTL has passed since they were last seen."""
+
+		cache = DedupCache(10,0.2)
+		cache.add('a')
+		cache.add('b')
+		time.sleep(0.15)
+		assert cache.seen('a')
+		time.sleep(0.1)
+		assert not cache.seen('b')
+		assert cache.seen('a')
+		assert len(cache) == 1
+		assert cache.stats()['expirations'] == 1
+
+	def test_message_key(self):
+		"""Check that the messages are identified by their id, or by their body if they do not have one."""
+
+		assert message_key(pika.BasicProperties(message_id='id-1'),b'{}') == 'id-1'
+		assert message_key(pika.BasicProperties(),b'{"content":"Hello!"}') == message_key(None,b'{"content":"Hello!"}')
+		assert message_key(None,b'{"content":"Hello!"}') != message_key(None,b'{"content":"Bye!"}')
+
+
+if __name__ == '__main__':
+	unittest.main()
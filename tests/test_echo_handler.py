@@ -22,10 +22,14 @@ import uuid
 import time
 import logging
 import json
+import pika
+from unittest_parametrize import ParametrizedTestCase, param, parametrize
+from c1_echo_example_with_python_and_pika.in_memory_message_service import InMemoryBroker, InMemoryMessageService
 from c1_echo_example_with_python_and_pika.message_service import MessageService
 from c1_echo_example_with_python_and_pika.mov_service import MOVService
-from c1_echo_example_with_python_and_pika.echo_handler import EchoHandler
+from c1_echo_example_with_python_and_pika.echo_handler import EchoHandler, is_canonical_echo
 from c1_echo_example_with_python_and_pika.echo_payload import EchoPayload
+from fakes import FakeChannel, FakeMethod, RecordingMessageService, RecordingMOV
 
 class TestEchoHandler(unittest.TestCase):
 	"""Class to test the manage of tehreceived messages to echoed."""
@@ -45,6 +49,7 @@ class TestEchoHandler(unittest.TestCase):
 	def tearDownClass(cls):
 		"""Stops the message service."""
 
+		cls.mov.stop()
 		cls.mov.unregister_component()
 		cls.message_service.close()
 
@@ -82,3 +87,266 @@ class TestEchoHandler(unittest.TestCase):
 			time.sleep(3)
 
 		self.fail("Not echoed message")
+
+
+class TestEchoFastPath(ParametrizedTestCase):
+	"""Class to test the echo of the received bodies without decoding them."""
+
+	@parametrize(
+		"body,expected",
+		[
+			param(b'{"content":"Hello!"}',True,id="compact"),
+			param(b' {\n\t"content" : "Hello!" }\r\n',True,id="whitespaces"),
+			param(b'{"content":"\\"Hello\\"\\n\\u00e9\\/"}',True,id="escapes"),
+			param('{"content":"Hello «world» 🌍"}'.encode('utf-8'),True,id="utf8"),
+			param(b'{"content":""}',False,id="empty_content"),
+			param(b'{"content":"Hello!","other":1}',False,id="extra_field"),
+			param(b'{"other":1,"content":"Hello!"}',False,id="extra_field_before"),
+			param(b'{"content":1}',False,id="not_string"),
+			param(b'{"content":"Hello\\x"}',False,id="invalid_escape"),
+			param(b'{"content":"\\ud800"}',False,id="lone_surrogate"),
+			param(b'{"content":"\\ud83c\\udf0d"}',False,id="surrogate_pair"),
+			param(b'{"content":"' + b'Hello! ' * 1000 + b'\\uDC00"}',False,id="long_lone_surrogate"),
+			param(b'{"content":"Hello\nworld"}',False,id="control_character"),
+			param(b'{"content":"\xff\xfe"}',False,id="invalid_utf8"),
+			param(b'{"content":"Hello!"',False,id="not_closed"),
+			param(b'[{"content":"Hello!"}]',False,id="array"),
+			param(b'{"content":"' + b'Hello! ' * 1000 + b'"}',True,id="long"),
+			param(b'{"content":"' + b'Hello!\\n' * 1000 + b'"}',True,id="long_escapes"),
+			param(b'{"content":"' + b'Hello! ' * 1000 + b'","other":"a"}',False,id="long_extra_field"),
+			param(b'{"content":"' + b'Hello!\n' * 1000 + b'"}',False,id="long_control_character"),
+		]
+	)
+	def test_is_canonical_echo(self,body:bytes,expected:bool):
+		"""Check which bodies can be echoed as they are received."""
+
+		assert is_canonical_echo(body) == expected
+		if expected:
+
+			assert EchoPayload.model_validate_json(body).content == json.loads(body)['content']
+
+	def test_echo_same_body(self):
+		"""Check that a canonical body is published without encoding it again."""
+
+		message_service = RecordingMessageService()
+		mov = RecordingMOV()
+		handler = EchoHandler(message_service,mov)
+		body = b'{"content":"Hello!"}'
+		handler.handle_message(None,None,None,body)
+		assert len(message_service.published) == 1
+		assert message_service.published[0][1] is body
+		assert len(message_service.trace_ids[0]) == 32
+		assert [log[0] for log in mov.logs] == ['INFO','INFO']
+
+	def test_echo_body_with_extra_fields(self):
+		"""Check that a body with other fields is echoed only with the content."""
+
+		message_service = RecordingMessageService()
+		mov = RecordingMOV()
+		handler = EchoHandler(message_service,mov)
+		handler.handle_message(None,None,None,b'{"content":"Hello!","other":1}')
+		assert len(message_service.published) == 1
+		assert json.loads(message_service.published[0][1]) == {"content":"Hello!"}
+
+	def test_not_echo_invalid_body(self):
+		"""Check that an invalid body is reported to the MOV and not echoed."""
+
+		message_service = RecordingMessageService()
+		mov = RecordingMOV()
+		handler = EchoHandler(message_service,mov)
+		handler.handle_message(None,None,None,b'{"content":""}')
+		handler.handle_message(None,None,None,b'{"content":')
+		handler.handle_message(None,None,None,b'{"content":"\\ud800"}')
+		assert len(message_service.published) == 0
+		assert [log[0] for log in mov.logs] == ['ERROR']
+
+	def test_ignore_duplicated_messages(self):
+		"""Check that the messages with the same id, or the same body if they do not have one, are echoed only once."""
+
+		message_service = RecordingMessageService()
+		mov = RecordingMOV()
+		handler = EchoHandler(message_service,mov,dedup_max_entries=10)
+		handler.handle_message(None,None,pika.BasicProperties(message_id='id-1'),b'{"content":"Hello 1!"}')
+		handler.handle_message(None,None,pika.BasicProperties(message_id='id-1'),b'{"content":"Hello 2!"}')
+		handler.handle_message(None,None,pika.BasicProperties(message_id='id-2'),b'{"content":"Hello 1!"}')
+		handler.handle_message(None,None,None,b'{"content":"Hello 3!"}')
+		handler.handle_message(None,None,None,b'{"content":"Hello 3!"}')
+		handler.handle_message(None,None,None,b'{"content":""}')
+		handler.handle_message(None,None,None,b'{"content":""}')
+		assert [json.loads(msg)['content'] for _queue,msg in message_service.published] == ["Hello 1!","Hello 1!","Hello 3!"]
+		assert [log[0] for log in mov.logs].count('ERROR') == 1
+		assert handler.dedup_cache.stats()['hits'] == 3
+
+
+class TestEchoBatch(unittest.TestCase):
+	"""Class to test the echo of the received messages in batches."""
+
+	def test_listen_without_auto_ack(self):
+		"""Check that the batched messages are not acknowledged automatically."""
+
+		message_service = RecordingMessageService()
+		EchoHandler(message_service,RecordingMOV(),workers=4,prefetch=0,batch_size=3)
+		assert message_service.listened == [('valawai/c1/echo_example_with_python_and_pika/data/received_message',0,6,False)]
+
+	def test_echo_full_batch(self):
+		"""Check that a full batch is published and acknowledged together."""
+
+		message_service = RecordingMessageService()
+		mov = RecordingMOV()
+		handler = EchoHandler(message_service,mov,batch_size=3,batch_wait_ms=10)
+		channel = FakeChannel()
+		bodies = [b'{"content":"Hello 1!"}',b'{"content":"Hello 2!","other":1}',b'{"content":"Hello 3!"}']
+		for tag,body in enumerate(bodies,1):
+
+			handler.handle_message_in_batch(channel,FakeMethod(tag),None,body)
+
+		assert [json.loads(msg)['content'] for _queue,msg in message_service.published] == ["Hello 1!","Hello 2!","Hello 3!"]
+		assert message_service.published[0][1] is bodies[0]
+		assert channel.acks == [(3,True)]
+		assert len(message_service.timers) == 1
+		assert message_service.timers[0][0] == 0.01
+
+		# The timer of the echoed batch does nothing
+		message_service.run_timers()
+		assert len(message_service.published) == 3
+		assert channel.acks == [(3,True)]
+
+	def test_echo_batch_after_wait(self):
+		"""Check that a batch that is not full is echoed when the first message has waited."""
+
+		message_service = RecordingMessageService()
+		handler = EchoHandler(message_service,RecordingMOV(),batch_size=10)
+		channel = FakeChannel()
+		handler.handle_message_in_batch(channel,FakeMethod(1),None,b'{"content":"Hello 1!"}')
+		handler.handle_message_in_batch(channel,FakeMethod(2),None,b'{"content":"Hello 2!"}')
+		assert len(message_service.published) == 0
+		assert channel.acks == []
+
+		message_service.run_timers()
+		assert len(message_service.published) == 2
+		assert channel.acks == [(2,True)]
+
+	def test_discard_batch_of_lost_channel(self):
+		"""Check that the batched messages of a channel that has been replaced are not echoed, because they are delivered again."""
+
+		message_service = RecordingMessageService()
+		handler = EchoHandler(message_service,RecordingMOV(),batch_size=10)
+		lost_channel = FakeChannel()
+		handler.handle_message_in_batch(lost_channel,FakeMethod(1),None,b'{"content":"Hello 1!"}')
+		lost_channel.is_open = False
+		channel = FakeChannel()
+		handler.handle_message_in_batch(channel,FakeMethod(1),None,b'{"content":"Hello 1!"}')
+		assert len(message_service.timers) == 2
+
+		message_service.run_timers()
+		assert [json.loads(msg)['content'] for _queue,msg in message_service.published] == ["Hello 1!"]
+		assert lost_channel.acks == []
+		assert channel.acks == [(1,True)]
+
+	def test_ignore_duplicated_messages_in_batch(self):
+		"""Check that the duplicated messages of a batch, or of an echoed batch, are acknowledged but not echoed."""
+
+		message_service = RecordingMessageService()
+		handler = EchoHandler(message_service,RecordingMOV(),batch_size=3,dedup_max_entries=10)
+		channel = FakeChannel()
+		bodies = [b'{"content":"Hello 1!"}',b'{"content":"Hello 1!"}',b'{"content":"Hello 2!"}',b'{"content":"Hello 3!"}']
+		for tag,body in enumerate(bodies,1):
+
+			handler.handle_message_in_batch(channel,FakeMethod(tag),None,body)
+
+		handler.handle_message_in_batch(channel,FakeMethod(5),None,b'{"content":"Hello 2!"}')
+		assert len(message_service.published) == 3
+		assert channel.acks == [(4,True),(5,False)]
+
+	def test_deliver_again_not_published_echoes(self):
+		"""Check that the messages of a batch are acknowledged until the first echo that is not published, and the ones whose echo is not published are rejected to be delivered again."""
+
+		message_service = RecordingMessageService()
+		message_service.outcomes = [True,False,True,False]
+		mov = RecordingMOV()
+		handler = EchoHandler(message_service,mov,batch_size=5,dedup_max_entries=10)
+		channel = FakeChannel()
+		bodies = [b'{"content":"Hello 1!"}',b'{"content":"Hello 2!"}',b'{"content":"Hello 1!"}',b'{"content":"Hello 3!"}',b'{"content":"Hello 4!"}',b'{"content":""}']
+		for tag,body in enumerate(bodies,1):
+
+			handler.handle_message_in_batch(channel,FakeMethod(tag),None,body)
+
+		assert channel.acks == [(1,True),(3,False),(4,False),(6,False)]
+		assert channel.nacks == [(2,True),(5,True)]
+		assert [log[2] for log in mov.logs if log[1] == "Sent Echoed message"] == [bodies[0],bodies[3]]
+
+		# The messages whose echo is not published are not ignored when they are delivered again
+		message_service.outcomes = None
+		handler.handle_message_in_batch(channel,FakeMethod(7),None,bodies[1])
+		handler.handle_message_in_batch(channel,FakeMethod(8),None,bodies[3])
+		handler.flush_batch()
+		assert [json.loads(msg)['content'] for _queue,msg in message_service.published[4:]] == ["Hello 2!"]
+		assert channel.acks[-1] == (8,True)
+
+	def test_echo_batch_with_invalid_messages(self):
+		"""Check that the invalid messages of a batch are reported and acknowledged but not echoed."""
+
+		message_service = RecordingMessageService()
+		mov = RecordingMOV()
+		handler = EchoHandler(message_service,mov,batch_size=4)
+		channel = FakeChannel()
+		bodies = [b'{"content":"Hello 1!","other":1}',b'{"content":""}',b'{"content":',b'{"content":"Hello 4!"}']
+		for tag,body in enumerate(bodies,1):
+
+			handler.handle_message_in_batch(channel,FakeMethod(tag),None,body)
+
+		assert [json.loads(msg)['content'] for _queue,msg in message_service.published] == ["Hello 1!","Hello 4!"]
+		assert [log[0] for log in mov.logs].count('ERROR') == 1
+		assert channel.acks == [(4,True)]
+
+
+class TestEchoHandlerInMemory(ParametrizedTestCase):
+	"""Class to test the echo of the messages sent through an in memory broker."""
+
+	@parametrize(
+		"batch_size",
+		[param(1,id="unbatched"),param(4,id="batched")]
+	)
+	def test_echo_messages(self,batch_size:int):
+		"""Check that the received messages are echoed and acknowledged."""
+
+		broker = InMemoryBroker()
+		message_service = InMemoryMessageService(broker)
+		mov = MOVService(message_service,log_buffer_size=0)
+		EchoHandler(message_service,mov,batch_size=batch_size,batch_wait_ms=1)
+		client = InMemoryMessageService(broker)
+		msgs = []
+		client.listen_for('valawai/c1/echo_example_with_python_and_pika/data/publish_message',lambda _ch,_method,_properties,body: msgs.append(json.loads(body)))
+		client.publish_many('valawai/c1/echo_example_with_python_and_pika/data/received_message',[{"content": f"Hello {i}!"} for i in range(10)] + [{"content": ""}])
+		message_service.process_events(0.1)
+		client.process_events()
+		assert msgs == [{"content": f"Hello {i}!"} for i in range(10)]
+		assert len(message_service.listen_channel.unacked) == 0
+		assert broker.message_count('valawai/c1/echo_example_with_python_and_pika/data/received_message') == 0
+		levels = [json.loads(body)['level'] for body,_properties,_redelivered in broker.queues['valawai/log/add']]
+		assert levels.count('INFO') == 20
+		assert levels.count('ERROR') == 1
+		message_service.close()
+		client.close()
+
+	@parametrize(
+		"batch_size",
+		[param(1,id="unbatched"),param(4,id="batched")]
+	)
+	def test_echo_continues_trace(self,batch_size:int):
+		"""Check that the echoed messages have the trace of the received messages and a new send time."""
+
+		broker = InMemoryBroker()
+		message_service = InMemoryMessageService(broker)
+		EchoHandler(message_service,MOVService(message_service,log_buffer_size=0),batch_size=batch_size,batch_wait_ms=1)
+		client = InMemoryMessageService(broker)
+		received = []
+		client.listen_for('valawai/c1/echo_example_with_python_and_pika/data/publish_message',lambda _ch,_method,properties,_body: received.append(properties.headers))
+		client.publish_many('valawai/c1/echo_example_with_python_and_pika/data/received_message',[{"content": "Hello 1!"},{"content": "Hello 2!"}],['trace-1','trace-2'])
+		sent = [properties.headers for _body,properties,_redelivered in broker.queues['valawai/c1/echo_example_with_python_and_pika/data/received_message']]
+		message_service.process_events(0.1)
+		client.process_events()
+		assert [headers['x-trace-id'] for headers in received] == ['trace-1','trace-2']
+		assert all(echoed['x-sent-at'] >= headers['x-sent-at'] for echoed,headers in zip(received,sent))
+		message_service.close()
+		client.close()
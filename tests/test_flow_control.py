@@ -0,0 +1,145 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import time
+import unittest
+
+import pika
+
+from c1_echo_example_with_python_and_pika.flow_control import FlowControl
+from c1_echo_example_with_python_and_pika.publisher_pool import PublisherChannel
+
+
+class FakeConnection:
+	"""A connection that notifies when it is blocked and unblocked by calling its callbacks."""
+
+	def __init__(self):
+		self.is_open = True
+		self.blocked_callbacks = []
+		self.unblocked_callbacks = []
+		self.on_events = None
+
+	def add_on_connection_blocked_callback(self, callback):
+		self.blocked_callbacks.append(callback)
+
+	def add_on_connection_unblocked_callback(self, callback):
+		self.unblocked_callbacks.append(callback)
+
+	def block(self, reason:str):
+		for callback in self.blocked_callbacks:
+			callback(self,pika.frame.Method(0,pika.spec.Connection.Blocked(reason)))
+
+	def unblock(self):
+		for callback in self.unblocked_callbacks:
+			callback(self,pika.frame.Method(0,pika.spec.Connection.Unblocked()))
+
+	def process_data_events(self, time_limit=0):
+		time.sleep(time_limit)
+		if self.on_events is not None:
+			self.on_events()
+
+
+class FakeChannel:
+	"""A channel that records the published messages."""
+
+	def __init__(self):
+		self.is_open = True
+		self.published = []
+
+	def basic_publish(self, exchange, routing_key, body, properties):
+		self.published.append((routing_key,body))
+
+
+class TestFlowControl(unittest.TestCase):
+	"""Class to test the state of the alarms of the broker"""
+
+	def test_blocked_while_any_connection_is_blocked(self):
+		"""Check that the listeners are notified when the first connection is blocked and the last one is unblocked."""
+
+		flow_control = FlowControl()
+		changes = []
+		flow_control.add_listener(changes.append)
+		first = FakeConnection()
+		second = FakeConnection()
+		flow_control.watch(first)
+		flow_control.watch(second)
+		first.block('low on memory')
+		second.block('low on memory')
+		assert flow_control.is_blocked()
+		assert flow_control.is_blocked(first)
+		assert changes == [True]
+
+		first.unblock()
+		assert flow_control.is_blocked()
+		assert not flow_control.is_blocked(first)
+		assert changes == [True]
+
+		second.unblock()
+		assert not flow_control.is_blocked()
+		assert changes == [True,False]
+
+	def test_unblock_closed_connection(self):
+		"""Check that a closed connection does not keep the component blocked, and that unblocking twice is ignored."""
+
+		flow_control = FlowControl()
+		changes = []
+		flow_control.add_listener(changes.append)
+		connection = FakeConnection()
+		flow_control.block(connection,'low on disk')
+		flow_control.unblock(connection)
+		flow_control.unblock(connection)
+		assert changes == [True,False]
+		assert flow_control.wait_unblocked(0)
+
+
+class TestPublisherChannelFlowControl(unittest.TestCase):
+	"""Class to test how a publisher channel waits while the broker blocks its connection"""
+
+	def setUp(self):
+		"""Create a channel with a connection that is blocked."""
+
+		self.flow_control = FlowControl()
+		self.publisher = PublisherChannel(None,self.flow_control,0.3)
+		self.publisher.connection = FakeConnection()
+		self.publisher.channel = FakeChannel()
+		self.flow_control.watch(self.publisher.connection)
+		self.publisher.connection.block('low on memory')
+
+	def test_fail_when_blocked_too_long(self):
+		"""Check that a publication fails when the connection is still blocked after the maximum seconds to wait."""
+
+		start = time.monotonic()
+		with self.assertRaises(pika.exceptions.ConnectionBlockedTimeout):
+
+			self.publisher.basic_publish('queue',b'{}',None)
+
+		assert 0.3 <= time.monotonic() - start < 1
+		assert self.publisher.channel.published == []
+
+	def test_publish_when_unblocked(self):
+		"""Check that a publication is sent when the broker unblocks the connection while waiting."""
+
+		self.publisher.connection.on_events = self.publisher.connection.unblock
+		self.publisher.basic_publish('queue',b'{}',None)
+		assert self.publisher.channel.published == [('queue',b'{}')]
+		assert not self.flow_control.is_blocked()
+
+
+if __name__ == '__main__':
+	unittest.main()
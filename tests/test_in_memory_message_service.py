@@ -0,0 +1,167 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import threading
+import time
+import unittest
+
+from c1_echo_example_with_python_and_pika.in_memory_message_service import InMemoryBroker, InMemoryMessageService
+
+
+class TestInMemoryMessageService(unittest.TestCase):
+	"""Class to test the service to send and receive messages without a RabbitMQ"""
+
+	def setUp(self):
+		"""Create the service."""
+
+		self.broker = InMemoryBroker()
+		self.message_service = InMemoryMessageService(self.broker)
+
+	def tearDown(self):
+		"""Close the service."""
+
+		self.message_service.close()
+
+	def test_publish_and_listen(self):
+		"""Check that the published messages are received in order."""
+
+		msgs = []
+		self.message_service.listen_for('queue',lambda _ch,_method,_properties,body: msgs.append(json.loads(body)))
+		self.message_service.publish_to('queue',{"id": 1})
+		self.message_service.publish_many('queue',[{"id": 2},b'{"id": 3}'])
+		self.message_service.process_events()
+		assert msgs == [{"id": 1},{"id": 2},{"id": 3}]
+		assert self.broker.message_count('queue') == 0
+
+	def test_not_publish_message_that_can_not_be_encoded(self):
+		"""Check that a message that cannot be encoded is not published."""
+
+		assert self.message_service.publish_many('queue',[{"id": 1},{"id": {1,2}}]) == [True,False]
+		assert self.broker.message_count('queue') == 1
+
+	def test_prefetch_limits_messages_not_acknowledged(self):
+		"""Check that the messages are not delivered when the prefetch is reached until they are acknowledged."""
+
+		deliveries = []
+		self.message_service.listen_for('queue',lambda ch,method,_properties,_body: deliveries.append((ch,method)),prefetch=2,auto_ack=False)
+		self.message_service.publish_many('queue',[{"id": i} for i in range(5)])
+		self.message_service.process_events()
+		assert len(deliveries) == 2
+		assert self.broker.message_count('queue') == 3
+
+		ch,method = deliveries[-1]
+		ch.basic_ack(delivery_tag=method.delivery_tag,multiple=True)
+		self.message_service.process_events()
+		assert len(deliveries) == 4
+		assert self.broker.message_count('queue') == 1
+
+	def test_prefetch_of_each_listener(self):
+		"""Check that the prefetch of a listener does not limit the listeners registered after it."""
+
+		limited = []
+		unlimited = []
+		self.message_service.listen_for('limited',lambda _ch,_method,_properties,body: limited.append(body),prefetch=1,auto_ack=False)
+		self.message_service.listen_for('unlimited',lambda _ch,_method,_properties,body: unlimited.append(body),prefetch=0,auto_ack=False)
+		self.message_service.publish_many('limited',[{"id": i} for i in range(3)])
+		self.message_service.publish_many('unlimited',[{"id": i} for i in range(3)])
+		self.message_service.process_events()
+		assert len(limited) == 1
+		assert len(unlimited) == 3
+
+	def test_nack_delivers_again(self):
+		"""Check that a rejected message is delivered again only if it is requeued."""
+
+		deliveries = []
+		def callback(ch, method, _properties, body):
+			deliveries.append((json.loads(body)["id"],method.redelivered))
+			ch.basic_nack(delivery_tag=method.delivery_tag,requeue=not method.redelivered)
+
+		self.message_service.listen_for('queue',callback,prefetch=1,auto_ack=False)
+		self.message_service.publish_to('queue',{"id": 1})
+		self.message_service.process_events()
+		assert deliveries == [(1,False)]
+		self.message_service.process_events()
+		assert deliveries == [(1,False),(1,True)]
+		assert self.broker.message_count('queue') == 0
+
+	def test_close_delivers_again_messages_not_acknowledged(self):
+		"""Check that the messages that are not acknowledged when the service is closed go to another consumer."""
+
+		self.message_service.listen_for('queue',lambda _ch,_method,_properties,_body: None,auto_ack=False)
+		self.message_service.publish_many('queue',[{"id": 1},{"id": 2}])
+		self.message_service.process_events()
+		assert self.broker.message_count('queue') == 0
+		self.message_service.close()
+		assert self.broker.message_count('queue') == 2
+
+		other_service = InMemoryMessageService(self.broker)
+		msgs = []
+		other_service.listen_for('queue',lambda _ch,method,_properties,body: msgs.append((json.loads(body)["id"],method.redelivered)))
+		other_service.process_events()
+		other_service.close()
+		assert msgs == [(1,True),(2,True)]
+
+	def test_listen_with_workers(self):
+		"""Check that the messages processed by the workers are acknowledged on the consuming thread."""
+
+		msgs = []
+		threads = set()
+		lock = threading.Lock()
+		def callback(_ch, _method, _properties, body):
+			time.sleep(0.1)
+			with lock:
+				msgs.append(json.loads(body)["id"])
+				threads.add(threading.current_thread().name)
+
+		self.message_service.listen_for('queue',callback,workers=4)
+		self.message_service.publish_many('queue',[{"id": i} for i in range(8)])
+		self.message_service.start_consuming_and_forget()
+		deadline = time.monotonic() + 5
+		while (len(msgs) < 8 or len(self.message_service.listen_channel.unacked) > 0) and time.monotonic() < deadline:
+
+			time.sleep(0.05)
+
+		assert sorted(msgs) == list(range(8))
+		assert len(threads) > 1
+		assert len(self.message_service.listen_channel.unacked) == 0
+
+	def test_call_later(self):
+		"""Check that the functions are called on the consuming thread after their delay."""
+
+		calls = []
+		self.message_service.call_later(0.2,lambda: calls.append(2))
+		self.message_service.call_later(0.1,lambda: calls.append(1))
+		self.message_service.process_events(0.05)
+		assert calls == []
+		self.message_service.process_events(0.5)
+		assert calls == [1,2]
+
+	def test_start_consuming_until_closed(self):
+		"""Check that the consuming thread finishes when the service is closed."""
+
+		consuming = threading.Thread(target=self.message_service.start_consuming)
+		consuming.start()
+		self.message_service.close()
+		consuming.join(5)
+		assert not consuming.is_alive()
+
+
+if __name__ == '__main__':
+	unittest.main()
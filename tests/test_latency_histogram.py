@@ -0,0 +1,100 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import random
+import unittest
+
+from c1_echo_example_with_python_and_pika.latency_histogram import LatencyHistogram
+
+
+class TestLatencyHistogram(unittest.TestCase):
+	"""Class to test the histogram of the latencies"""
+
+	def test_empty(self):
+		"""Check the values of a histogram without values."""
+
+		histogram = LatencyHistogram()
+		assert histogram.total_count == 0
+		assert histogram.value_at_percentile(99) == 0
+		assert histogram.mean() == 0
+		assert histogram.percentile_distribution() == []
+
+	def test_exact_low_values(self):
+		"""Check that the values lower than the sub buckets are counted exactly."""
+
+		histogram = LatencyHistogram(sub_bucket_bits=8)
+		for value in range(1,101):
+
+			histogram.record(value)
+
+		assert histogram.value_at_percentile(50) == 50
+		assert histogram.value_at_percentile(99) == 99
+		assert histogram.value_at_percentile(100) == 100
+		assert histogram.min == 1
+		assert histogram.max == 100
+		assert histogram.mean() == 50.5
+
+	def test_relative_error(self):
+		"""Check that the percentiles of high values have a bounded relative error."""
+
+		rng = random.Random(0)
+		values = sorted(int(rng.expovariate(1 / 5000)) for _i in range(10000))
+		histogram = LatencyHistogram(sub_bucket_bits=8)
+		for value in values:
+
+			histogram.record(value)
+
+		for percentile in (50,90,99,99.9):
+
+			expected = values[int(percentile / 100 * len(values)) - 1]
+			assert abs(histogram.value_at_percentile(percentile) - expected) <= expected * 2 / 256 + 1
+
+	def test_merge(self):
+		"""Check that merging two histograms counts the values of both."""
+
+		histogram = LatencyHistogram()
+		other = LatencyHistogram()
+		histogram.record(10,3)
+		other.record(100000)
+		histogram.merge(other)
+		assert histogram.total_count == 4
+		assert histogram.max == 100000
+		assert histogram.value_at_percentile(75) == 10
+		with self.assertRaises(ValueError):
+
+			histogram.merge(LatencyHistogram(sub_bucket_bits=4))
+
+	def test_percentile_distribution(self):
+		"""Check that the distribution ends with the maximum and all the values."""
+
+		histogram = LatencyHistogram()
+		for value in range(1000):
+
+			histogram.record(value * 10)
+
+		distribution = histogram.percentile_distribution()
+		assert distribution[0][1] == 0
+		assert distribution[-1][0] == histogram.max
+		assert distribution[-1][2] == 1000
+		assert [value for value,_percentile,_count,_inverse in distribution] == sorted(value for value,_percentile,_count,_inverse in distribution)
+		assert "Total count =         1000" in histogram.format_distribution()
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,78 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import unittest
+
+from c1_echo_example_with_python_and_pika.echo_handler import EchoHandler
+from c1_echo_example_with_python_and_pika.in_memory_message_service import InMemoryBroker, InMemoryMessageService
+from c1_echo_example_with_python_and_pika.load_generator import LoadGenerator
+from c1_echo_example_with_python_and_pika.mov_service import MOVService
+
+
+class TestLoadGenerator(unittest.TestCase):
+	"""Class to test the generator of messages to echo"""
+
+	def test_measure_echoed_messages(self):
+		"""Check that the latency of the echoed messages is measured."""
+
+		broker = InMemoryBroker()
+		component_service = InMemoryMessageService(broker)
+		mov = MOVService(component_service,log_buffer_size=0)
+		EchoHandler(component_service,mov)
+		generator_service = InMemoryMessageService(broker)
+		generator = LoadGenerator(generator_service,200,sizes=[64,1024])
+		component_service.start_consuming_and_forget()
+		generator_service.start_consuming_and_forget()
+		try:
+
+			histogram = generator.run(0.5,5)
+
+		finally:
+
+			generator_service.close()
+			component_service.close()
+
+		assert generator.sent == 100
+		assert generator.received == 100
+		assert generator.lost() == 0
+		assert histogram.total_count == 100
+		assert histogram.min >= 0
+		assert "Total count =          100" in generator.report()
+
+	def test_count_lost_messages(self):
+		"""Check that the messages that are not echoed are lost."""
+
+		generator_service = InMemoryMessageService()
+		generator = LoadGenerator(generator_service,100)
+		generator_service.start_consuming_and_forget()
+		try:
+
+			histogram = generator.run(0.1,0.1)
+
+		finally:
+
+			generator_service.close()
+
+		assert generator.sent == 10
+		assert generator.lost() == 10
+		assert histogram.total_count == 0
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,81 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import time
+import unittest
+
+from c1_echo_example_with_python_and_pika.log_filter import MOVLogFilter, parse_level_values
+
+
+class TestMOVLogFilter(unittest.TestCase):
+	"""Class to test the filter of the log messages sent to the MOV"""
+
+	def test_parse_level_values(self):
+		"""Check that the values by level are parsed."""
+
+		assert parse_level_values("debug=0.1, INFO=2") == {'DEBUG':0.1,'INFO':2.0}
+		assert parse_level_values("") == {}
+
+	def test_disabled_by_default(self):
+		"""Check that without configuration all the messages are accepted."""
+
+		log_filter = MOVLogFilter()
+		assert not log_filter.is_enabled()
+		assert all(log_filter.accept('INFO',"Message") for _i in range(100))
+
+	def test_rate_limit(self):
+		"""Check that the messages of a level are limited by rate."""
+
+		log_filter = MOVLogFilter(rate_limits={'INFO':10})
+		accepted = sum(1 for _i in range(100) if log_filter.accept('INFO',"Message"))
+		assert accepted == 10
+		assert log_filter.dropped['INFO'] == 90
+		assert all(log_filter.accept('WARN',"Message") for _i in range(100))
+
+	def test_sample_only_info_and_debug(self):
+		"""Check that only the INFO and DEBUG messages are sampled."""
+
+		log_filter = MOVLogFilter(sample_rates={'INFO':0,'DEBUG':1,'WARN':0})
+		assert not any(log_filter.accept('INFO',"Message") for _i in range(100))
+		assert all(log_filter.accept('DEBUG',"Message") for _i in range(100))
+		assert all(log_filter.accept('WARN',"Message") for _i in range(100))
+
+	def test_errors_always_go_through(self):
+		"""Check that the ERROR messages are never dropped."""
+
+		log_filter = MOVLogFilter(rate_limits={'ERROR':1},dedup_window=60)
+		assert all(log_filter.accept('ERROR',"Message",{"id":1}) for _i in range(100))
+		assert log_filter.expired_repeats(force=True) == []
+
+	def test_collapse_repeated_messages(self):
+		"""Check that the identical messages are collapsed and reported with a repeat count."""
+
+		log_filter = MOVLogFilter(dedup_window=0.2)
+		assert log_filter.accept('INFO',"Message",{"id":1})
+		assert not any(log_filter.accept('INFO',"Message",{"id":1}) for _i in range(9))
+		assert log_filter.accept('INFO',"Message",{"id":2})
+		assert log_filter.accept('WARN',"Message",{"id":1})
+		assert log_filter.expired_repeats() == []
+		time.sleep(0.3)
+		assert log_filter.expired_repeats() == [('INFO',"Message",{"id":1},9)]
+		assert log_filter.accept('INFO',"Message",{"id":1})
+
+
+if __name__ == '__main__':
+	unittest.main()
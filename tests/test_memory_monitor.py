@@ -0,0 +1,101 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import tempfile
+import time
+import tracemalloc
+import unittest
+
+from c1_echo_example_with_python_and_pika.memory_monitor import MemoryMonitor, current_rss_bytes
+from fakes import RecordingMOV
+
+
+class TestMemoryMonitor(unittest.TestCase):
+	"""Class to test the monitor of the memory"""
+
+	def setUp(self):
+		"""Create the directory of the logs."""
+
+		self.log_dir = tempfile.mkdtemp()
+
+	def test_current_rss(self):
+		"""Check that the resident memory is measured."""
+
+		assert current_rss_bytes() > 1024 * 1024
+
+	def test_disabled_by_default(self):
+		"""Check that the monitor does not start without an interval."""
+
+		monitor = MemoryMonitor(interval_seconds=0)
+		assert not monitor.start()
+		monitor.stop()
+
+	def test_sample_without_tracing(self):
+		"""Check that the resident memory is reported when the allocations are not traced."""
+
+		mov = RecordingMOV()
+		monitor = MemoryMonitor(mov,interval_seconds=0,top=0,log_dir=self.log_dir)
+		usage = monitor.sample()
+		assert usage['rss_bytes'] > 0
+		assert 'top' not in usage
+		assert mov.logs == [('DEBUG',"Memory usage",usage)]
+
+	def test_threshold_crossed(self):
+		"""Check that the difference of the allocations is written once when the threshold is crossed."""
+
+		mov = RecordingMOV()
+		monitor = MemoryMonitor(mov,interval_seconds=60,threshold_mb=1,top=5,log_dir=self.log_dir)
+		assert monitor.start()
+		try:
+
+			assert tracemalloc.is_tracing()
+			retained = [bytearray(1024) for _i in range(1000)]
+			usage = monitor.sample()
+			monitor.sample()
+
+		finally:
+
+			monitor.stop()
+
+		assert not tracemalloc.is_tracing()
+		assert len(retained) == 1000
+		assert usage['traced_bytes'] >= 1024 * 1000
+		assert len(usage['top']) == 5
+		assert 'test_memory_monitor.py' in usage['top'][0]['line']
+		assert [log[0] for log in mov.logs] == ['DEBUG','WARN','DEBUG']
+		files = os.listdir(self.log_dir)
+		assert len(files) == 1
+		with open(os.path.join(self.log_dir,files[0])) as file:
+
+			assert 'test_memory_monitor.py' in file.read()
+
+	def test_sample_on_background(self):
+		"""Check that the memory is sampled on a background thread."""
+
+		mov = RecordingMOV()
+		monitor = MemoryMonitor(mov,interval_seconds=0.05,top=0)
+		monitor.start()
+		time.sleep(0.3)
+		monitor.stop()
+		assert len(mov.logs) >= 2
+
+
+if __name__ == '__main__':
+	unittest.main()
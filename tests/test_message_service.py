@@ -21,6 +21,8 @@ import json
 import time
 import unittest
 
+import pika
+
 from c1_echo_example_with_python_and_pika.message_service import MessageService
 
 
@@ -81,5 +83,160 @@ class TestMessageService(unittest.TestCase):
         assert len(msgs) == 1
         assert msg == json.loads(msgs[0])
 
+    def test_publish_encoded_message(self):
+        """Test that a message that is already encoded is published as it is."""
+
+        queue="Queue_to_test_message_service_encoded"
+        msgs=[]
+        def callback(_ch, _method, _properties, body):
+            return msgs.append(body)
+        self.message_service.listen_for(queue,callback)
+        self.message_service.start_consuming_and_forget()
+        body=b'{"id":1,  "name": "name"}'
+        self.message_service.publish_to(queue,body)
+        for _i in range(10):
+
+            if len(msgs) != 0:
+                break
+
+            time.sleep(1)
+
+        assert msgs == [body]
+
+    def test_publish_many(self):
+        """Test that a batch of messages is published into a queue."""
+
+        queue="Queue_to_test_message_service_publish_many"
+        msgs=[]
+        def callback(_ch, _method, _properties, body):
+            return msgs.append(json.loads(body))
+        self.message_service.listen_for(queue,callback)
+        self.message_service.start_consuming_and_forget()
+        batch=[{"id": i} for i in range(10)]
+        batch.append({"not_encodable": object()})
+        outcomes=self.message_service.publish_many(queue,batch)
+        assert outcomes == [True]*10 + [False]
+        for _i in range(10):
+
+            if len(msgs) == 10:
+                break
+
+            time.sleep(1)
+
+        assert msgs == batch[:10]
+
+    def test_publish_confirmed_batch_with_failures(self):
+        """Test that a publication that fails with confirmations only fails its message of the batch."""
+
+        class FailingPublisher:
+            def publish(self, _queue, body, _properties):
+                if body == b'{"id": 2}':
+                    raise pika.exceptions.ConnectionWrongStateError("Closed connection")
+                return True
+            def close(self):
+                pass
+
+        self.message_service.confirmed_publisher=FailingPublisher()
+        outcomes=self.message_service.publish_many("Queue_to_test_message_service_confirmed_batch",[b'{"id": 1}',b'{"id": 2}',b'{"id": 3}'])
+        assert outcomes == [True,False,True]
+
+    def test_publish_batch(self):
+        """Test that a batch of messages is published into different queues."""
+
+        queues=["Queue_to_test_message_service_publish_batch_1","Queue_to_test_message_service_publish_batch_2"]
+        msgs={queue:[] for queue in queues}
+        for queue in queues:
+            self.message_service.listen_for(queue,lambda _ch, method, _properties, body: msgs[method.routing_key].append(json.loads(body)))
+        self.message_service.start_consuming_and_forget()
+        batch=[(queues[i % 2],{"id": i}) for i in range(10)]
+        outcomes=self.message_service.publish_batch(batch)
+        assert outcomes == [True]*10
+        for _i in range(10):
+
+            if len(msgs[queues[0]]) + len(msgs[queues[1]]) == 10:
+                break
+
+            time.sleep(1)
+
+        assert msgs[queues[0]] == [{"id": i} for i in range(0,10,2)]
+        assert msgs[queues[1]] == [{"id": i} for i in range(1,10,2)]
+
+    def test_listen_with_workers(self):
+        """Test that the messages are processed by several workers at the same time."""
+
+        queue="Queue_to_test_message_service_workers"
+        msgs=[]
+        def callback(_ch, _method, _properties, body):
+            time.sleep(1)
+            return msgs.append(json.loads(body))
+        self.message_service.listen_for(queue,callback,workers=4,prefetch=8)
+        self.message_service.start_consuming_and_forget()
+        self.message_service.publish_many(queue,[{"id": i} for i in range(8)])
+        for _i in range(5):
+
+            if len(msgs) == 8:
+                break
+
+            time.sleep(1)
+
+        # One worker would need 8 seconds to process all the messages
+        assert sorted(msg["id"] for msg in msgs) == list(range(8))
+
+    def test_listen_without_auto_ack(self):
+        """Test that the callback can acknowledge several messages at once after a delay."""
+
+        queue="Queue_to_test_message_service_manual_ack"
+        msgs=[]
+        acks=[]
+        def ack(ch, delivery_tag):
+            ch.basic_ack(delivery_tag=delivery_tag,multiple=True)
+            acks.append(delivery_tag)
+        def callback(ch, method, _properties, body):
+            msgs.append(json.loads(body))
+            if len(msgs) == 4:
+                self.message_service.call_later(0.1,lambda: ack(ch,method.delivery_tag))
+        self.message_service.listen_for(queue,callback,prefetch=4,auto_ack=False)
+        self.message_service.start_consuming_and_forget()
+        self.message_service.publish_many(queue,[{"id": i} for i in range(4)])
+        for _i in range(10):
+
+            if len(acks) == 1:
+                break
+
+            time.sleep(1)
+
+        assert sorted(msg["id"] for msg in msgs) == list(range(4))
+        assert len(acks) == 1
+
+    def test_resubscribe_when_channel_is_lost(self):
+        """Test that the queues are consumed again when the listen channel is closed by the broker."""
+
+        queue="Queue_to_test_message_service_resubscribe"
+        msgs=[]
+        def callback(_ch, _method, _properties, body):
+            return msgs.append(json.loads(body))
+        self.message_service.listen_for(queue,callback)
+        self.message_service.start_consuming_and_forget()
+        lost_channel=self.message_service.listen_channel
+        # Declaring the durable queue as not durable makes the broker close the channel
+        self.message_service.listen_connection.add_callback_threadsafe(lambda: lost_channel.queue_declare(queue=queue,durable=False))
+        for _i in range(10):
+
+            if self.message_service.listen_channel is not lost_channel:
+                break
+
+            time.sleep(1)
+
+        self.message_service.publish_to(queue,{"id": 1})
+        for _i in range(10):
+
+            if len(msgs) != 0:
+                break
+
+            time.sleep(1)
+
+        assert self.message_service.listen_channel is not lost_channel
+        assert msgs == [{"id": 1}]
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,170 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import json
+import unittest
+import urllib.error
+import urllib.request
+
+from c1_echo_example_with_python_and_pika import in_memory_message_service
+from c1_echo_example_with_python_and_pika.in_memory_message_service import InMemoryBroker, InMemoryMessageService
+from c1_echo_example_with_python_and_pika.metrics import Counter, Gauge, Histogram, Metric, MetricsRegistry, instrument_callback, start_metrics_server
+
+
+class TestMetrics(unittest.TestCase):
+	"""Class to test the metrics of the component"""
+
+	def setUp(self):
+		"""Create a registry for the metrics of the test."""
+
+		self.registry = MetricsRegistry()
+
+	def test_render_counter_and_gauge(self):
+		"""Check the text format of the counters and the gauges."""
+
+		counter = Counter('messages_total',"The messages.",('queue',),registry=self.registry)
+		counter.labels('a').inc()
+		counter.labels('a').inc(2)
+		counter.labels('b "quoted"\n').inc()
+		gauge = Gauge('in_process',"The messages in process.",registry=self.registry)
+		gauge.set(5)
+		gauge.labels().dec()
+		assert self.registry.render() == '\n'.join([
+			'# HELP messages_total The messages.',
+			'# TYPE messages_total counter',
+			'messages_total{queue="a"} 3.0',
+			'messages_total{queue="b \\"quoted\\"\\n"} 1.0',
+			'# HELP in_process The messages in process.',
+			'# TYPE in_process gauge',
+			'in_process 4.0'
+		]) + '\n'
+
+	def test_render_histogram(self):
+		"""Check that the buckets of a histogram are cumulative."""
+
+		histogram = Histogram('duration_seconds',"The duration.",registry=self.registry,buckets=(0.1,1.0))
+		for value in (0.05,0.1,0.5,2.0):
+
+			histogram.observe(value)
+
+		lines = self.registry.render().splitlines()
+		assert lines[2:] == [
+			'duration_seconds_bucket{le="0.1"} 2',
+			'duration_seconds_bucket{le="1.0"} 3',
+			'duration_seconds_bucket{le="+Inf"} 4',
+			'duration_seconds_sum 2.65',
+			'duration_seconds_count 4'
+		]
+
+	def test_labels_must_match(self):
+		"""Check that a metric cannot be used with other labels or registered twice."""
+
+		counter = Counter('messages_total',"The messages.",('queue',),registry=self.registry)
+		with self.assertRaises(ValueError):
+
+			counter.inc()
+
+		with self.assertRaises(ValueError):
+
+			Counter('messages_total',"The messages.",registry=self.registry)
+
+	def test_metric_must_create_its_values(self):
+		"""Check that a metric that does not define how to create its values cannot be created."""
+
+		class Untyped(Metric):
+			pass
+
+		with self.assertRaises(TypeError):
+
+			Untyped('untyped',"An untyped metric.",registry=self.registry)
+
+		assert len(self.registry.metrics) == 0
+
+	def test_instrument_callback(self):
+		"""Check that the instrumented callbacks count the messages and the failures."""
+
+		def fail(*_args):
+			raise KeyError('test')
+
+		instrument_callback('metrics_test_sync',lambda *_args: None)(None,None,None,b'')
+		with self.assertRaises(KeyError):
+
+			instrument_callback('metrics_test_sync',fail)(None,None,None,b'')
+
+		async def coroutine(*_args):
+			return 'done'
+
+		instrumented = instrument_callback('metrics_test_async',coroutine)
+		assert asyncio.iscoroutinefunction(instrumented)
+		assert asyncio.run(instrumented(None,None,None,b'')) == 'done'
+
+		from c1_echo_example_with_python_and_pika.metrics import HANDLER_DURATION, HANDLER_FAILURES, MESSAGES_CONSUMED
+		assert MESSAGES_CONSUMED.labels('metrics_test_sync').value == 2
+		assert HANDLER_FAILURES.labels('metrics_test_sync').value == 1
+		assert MESSAGES_CONSUMED.labels('metrics_test_async').value == 1
+		assert sum(HANDLER_DURATION.labels('metrics_test_async').counts) == 1
+
+	def test_message_service_metrics(self):
+		"""Check that the message services count the published messages and the publish failures."""
+
+		published = in_memory_message_service.MESSAGES_PUBLISHED.labels('metrics_test_queue').value
+		failures = in_memory_message_service.PUBLISH_FAILURES.labels('metrics_test_queue').value
+		message_service = InMemoryMessageService(InMemoryBroker())
+		try:
+
+			msgs = []
+			message_service.listen_for('metrics_test_queue',lambda _ch,_method,_properties,body: msgs.append(json.loads(body)))
+			message_service.publish_to('metrics_test_queue',{"id": 1})
+			message_service.publish_many('metrics_test_queue',[{"id": 2},{"id": {1,2}}])
+			message_service.process_events()
+
+		finally:
+
+			message_service.close()
+
+		assert len(msgs) == 2
+		assert in_memory_message_service.MESSAGES_PUBLISHED.labels('metrics_test_queue').value == published + 2
+		assert in_memory_message_service.PUBLISH_FAILURES.labels('metrics_test_queue').value == failures + 1
+
+	def test_metrics_server(self):
+		"""Check that the server returns the metrics."""
+
+		Counter('messages_total',"The messages.",registry=self.registry).inc()
+		assert start_metrics_server(0,registry=self.registry) is None
+		server = start_metrics_server(18765,'127.0.0.1',self.registry)
+		try:
+
+			with urllib.request.urlopen('http://127.0.0.1:18765/metrics',timeout=5) as response:
+
+				assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+				assert 'messages_total 1.0' in response.read().decode('utf-8')
+
+			with self.assertRaises(urllib.error.HTTPError):
+
+				urllib.request.urlopen('http://127.0.0.1:18765/other',timeout=5)
+
+		finally:
+
+			server.shutdown()
+			server.server_close()
+
+
+if __name__ == '__main__':
+	unittest.main()
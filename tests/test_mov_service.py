@@ -28,12 +28,26 @@ import urllib.parse
 import requests
 
 
+from c1_echo_example_with_python_and_pika.in_memory_message_service import InMemoryMessageService
+from c1_echo_example_with_python_and_pika.log_filter import MOVLogFilter
 from c1_echo_example_with_python_and_pika.message_service import MessageService
 from c1_echo_example_with_python_and_pika.mov_service import MOVService
+from fakes import RecordingMessageService
 
 #
 # Get the Log messages from the MOV API.
 #
+def log_payload_is(log_payload: str, payload: dict):
+	"""Check if the payload of a log message is the encoded payload, with any codec"""
+
+	try:
+
+		return json.loads(log_payload) == payload
+
+	except ValueError:
+
+		return False
+
 def mov_get_log_message_with(level: str, payload: dict):
 	"""Ask to the MOV for a log message with the specified level and payload"""
 
@@ -48,7 +62,6 @@ def mov_get_log_message_with(level: str, payload: dict):
 		
 	mov_url = os.getenv('MOV_URL','http://host.docker.internal:8083')	
 	url = f"{mov_url}/v1/logs?{url_params}"
-	expected_payload = json.dumps(payload)
 	for _i in range(30):
 
 		time.sleep(1)
@@ -58,7 +71,7 @@ def mov_get_log_message_with(level: str, payload: dict):
 
 			for log in content['logs']:
 
-				if 'payload' in log and log['payload'] == expected_payload:
+				if 'payload' in log and log_payload_is(log['payload'],payload):
 
 					return log
 
@@ -80,6 +93,7 @@ class TestMOVService(unittest.TestCase):
 	def tearDownClass(cls): 
 		"""Stops the MOV service."""
 
+		cls.mov.stop()
 		cls.mov.unregister_component()
 		cls.message_service.close()
 
@@ -264,5 +278,109 @@ class TestMOVService(unittest.TestCase):
 
 
 
+class TestMOVServiceLogBuffer(unittest.TestCase):
+	"""Class to test how the log messages are buffered before sending them to the MOV."""
+
+	def test_send_logs_in_batches(self):
+		"""Check that the log messages are sent in batches by the flusher."""
+
+		message_service = RecordingMessageService()
+		mov = MOVService(message_service,log_buffer_size=100,log_batch_size=10,log_flush_interval=10)
+		for i in range(25):
+
+			mov.info(f"Message {i}")
+
+		with message_service.condition:
+
+			assert message_service.condition.wait_for(lambda: len(message_service.batches) >= 2,5)
+
+		mov.stop()
+		assert [len(msgs) for _queue,msgs in message_service.batches] == [10,10,5]
+		assert [msg['message'] for msg in message_service.published_msgs()] == [f"Message {i}" for i in range(25)]
+		assert all(queue == 'valawai/log/add' for queue,_msgs in message_service.batches)
+
+	def test_flush_logs_after_interval(self):
+		"""Check that the log messages are sent when they have waited the flush interval."""
+
+		message_service = RecordingMessageService()
+		mov = MOVService(message_service,log_buffer_size=100,log_batch_size=10,log_flush_interval=0.1)
+		mov.warn("Message")
+		with message_service.condition:
+
+			assert message_service.condition.wait_for(lambda: len(message_service.batches) == 1,5)
+
+		mov.stop()
+
+	def test_drop_oldest_logs_when_buffer_is_full(self):
+		"""Check that the oldest log messages are dropped when the buffer is full."""
+
+		message_service = RecordingMessageService()
+		mov = MOVService(message_service,log_buffer_size=5,log_batch_size=10,log_flush_interval=10)
+		with message_service.condition:
+
+			# The flusher cannot send while the condition of the message service is locked
+			for i in range(20):
+
+				mov.debug(f"Message {i}")
+
+		mov.stop()
+		msgs = [msg['message'] for msg in message_service.published_msgs()]
+		assert msgs[-1] == "Message 19"
+		assert mov.dropped_logs + len(msgs) == 20
+		assert mov.dropped_logs > 0
+
+	def test_send_collapsed_logs_on_stop(self):
+		"""Check that the repeated log messages are sent with the times they have been repeated."""
+
+		message_service = RecordingMessageService()
+		mov = MOVService(message_service,log_filter=MOVLogFilter(dedup_window=60))
+		for _i in range(5):
+
+			mov.info("Message",{"id":1})
+
+		mov.stop()
+		msgs = [msg['message'] for msg in message_service.published_msgs()]
+		assert msgs == ["Message","Message (repeated 4 more times)"]
+
+	def test_log_encoded_payload(self):
+		"""Check that a payload that is already encoded is not encoded again."""
+
+		message_service = RecordingMessageService()
+		mov = MOVService(message_service,log_buffer_size=0)
+		mov.info("Message",b'{"content": "Hello!"}')
+		mov.info("Message",{"content": "Hello!"})
+		payloads = [msg['payload'] for msg in message_service.published_msgs()]
+		assert payloads == ['{"content": "Hello!"}','{"content": "Hello!"}']
+
+	def test_send_immediately_after_stop(self):
+		"""Check that a log message is sent immediately when the service is stopped."""
+
+		message_service = RecordingMessageService()
+		mov = MOVService(message_service)
+		mov.stop()
+		mov.error("Message")
+		assert [msg['message'] for msg in message_service.published_msgs()] == ["Message"]
+
+
+class TestMOVServiceInMemory(unittest.TestCase):
+	"""Class to test the messages that the MOVService sends through an in memory broker."""
+
+	def test_send_log_messages(self):
+		"""Check that the buffered log messages are sent to the MOV queue."""
+
+		message_service = InMemoryMessageService()
+		received = []
+		message_service.listen_for('valawai/log/add',lambda _ch,_method,_properties,body: received.append(json.loads(body)))
+		mov = MOVService(message_service,log_buffer_size=100,log_flush_interval=0.01)
+		mov.component_id = "component"
+		mov.info("Message",{"content": "Hello!"})
+		mov.error("Error")
+		mov.stop()
+		message_service.process_events()
+		message_service.close()
+		assert [(msg['level'],msg['message'],msg['component_id']) for msg in received] == [('INFO',"Message","component"),('ERROR',"Error","component")]
+		assert json.loads(received[0]['payload']) == {"content": "Hello!"}
+
+
 if __name__ == '__main__':
 	unittest.main()
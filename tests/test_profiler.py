@@ -0,0 +1,100 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+
+from c1_echo_example_with_python_and_pika.profiler import SamplingProfiler, install_profiler_signal
+
+
+def busy_loop(stop:threading.Event):
+	"""A function that uses the CPU until it is stopped."""
+
+	while not stop.is_set():
+		sum(range(1000))
+
+
+class TestSamplingProfiler(unittest.TestCase):
+	"""Class to test the profiler of the consuming thread"""
+
+	def setUp(self):
+		"""Start a thread to profile."""
+
+		self.log_dir = tempfile.mkdtemp()
+		self.stop = threading.Event()
+		self.thread = threading.Thread(target=busy_loop,args=(self.stop,))
+		self.thread.start()
+
+	def tearDown(self):
+		"""Stop the profiled thread."""
+
+		self.stop.set()
+		self.thread.join()
+
+	def test_profile_thread(self):
+		"""Check that the profile has the collapsed stacks of the profiled thread."""
+
+		profiler = SamplingProfiler(self.thread.ident,1,self.log_dir)
+		path = profiler.run(0.2)
+		assert os.path.dirname(path) == self.log_dir
+		with open(path) as file:
+
+			lines = file.read().splitlines()
+
+		assert len(lines) > 0
+		stack,count = lines[0].rsplit(' ',1)
+		assert int(count) > 0
+		assert 'busy_loop (test_profiler.py:' in stack
+		assert stack.index('run (threading.py:') < stack.index('busy_loop')
+
+	def test_not_start_twice(self):
+		"""Check that a profile is not started while another one is running."""
+
+		profiler = SamplingProfiler(self.thread.ident,1,self.log_dir)
+		assert profiler.start(0.2)
+		assert not profiler.start(0.2)
+		while profiler.is_running():
+
+			time.sleep(0.05)
+
+		assert len(os.listdir(self.log_dir)) == 1
+
+	def test_profile_on_signal(self):
+		"""Check that the signal starts the profiler."""
+
+		previous = signal.getsignal(signal.SIGUSR1)
+		try:
+
+			profiler = install_profiler_signal('SIGUSR1',SamplingProfiler(self.thread.ident,1,self.log_dir))
+			assert install_profiler_signal('') is None
+			assert install_profiler_signal('SIGUNKNOWN') is None
+			os.kill(os.getpid(),signal.SIGUSR1)
+			assert profiler.is_running()
+
+		finally:
+
+			signal.signal(signal.SIGUSR1,previous)
+
+
+if __name__ == '__main__':
+	unittest.main()
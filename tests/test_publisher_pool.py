@@ -0,0 +1,105 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import threading
+import unittest
+
+import pika
+
+from c1_echo_example_with_python_and_pika.publisher_pool import PublisherPool
+
+
+class TestPublisherPool(unittest.TestCase):
+	"""Class to test the pool of connections used to publish messages"""
+
+	def setUp(self):
+		"""Create the pool and the queue to publish."""
+
+		credentials = pika.PlainCredentials(username=os.getenv('RABBITMQ_USERNAME','mov'),password=os.getenv('RABBITMQ_PASSWORD','password'))
+		self.parameters = pika.ConnectionParameters(host=os.getenv('RABBITMQ_HOST','mov-mq'),port=int(os.getenv('RABBITMQ_PORT',"5672")),credentials=credentials)
+		self.pool = PublisherPool(self.parameters,2)
+		self.queue = "Queue_to_test_publisher_pool"
+		self.connection = pika.BlockingConnection(self.parameters)
+		self.channel = self.connection.channel()
+		self.channel.queue_declare(queue=self.queue,durable=False,auto_delete=False)
+		self.channel.queue_purge(queue=self.queue)
+
+	def tearDown(self):
+		"""Close the pool and remove the queue."""
+
+		self.pool.close()
+		self.channel.queue_delete(queue=self.queue)
+		self.connection.close()
+
+	def __count_messages(self):
+		"""Return the number of messages on the queue."""
+
+		return self.channel.queue_declare(queue=self.queue,passive=True).method.message_count
+
+	def test_reuse_connection(self):
+		"""Check that the same connection is used to publish several messages."""
+
+		properties = pika.BasicProperties(content_type='application/json')
+		with self.pool.lease() as channel:
+
+			channel.basic_publish(self.queue,b'{"index": 0}',properties)
+			connection = channel.connection
+
+		for i in range(1,10):
+
+			self.pool.publish(self.queue,f'{{"index": {i}}}'.encode(),properties)
+
+		with self.pool.lease() as channel:
+
+			assert channel.connection is connection
+
+		assert self.__count_messages() == 10
+
+	def test_reconnect_when_connection_is_closed(self):
+		"""Check that a message is published after the connection has been lost."""
+
+		properties = pika.BasicProperties(content_type='application/json')
+		self.pool.publish(self.queue,b'{"index": 0}',properties)
+		with self.pool.lease() as channel:
+
+			channel.connection.close()
+
+		self.pool.publish(self.queue,b'{"index": 1}',properties)
+		assert self.__count_messages() == 2
+
+	def test_publish_from_several_threads(self):
+		"""Check that the pool can be used from several threads."""
+
+		properties = pika.BasicProperties(content_type='application/json')
+		def publish():
+			for _i in range(10):
+				self.pool.publish(self.queue,b'{}',properties)
+
+		threads = [threading.Thread(target=publish) for _i in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		assert self.__count_messages() == 40
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,65 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import time
+import unittest
+
+import pika
+
+from c1_echo_example_with_python_and_pika.tracing import SENT_AT_HEADER, TRACE_ID_HEADER, queue_wait_seconds, trace_headers, trace_id_of
+
+
+class TestTracing(unittest.TestCase):
+	"""Class to test the headers to trace the messages"""
+
+	def test_new_trace(self):
+		"""Check that a new trace has a random identifier and the current time in microseconds."""
+
+		before = time.time_ns() // 1000
+		headers = trace_headers()
+		assert len(headers[TRACE_ID_HEADER]) == 32
+		assert headers[TRACE_ID_HEADER] != trace_headers()[TRACE_ID_HEADER]
+		assert before <= headers[SENT_AT_HEADER] <= time.time_ns() // 1000
+
+	def test_continue_trace(self):
+		"""Check that the identifier of a received trace is kept."""
+
+		properties = pika.BasicProperties(headers=trace_headers('trace-1'))
+		assert trace_id_of(properties) == 'trace-1'
+		assert trace_id_of(pika.BasicProperties(headers={TRACE_ID_HEADER: b'trace-2'})) == 'trace-2'
+
+	def test_queue_wait(self):
+		"""Check the time that a message has waited since it was sent."""
+
+		properties = pika.BasicProperties(headers={TRACE_ID_HEADER: 'trace-1', SENT_AT_HEADER: 1000000})
+		assert queue_wait_seconds(properties,3500000) == 2.5
+		# The clocks of the publisher and the consumer can differ
+		assert queue_wait_seconds(properties,500000) == 0
+
+	def test_not_traced(self):
+		"""Check the messages without the headers to trace them."""
+
+		assert trace_id_of(None) is None
+		assert trace_id_of(pika.BasicProperties()) is None
+		assert queue_wait_seconds(None) is None
+		assert queue_wait_seconds(pika.BasicProperties(headers={SENT_AT_HEADER: 'now'})) is None
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,95 @@
+#
+# This file is part of the C1_echo_example_with_python_and_pika distribution
+# (https://github.com/VALAWAI/C1_echo_example_with_python_and_pika).
+# Copyright (c) 2022-2026 VALAWAI (https://valawai.eu/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import signal
+import time
+import unittest
+
+from c1_echo_example_with_python_and_pika.worker_supervisor import WorkerSupervisor
+
+
+def sleep_forever():
+	"""A worker that runs until it is terminated."""
+
+	while True:
+		time.sleep(1)
+
+
+def finish_soon():
+	"""A worker that finishes without being asked."""
+
+	time.sleep(0.1)
+
+
+class TestWorkerSupervisor(unittest.TestCase):
+	"""Class to test the supervisor of the worker processes"""
+
+	def test_start_and_stop_workers(self):
+		"""Check that the workers are started and stopped."""
+
+		supervisor = WorkerSupervisor(3,sleep_forever)
+		supervisor.start()
+		try:
+
+			assert supervisor.alive_workers() == 3
+
+		finally:
+
+			supervisor.stop(5)
+
+		assert supervisor.alive_workers() == 0
+
+	def test_signal_workers(self):
+		"""Check that a signal is sent to all the workers."""
+
+		supervisor = WorkerSupervisor(2,sleep_forever)
+		supervisor.start()
+		try:
+
+			supervisor.signal_workers(signal.SIGKILL)
+			for process in supervisor.processes:
+
+				process.join(5)
+				assert process.exitcode == -signal.SIGKILL
+
+		finally:
+
+			supervisor.stop(5)
+
+	def test_restart_dead_workers(self):
+		"""Check that a worker that has finished is started again."""
+
+		supervisor = WorkerSupervisor(2,finish_soon,restart_delay=0.2)
+		supervisor.start()
+		try:
+
+			first_pids = [process.pid for process in supervisor.processes]
+			time.sleep(0.5)
+			assert supervisor.alive_workers() == 0
+			supervisor.restart_dead_workers()
+			assert supervisor.alive_workers() == 2
+			assert all(process.pid not in first_pids for process in supervisor.processes)
+
+		finally:
+
+			supervisor.stop(5)
+
+
+if __name__ == '__main__':
+	unittest.main()